@@ -1,883 +1,215 @@
+import time
+_SCRIPT_STARTED = time.perf_counter()
+
 import streamlit as st
 import os
-import requests
-import json
+import hashlib
+import html
+import functools
+import itertools
+import re
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
 from dotenv import load_dotenv
-import time
-from datetime import datetime, timedelta
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 
-# Load environment variables
-load_dotenv()
-
-# --- PAGE CONFIGURATION ---
-st.set_page_config(
-    page_title="WeWine.app Strategic AI Co-Founder",
-    page_icon="🍷",
-    layout="wide",
-    initial_sidebar_state="collapsed"  # Better for mobile
+from wewine.lazy import LazyModule, import_observer
+from wewine.config import MULTI_AGENT_MODE
+from wewine.resilience import CircuitBreaker, get_circuit_breaker
+from wewine.scheduler import PRIORITY_INTERACTIVE, get_request_scheduler
+from wewine.ledger import DAILY_BUDGET, current_user, get_cost_ledger
+from wewine.catalog import (
+    COMPETITORS, GROWTH_FOCUSES, MODEL_OPTIONS, POSITIONING_QUESTIONS, QUERY_EXAMPLES, ROADMAP_PERIODS
 )
+from wewine.knowledge import (
+    BUSINESS_IMPROVEMENTS, BUSINESS_KPIS, BUSINESS_STRENGTHS, GROWTH_TREND, MARKET_LANDSCAPE
+)
+from wewine.cache import get_response_cache, get_semantic_cache
+from wewine.memory import get_conversation_store
+from wewine.metrics import METRICS_HOST, METRICS_PORT, METRICS_WINDOW, get_metrics
+from wewine.engine import get_ai_ceo, is_model_answer
+from wewine.jobs import JOB_PENDING, JOB_POLL_INTERVAL, get_job_runner
+from wewine.markdown import StreamingMarkdown, markdown_to_html
 
-# --- ENHANCED MOBILE-RESPONSIVE CSS STYLING ---
-st.markdown("""
-<style>
-    @import url('https://fonts.googleapis.com/css2?family=Playfair+Display:wght@400;700&family=Inter:wght@300;400;500;600;700&display=swap');
-
-    /* Mobile-first responsive design */
-    .main .block-container {
-        padding-top: 1rem;
-        padding-bottom: 1rem;
-        padding-left: 1rem;
-        padding-right: 1rem;
-    }
-
-    /* Enhanced typography hierarchy */
-    .main-header {
-        font-family: 'Playfair Display', serif;
-        font-size: clamp(2rem, 6vw, 3.5rem);
-        font-weight: 700;
-        color: #FFFFFF;
-        text-align: center;
-        margin-bottom: 0.5rem;
-        background: linear-gradient(135deg, #722F37 0%, #B8860B 50%, #DAA520 100%);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        background-clip: text;
-        line-height: 1.2;
-    }
-    
-    .main-subheader {
-        font-family: 'Inter', sans-serif;
-        font-size: clamp(1rem, 3vw, 1.2rem);
-        font-weight: 400;
-        color: #B8860B;
-        text-align: center;
-        margin-bottom: 2rem;
-        line-height: 1.4;
-    }
-
-    /* Mobile-optimized AI response box */
-    .ai-response {
-        background: linear-gradient(135deg, rgba(255, 255, 255, 0.08) 0%, rgba(255, 255, 255, 0.03) 100%);
-        border-left: 4px solid #B8860B;
-        border-radius: 12px;
-        padding: 1rem 1.25rem;
-        margin: 1rem 0;
-        font-family: 'Inter', sans-serif;
-        font-size: 0.95rem;
-        line-height: 1.6;
-        color: #EAEAEA;
-        box-shadow: 0 4px 20px rgba(184, 134, 11, 0.15);
-        backdrop-filter: blur(10px);
-        border: 1px solid rgba(184, 134, 11, 0.2);
-        word-wrap: break-word;
-        overflow-wrap: break-word;
-    }
-    
-    .ai-response h1, .ai-response h2, .ai-response h3, .ai-response h4 {
-        font-family: 'Playfair Display', serif;
-        color: #FFFFFF;
-        border-bottom: 1px solid rgba(184, 134, 11, 0.3);
-        padding-bottom: 0.5rem;
-        margin-top: 1rem;
-        margin-bottom: 0.75rem;
-        font-size: clamp(1.1rem, 4vw, 1.4rem);
-    }
-    
-    .ai-response strong {
-        color: #DAA520;
-        font-weight: 600;
-    }
-
-    .ai-response p {
-        margin-bottom: 0.75rem;
-    }
-
-    .ai-response ul, .ai-response ol {
-        padding-left: 1.5rem;
-        margin-bottom: 0.75rem;
-    }
-
-    .ai-response li {
-        margin-bottom: 0.25rem;
-    }
-
-    /* Enhanced status indicators */
-    .status-connected {
-        background: linear-gradient(135deg, #28a745 0%, #20c997 100%);
-        color: white;
-        padding: 0.75rem 1rem;
-        border-radius: 50px;
-        font-weight: 600;
-        text-align: center;
-        margin: 0.5rem 0;
-        font-size: 0.9rem;
-        box-shadow: 0 2px 10px rgba(40, 167, 69, 0.3);
-    }
-    
-    .status-offline {
-        background: linear-gradient(135deg, #dc3545 0%, #fd7e14 100%);
-        color: white;
-        padding: 0.75rem 1rem;
-        border-radius: 50px;
-        font-weight: 600;
-        text-align: center;
-        margin: 0.5rem 0;
-        font-size: 0.9rem;
-        box-shadow: 0 2px 10px rgba(220, 53, 69, 0.3);
-    }
-    
-    .cost-tracker {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        padding: 1rem;
-        border-radius: 12px;
-        margin: 0.5rem 0;
-        text-align: center;
-        font-weight: 500;
-        box-shadow: 0 4px 15px rgba(102, 126, 234, 0.2);
-    }
-
-    /* Mobile-optimized buttons */
-    .stButton > button {
-        border-radius: 12px;
-        border: 2px solid #B8860B;
-        color: #B8860B;
-        background: linear-gradient(135deg, rgba(184, 134, 11, 0.1) 0%, rgba(184, 134, 11, 0.05) 100%);
-        transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
-        font-weight: 600;
-        font-family: 'Inter', sans-serif;
-        font-size: 0.9rem;
-        padding: 0.5rem 1rem;
-        width: 100%;
-        min-height: 2.5rem;
-        backdrop-filter: blur(5px);
-    }
-    
-    .stButton > button:hover {
-        border-color: #DAA520;
-        color: #FFFFFF;
-        background: linear-gradient(135deg, #B8860B 0%, #DAA520 100%);
-        transform: translateY(-2px);
-        box-shadow: 0 4px 20px rgba(184, 134, 11, 0.4);
-    }
-
-    .stButton > button:active {
-        transform: translateY(0);
-    }
-
-    /* Enhanced feature cards */
-    .feature-card {
-        background: linear-gradient(135deg, rgba(255, 255, 255, 0.12) 0%, rgba(255, 255, 255, 0.06) 100%);
-        border: 1px solid rgba(184, 134, 11, 0.3);
-        border-radius: 16px;
-        padding: 1.5rem;
-        margin: 1rem 0;
-        backdrop-filter: blur(15px);
-        transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
-        font-family: 'Inter', sans-serif;
-    }
-    
-    .feature-card:hover {
-        transform: translateY(-3px);
-        box-shadow: 0 10px 30px rgba(184, 134, 11, 0.25);
-        border-color: rgba(184, 134, 11, 0.5);
-    }
-
-    /* Enhanced agent cards with better mobile layout */
-    .agent-card {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        padding: 1rem;
-        border-radius: 12px;
-        margin: 0.5rem 0;
-        text-align: center;
-        font-weight: 600;
-        box-shadow: 0 4px 15px rgba(102, 126, 234, 0.2);
-        transition: all 0.3s ease;
-        font-family: 'Inter', sans-serif;
-        font-size: 0.85rem;
-        min-height: 80px;
-        display: flex;
-        align-items: center;
-        justify-content: center;
-        flex-direction: column;
-    }
-
-    .agent-card:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 6px 20px rgba(102, 126, 234, 0.3);
-    }
-
-    /* Mobile-optimized tabs */
-    .stTabs [data-baseweb="tab-list"] {
-        gap: 8px;
-        overflow-x: auto;
-        -webkit-overflow-scrolling: touch;
-        scrollbar-width: none;
-        -ms-overflow-style: none;
-    }
-
-    .stTabs [data-baseweb="tab-list"]::-webkit-scrollbar {
-        display: none;
-    }
-    
-    .stTabs [data-baseweb="tab"] {
-        height: auto;
-        min-height: 48px;
-        background: linear-gradient(135deg, rgba(184, 134, 11, 0.1) 0%, rgba(184, 134, 11, 0.05) 100%);
-        border-radius: 8px;
-        padding: 0.75rem 1rem;
-        font-weight: 500;
-        font-family: 'Inter', sans-serif;
-        font-size: 0.85rem;
-        white-space: nowrap;
-        border: 1px solid rgba(184, 134, 11, 0.2);
-        color: #B8860B;
-        transition: all 0.3s ease;
-        backdrop-filter: blur(5px);
-    }
-    
-    .stTabs [aria-selected="true"] {
-        background: linear-gradient(135deg, #B8860B 0%, #DAA520 100%);
-        color: #FFFFFF;
-        font-weight: 600;
-        border-color: #DAA520;
-        box-shadow: 0 2px 10px rgba(184, 134, 11, 0.3);
-    }
-
-    /* Mobile-responsive metrics */
-    .metric-container {
-        background: linear-gradient(135deg, rgba(255, 255, 255, 0.1) 0%, rgba(255, 255, 255, 0.05) 100%);
-        border-radius: 12px;
-        padding: 1rem;
-        text-align: center;
-        backdrop-filter: blur(10px);
-        border: 1px solid rgba(184, 134, 11, 0.2);
-        margin: 0.5rem 0;
-    }
-
-    /* Enhanced selectbox styling */
-    .stSelectbox > div > div {
-        background: linear-gradient(135deg, rgba(255, 255, 255, 0.1) 0%, rgba(255, 255, 255, 0.05) 100%);
-        border: 1px solid rgba(184, 134, 11, 0.3);
-        border-radius: 8px;
-        backdrop-filter: blur(5px);
-    }
+# Load environment variables
+load_dotenv()
 
-    /* Enhanced text area styling */
-    .stTextArea > div > div > textarea {
-        background: linear-gradient(135deg, rgba(255, 255, 255, 0.1) 0%, rgba(255, 255, 255, 0.05) 100%);
-        border: 1px solid rgba(184, 134, 11, 0.3);
-        border-radius: 8px;
-        color: #EAEAEA;
-        backdrop-filter: blur(5px);
-    }
+# --- STARTUP PROFILING ---
+PROFILE_ENABLED = os.getenv('WEWINE_PROFILE', '').lower() in ('1', 'true', 'yes')
 
-    /* Loading spinner enhancement */
-    .stSpinner > div {
-        border-top-color: #B8860B !important;
-    }
+class RunProfiler:
+    """Wall-clock breakdown of one script run: imports, CSS, sidebar and each tab"""
 
-    /* Mobile-optimized sidebar */
-    .css-1d391kg {
-        padding-top: 1rem;
-    }
+    def __init__(self, started: float):
+        self.started = started
+        self.spans = []
 
-    /* Enhanced expander styling */
-    .streamlit-expanderHeader {
-        background: linear-gradient(135deg, rgba(184, 134, 11, 0.1) 0%, rgba(184, 134, 11, 0.05) 100%);
-        border-radius: 8px;
-        border: 1px solid rgba(184, 134, 11, 0.2);
-        backdrop-filter: blur(5px);
-    }
+    def record(self, name: str, seconds: float):
+        self.spans.append((name, seconds))
 
-    /* Responsive grid improvements */
-    @media (max-width: 768px) {
-        .main .block-container {
-            padding-left: 0.5rem;
-            padding-right: 0.5rem;
-        }
-        
-        .agent-card {
-            font-size: 0.8rem;
-            padding: 0.75rem;
-            min-height: 70px;
-        }
-        
-        .ai-response {
-            padding: 1rem;
-            font-size: 0.9rem;
-        }
-        
-        .feature-card {
-            padding: 1rem;
+    @contextmanager
+    def span(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def report(self) -> dict:
+        return {
+            "total": time.perf_counter() - self.started,
+            "spans": list(self.spans)
         }
-    }
 
-    /* Enhanced progress bar */
-    .stProgress > div > div > div {
-        background: linear-gradient(90deg, #28a745, #B8860B, #dc3545);
-    }
-
-    /* Better code block styling */
-    .stCodeBlock {
-        background: linear-gradient(135deg, rgba(255, 255, 255, 0.1) 0%, rgba(255, 255, 255, 0.05) 100%);
-        border: 1px solid rgba(184, 134, 11, 0.2);
-        border-radius: 8px;
-        backdrop-filter: blur(5px);
-    }
+# Streamlit executes the script in a fresh namespace per run, so this is per-run state
+profiler = RunProfiler(_SCRIPT_STARTED)
+profiler.record("imports", time.perf_counter() - _SCRIPT_STARTED)
+import_observer.set(profiler.record)
 
-    /* Enhanced info/warning/error boxes */
-    .stAlert {
-        border-radius: 12px;
-        backdrop-filter: blur(10px);
-        border: 1px solid rgba(184, 134, 11, 0.2);
-    }
+px = LazyModule('plotly.express')
 
-    /* Smooth animations */
-    * {
-        transition: background-color 0.3s ease, border-color 0.3s ease, color 0.3s ease;
-    }
-
-    /* Mobile navigation hint */
-    .mobile-nav-hint {
-        display: none;
-        background: linear-gradient(135deg, rgba(184, 134, 11, 0.1) 0%, rgba(184, 134, 11, 0.05) 100%);
-        color: #B8860B;
-        padding: 0.5rem;
-        border-radius: 8px;
-        text-align: center;
-        font-size: 0.8rem;
-        margin-bottom: 1rem;
-        border: 1px solid rgba(184, 134, 11, 0.2);
-    }
+# --- ENHANCED MOBILE-RESPONSIVE CSS STYLING ---
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+STYLESHEET = 'wewine.css'
+
+def minify_css(css: str) -> str:
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    return css.replace(';}', '}').strip()
+
+@st.cache_resource
+def load_stylesheet():
+    """Minify the app stylesheet once per process.
+
+    Returns (asset filename, minified css). The minified build is written next to
+    the source as a content-versioned file, e.g. ``wewine.3f2a9c01bd.min.css``, so
+    it can be served and cached under a URL that changes whenever the CSS does;
+    builds of earlier versions are deleted when a new one is written. The
+    filename is None when the static folder is not writable.
+    """
+    with open(os.path.join(STATIC_DIR, STYLESHEET), encoding='utf-8') as handle:
+        css = minify_css(handle.read())
+    version = hashlib.sha256(css.encode('utf-8')).hexdigest()[:10]
+    stem = os.path.splitext(STYLESHEET)[0]
+    asset = f"{stem}.{version}.min.css"
+    try:
+        asset_path = os.path.join(STATIC_DIR, asset)
+        if not os.path.exists(asset_path):
+            with open(asset_path, 'w', encoding='utf-8') as handle:
+                handle.write(css)
+            remove_stale_assets(stem, asset)
+    except OSError:
+        asset = None
+    return asset, css
+
+def remove_stale_assets(stem: str, current: str):
+    """Delete minified builds of earlier stylesheet versions; best effort, another process may race us"""
+    stale = re.compile(rf"{re.escape(stem)}\.[0-9a-f]{{10}}\.min\.css")
+    for name in os.listdir(STATIC_DIR):
+        if name != current and stale.fullmatch(name):
+            try:
+                os.remove(os.path.join(STATIC_DIR, name))
+            except OSError:
+                pass
+
+def inject_styles():
+    """Reference the versioned stylesheet, or inline it when static serving is off.
+
+    With server.enableStaticServing the browser fetches the minified asset from
+    /app/static/ once and caches it, so each rerun only re-sends a one-line <link>.
+    """
+    asset, css = load_stylesheet()
+    if asset and st.get_option("server.enableStaticServing"):
+        st.markdown(f'<link rel="stylesheet" href="app/static/{asset}">', unsafe_allow_html=True)
+    else:
+        st.markdown(f'<style>{css}</style>', unsafe_allow_html=True)
+
+# --- RERUN SCOPING ---
+# Interactive regions are fragments: a widget inside one reruns just that
+# region, not the sidebar, dashboard and the other tabs. Tabs run lazily, so
+# only the open tab's body executes. Streamlit versions without fragments or
+# tab state fall back to rerunning (and rendering) everything.
+STATUS_REFRESH_INTERVAL = float(os.getenv('WEWINE_STATUS_REFRESH', '15'))  # seconds; 0 refreshes with the page only
+
+def bind_session():
+    """Attribute this run's calls (cost ledger, metrics) to the session's user"""
+    if 'user_id' not in st.session_state:
+        st.session_state.user_id = uuid.uuid4().hex
+    current_user.set(st.session_state.user_id)
+
+def fragment(func=None, *, run_every: float = None):
+    """st.fragment that rebinds the session's user, since fragment reruns skip main()"""
+    def scoped(func):
+        @functools.wraps(func)
+        def run(*args, **kwargs):
+            bind_session()
+            return func(*args, **kwargs)
+        if not hasattr(st, 'fragment'):
+            return run
+        return st.fragment(run, run_every=run_every or None)
+    return scoped(func) if func else scoped
+
+def lazy_tabs(labels: list, key: str = "tab") -> list:
+    """Tabs that track the selected one (and keep it in the URL) so closed tabs can be skipped"""
+    try:
+        return st.tabs(labels, key=key, on_change="rerun", bind="query-params")
+    except TypeError:  # no tab state in this Streamlit: every tab renders
+        return st.tabs(labels)
+
+def tab_open(tab) -> bool:
+    return getattr(tab, 'open', None) is not False
 
-    @media (max-width: 768px) {
-        .mobile-nav-hint {
-            display: block;
-        }
-    }
-</style>
-""", unsafe_allow_html=True)
-
-# --- SESSION STATE INITIALIZATION ---
-if 'api_usage_cost' not in st.session_state:
-    st.session_state.api_usage_cost = 0.0
-if 'api_calls_count' not in st.session_state:
-    st.session_state.api_calls_count = 0
-if 'daily_reset' not in st.session_state:
-    st.session_state.daily_reset = datetime.now().date()
-
-# Reset daily usage
-if st.session_state.daily_reset != datetime.now().date():
-    st.session_state.api_usage_cost = 0.0
-    st.session_state.api_calls_count = 0
-    st.session_state.daily_reset = datetime.now().date()
-
-# --- COST TRACKING ---
-def estimate_cost(prompt_tokens, completion_tokens, model):
-    """Estimate API cost based on token usage"""
-    pricing = {
-        'gpt-4': {'input': 0.03, 'output': 0.06},
-        'gpt-4-turbo': {'input': 0.01, 'output': 0.03},
-        'gpt-3.5-turbo': {'input': 0.0015, 'output': 0.002},
-        'o1-preview': {'input': 0.015, 'output': 0.06},
-        'o1-mini': {'input': 0.003, 'output': 0.012}
-    }
-    
-    if model not in pricing:
-        model = 'gpt-4'  # default
+# --- ENHANCED MOBILE-RESPONSIVE SIDEBAR ---
+@fragment(run_every=STATUS_REFRESH_INTERVAL)
+def usage_and_status(api_key: str, selected_model_name: str):
+    """Spend and service status; refreshes on its own so costs stay current during fragment reruns"""
+    # Enhanced Cost Tracking
+    st.markdown("### 💰 Usage Monitor")
     
-    input_cost = (prompt_tokens / 1000) * pricing[model]['input']
-    output_cost = (completion_tokens / 1000) * pricing[model]['output']
+    ledger = get_cost_ledger()
+    daily_cost = ledger.spent_today('interactive')
+    session_cost, session_calls = ledger.user_usage()
     
-    return input_cost + output_cost
-
-def check_cost_limit():
-    """Check if we're approaching cost limit"""
-    return st.session_state.api_usage_cost < 1.0
-
-# --- AI CEO CORE CLASS ---
-class WeWineStrategicAICEO:
-    def __init__(self, api_key: str = None, model: str = "gpt-4"):
-        self.api_key = api_key or os.getenv('OPENAI_API_KEY')
-        self.model = model
-        self.api_available = self.api_key is not None
-        
-        self.company_context = """
-        COMPANY PROFILE: WeWine.app
-        
-        MISSION: To become the essential companion for the modern wine journey, blending AI technology, 
-        community, and authentic experiences. We are not just an app; we are a cultural movement that 
-        democratizes wine knowledge and creates joyful discovery experiences.
-        
-        CORE VALUE PROPOSITION: WeWine replaces wine anxiety with confident exploration. We empower users 
-        to discover wines they love through AI-powered personalization, connect with a vibrant community, 
-        and access unique wine experiences both online and offline.
-        
-        TARGET AUDIENCE:
-        - Primary: "Curious Enthusiasts" (25-45) - Digitally native, value authenticity, eager to learn 
-          but intimidated by traditional wine snobbery. They want guidance without judgment.
-        - Secondary: Boutique Wineries & Local Wine Merchants - Need direct channels to reach engaged 
-          consumers and tell their authentic stories.
-        
-        DIFFERENTIATORS (OUR MOAT):
-        1. **Hyper-Personalized Journey AI:** Goes beyond taste profiles to understand context, mood, 
-           occasions, and learning goals. Evolves with user's palate development.
-        2. **Community-Powered Discovery:** Stories and experiences drive recommendations. Friend and 
-           community trust beats algorithms alone.
-        3. **Experience-First Model:** Seamless online-to-offline integration with tastings, vineyard 
-           tours, educational sessions, and local events.
-        4. **Lisbon-Born, Global-Minded:** Authentic European wine culture foundation with global scalability.
-        
-        CURRENT METRICS:
-        - Monthly Users: 15,000 (growing 12% monthly)
-        - Conversion Rate: 3.2% (target: 5%)
-        - Customer LTV: $180
-        - Customer CAC: $25.30
-        - Monthly Revenue: $42,500
-        - App Rating: 4.4/5
-        - Markets: 5 countries
-        """
-        
-        self.system_prompt = """
-        You are "Aura," the Strategic AI Co-Founder of WeWine.app. Your persona blends:
-        - Seasoned venture-backed CEO with exits
-        - Master sommelier with deep wine knowledge  
-        - Brilliant product strategist with user obsession
-        - Growth expert with proven scaling experience
-        
-        GUIDING PRINCIPLES:
-        1. **Founder's Mentality:** Think ROI, growth levers, user LTV, sustainable competitive advantage. 
-           Every recommendation must be actionable with clear success metrics.
-        2. **User-Obsessed:** Frame decisions around removing friction and creating "wow" moments for 
-           "Curious Enthusiasts." Use behavioral psychology and UX best practices.
-        3. **Framework-Driven:** Structure analysis using OKRs, RICE scoring, AARRR metrics, Jobs-to-be-Done, 
-           and proven Go-To-Market strategies.
-        4. **Brand Voice:** Sophisticated yet accessible. Expert authority with mentor warmth. Avoid jargon.
-        5. **Strategic Depth:** Connect tactical recommendations to long-term strategic advantages and moat-building.
-        
-        OUTPUT FORMAT: Use clear Markdown with executive summaries, headers, bullet points. Start responses 
-        with 2-3 sentence strategic overview, then detailed analysis with specific action items and success metrics.
-        """
-
-    def _call_openai_api(self, user_prompt: str, system_override: str = None) -> str:
-        """Enhanced API call with cost tracking and error handling"""
-        if not self.api_available:
-            return self._generate_fallback_response(user_prompt)
-        
-        if not check_cost_limit():
-            return "💰 **Daily cost limit reached ($1.00).** Using offline insights. Upgrade or wait for daily reset."
-        
-        try:
-            system_content = system_override or self.system_prompt
-            
-            # Estimate tokens (rough approximation)
-            prompt_length = len(system_content) + len(user_prompt) + len(self.company_context)
-            estimated_prompt_tokens = prompt_length // 4  # rough estimate
-            
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": self.model,
-                    "messages": [
-                        {"role": "system", "content": system_content},
-                        {"role": "user", "content": f"{self.company_context}\n\nUSER PROMPT:\n{user_prompt}"}
-                    ],
-                    "max_tokens": 2500 if self.model.startswith('o1') else 3000,
-                    "temperature": 0.7 if not self.model.startswith('o1') else None
-                }
-            )
-            
-            response.raise_for_status()
-            result = response.json()
-            
-            # Track usage
-            if 'usage' in result:
-                usage = result['usage']
-                cost = estimate_cost(usage['prompt_tokens'], usage['completion_tokens'], self.model)
-                st.session_state.api_usage_cost += cost
-                st.session_state.api_calls_count += 1
-            
-            return result["choices"][0]["message"]["content"]
-            
-        except requests.exceptions.HTTPError as http_err:
-            error_details = response.json().get('error', {}).get('message', 'No details provided.')
-            return f"❌ **API Error:** {http_err}\n\n*Details:* {error_details}\n\nFalling back to offline analysis..."
-        except Exception as e:
-            return f"❌ **Connection Error:** {str(e)}\n\nUsing offline strategic framework..."
-
-    def _generate_fallback_response(self, user_prompt: str) -> str:
-        """Generate intelligent offline responses using business frameworks"""
-        prompt_lower = user_prompt.lower()
-        
-        if any(word in prompt_lower for word in ['market', 'competitor', 'competitive']):
-            return self._market_analysis_framework()
-        elif any(word in prompt_lower for word in ['growth', 'scaling', 'user']):
-            return self._growth_strategy_framework()
-        elif any(word in prompt_lower for word in ['product', 'feature', 'roadmap']):
-            return self._product_strategy_framework()
-        elif any(word in prompt_lower for word in ['gtm', 'go-to-market', 'launch']):
-            return self._gtm_framework()
-        else:
-            return self._general_strategic_framework()
-
-    def _market_analysis_framework(self) -> str:
-        return """
-## 🎯 **Strategic Market Analysis**
-
-### **Executive Summary**
-WeWine operates in a $350B+ global wine market with growing digital disruption. Key opportunity: 
-Millennials represent 42% of wine consumption but are underserved by existing platforms.
-
-### **Competitive Landscape Analysis**
-
-**🏆 Market Leaders:**
-- **Vivino**: 70M users, $224M funding - *Database approach, overwhelming for beginners*
-- **Delectable**: 2M users, sommelier-focused - *Expert credibility but intimidating*
-- **Firstleaf**: AI-driven, subscription model - *Limited flexibility, US-only*
-
-**💡 WeWine's Strategic Positioning:**
-*"The Anti-Vivino: Curated Discovery Over Information Overload"*
-
-### **Key Strategic Moves**
-
-1. **Blue Ocean Strategy**: Target the "Anxious Explorer" segment
-   - Focus on confidence-building vs. expertise display
-   - Simplicity over comprehensiveness
-
-2. **Community-First Differentiation**:
-   - Build trust through peer recommendations
-   - Create "Wine Discovery Circles"
-
-3. **Experience Integration**:
-   - Online-to-offline event programming
-   - Local wine bar partnerships
-
-### **Success Metrics**
-- User confidence score (NPS for wine anxiety reduction)
-- Community engagement rate (>40% monthly active discussion)
-- Experience participation rate (>15% attend events)
-
-**Next Steps:** Focus Q1 on community features, Q2 on local partnerships.
-        """
-
-    def _growth_strategy_framework(self) -> str:
-        return """
-## 📈 **Growth Strategy Framework**
-
-### **Executive Summary**
-WeWine's path to 100K users requires a three-phase approach: Community-Led Growth → 
-Viral Loops → Scaled Acquisition. Current metrics show strong product-market fit signals.
-
-### **Phase 1: Community-Led Growth (0-25K users)**
-
-**🎯 Core Strategy**: Turn early users into brand evangelists
-
-**Key Initiatives:**
-1. **Wine Discovery Challenges**
-   - Monthly themed challenges (e.g., "Italian Adventure")
-   - User-generated content with rewards
-   - Community voting and curation
-
-2. **Local Wine Ambassadors Program**
-   - 10 power users per city become ambassadors
-   - Exclusive events and early access
-   - Referral rewards and recognition
-
-3. **Strategic Partnerships**
-   - Boutique wine shops for exclusive offerings
-   - Local restaurants for pairing events
-   - Wine education platforms for content
-
-### **Phase 2: Viral Mechanics (25K-75K users)**
-
-**🚀 Viral Loops:**
-- **Social Sharing**: Beautiful wine journey visualizations
-- **Gift Recommendations**: "Send a bottle" feature
-- **Group Discoveries**: Friends can explore together
-
-### **Phase 3: Scaled Acquisition (75K-100K users)**
-
-**📊 Paid Channels:**
-- Instagram/TikTok targeted at "wine curious" demographics
-- Google Ads for high-intent searches
-- Influencer partnerships with lifestyle creators
-
-### **Success Metrics & Timeline**
-- **Month 1-3**: 15K → 25K users (67% growth)
-- **Month 4-6**: 25K → 50K users (viral coefficient 1.2)
-- **Month 7-12**: 50K → 100K users (100% growth)
-
-**Investment Required**: $150K for 12-month execution
-        """
-
-    def _product_strategy_framework(self) -> str:
-        return """
-## 🛠️ **Product Strategy Framework**
-
-### **Executive Summary**
-WeWine's product roadmap should focus on three pillars: AI Personalization Engine, 
-Community Features, and Experience Integration. RICE framework guides prioritization.
-
-### **Q1 2024: Foundation & Community (Theme: "Building Trust")**
-
-| Feature | Description | Reach | Impact | Confidence | Effort | RICE Score |
-|---------|-------------|-------|--------|------------|--------|------------|
-| **Taste Journey AI** | Advanced preference learning | 9 | 9 | 85% | 2.0 | 34.5 |
-| **Wine Discovery Feed** | Community-driven recommendations | 8 | 8 | 90% | 1.5 | 38.4 |
-| **Local Availability** | Real-time inventory integration | 7 | 9 | 70% | 3.0 | 14.7 |
-| **Social Sharing** | Beautiful wine story cards | 6 | 7 | 95% | 1.0 | 39.9 |
-
-### **Q2 2024: Engagement & Retention (Theme: "Magical Moments")**
-
-**Priority Features:**
-1. **Wine Discovery Challenges** - Gamified learning experiences
-2. **AR Label Scanner** - Instant wine information and reviews
-3. **Personalized Events** - AI-recommended local tastings
-4. **Gift Recommendations** - Occasion-based suggestions
-
-### **Q3-Q4 2024: Scale & Monetization (Theme: "Sustainable Growth")**
-
-**Advanced Features:**
-- **Cellar Management** - Track personal wine collection
-- **Advanced Analytics** - Taste evolution insights
-- **Premium Subscriptions** - Expert access and exclusive content
-- **Marketplace Integration** - Seamless purchasing experience
-
-### **Success Metrics**
-- **User Engagement**: 40% weekly active users
-- **Feature Adoption**: >60% for core features within 30 days
-- **Retention**: 35% monthly cohort retention by month 6
-- **Revenue**: $2 ARPU monthly by Q4
-
-**Technical Requirements**: React Native app, Node.js backend, ML pipeline for recommendations
-        """
-
-    def _gtm_framework(self) -> str:
-        return """
-## 🚀 **Go-To-Market Strategy Framework**
-
-### **Executive Summary**
-WeWine's GTM strategy leverages Lisbon as a beachhead market, then expands to select European 
-cities using a community-first, experience-driven approach.
-
-### **Phase 1: Lisbon Domination (Months 1-6)**
-
-**🎯 Objective**: Become the #1 wine discovery app in Lisbon with 5,000 active users
-
-**Core Tactics:**
-1. **Hyper-Local Wine Tours**
-   - Partner with 10 premium wine bars in Príncipe Real/Chiado
-   - Weekly "WeWine Wednesday" events
-   - Exclusive tastings for app users
-
-2. **Sommelier Partnership Program**
-   - Recruit 15 local wine experts as content creators
-   - Monthly "Expert Picks" features
-   - Live Q&A sessions in-app
-
-3. **Tourist Integration**
-   - Partner with premium hotels (Tivoli, Memmo Alfama)
-   - "Lisbon Wine Guide" feature for visitors
-   - Airport/tourism board partnerships
-
-### **Phase 2: European Expansion (Months 7-18)**
-
-**🌍 Target Cities**: Barcelona, Milan, Copenhagen, Amsterdam
-
-**Expansion Playbook:**
-- Hire local "Wine Community Managers"
-- Replicate Lisbon partnership model
-- Cross-market user acquisition campaigns
-
-### **Phase 3: Global Platform (Months 19-36)**
-
-**🚀 Scale Strategy:**
-- API partnerships with wine retailers
-- White-label solutions for wine regions
-- Enterprise partnerships with hospitality
-
-### **Success Metrics & Investment**
-
-**Key KPIs:**
-- **Market Penetration**: 2% of target demographic per city
-- **Event Attendance**: 500+ monthly event participants
-- **Partnership Revenue**: 30% of total revenue by month 18
-
-**Investment Required:**
-- **Phase 1**: €75K (events, partnerships, local team)
-- **Phase 2**: €300K (expansion, marketing, tech)
-- **Phase 3**: €1M+ (scaling, enterprise partnerships)
-
-### **Risk Mitigation**
-- Local competitor response → Strong community moats
-- Economic downturn → Focus on free community features
-- Partnership dependency → Diversified revenue streams
-        """
-
-    def _general_strategic_framework(self) -> str:
-        return """
-## 🎯 **Strategic Business Framework**
-
-### **Executive Summary**
-WeWine.app sits at the intersection of three growing trends: AI personalization, community commerce, 
-and experience economy. Our strategic advantage lies in combining all three effectively.
-
-### **Strategic Pillars**
-
-#### **1. AI-Powered Personalization**
-- Move beyond basic taste profiles to contextual recommendations
-- Understand user's wine journey and goals
-- Predict preferences based on mood, occasion, season
-
-#### **2. Community-Driven Discovery**
-- Trust-based recommendations over algorithmic ones
-- Social proof and peer validation
-- User-generated content and stories
-
-#### **3. Experience Integration**
-- Bridge online discovery with offline experiences
-- Create memorable moments that build brand loyalty
-- Generate multiple revenue streams
-
-### **Business Model Innovation**
-
-**Current**: Marketplace + commission model
-**Evolution**: Platform + subscription + experiences + data
-
-**Revenue Streams:**
-1. **Transaction fees** (current): 10-15% commission
-2. **Premium subscriptions**: $9.99/month for advanced features
-3. **Experience bookings**: 20% commission on events
-4. **Data insights**: B2B analytics for wineries
-
-### **Competitive Moats**
-
-1. **Data Network Effects**: More users = better recommendations
-2. **Community Lock-in**: Social connections create switching costs
-3. **Experience Infrastructure**: Physical partnerships hard to replicate
-4. **Brand Trust**: Authentic, approachable wine discovery
-
-### **Strategic Priorities**
-
-**Near-term (0-6 months):**
-- Strengthen core AI recommendation engine
-- Build vibrant community features
-- Establish local partnership network
-
-**Medium-term (6-18 months):**
-- Scale to 3-5 key markets
-- Launch premium subscription tiers
-- Develop experience marketplace
-
-**Long-term (18+ months):**
-- International expansion
-- Enterprise partnerships
-- Adjacent market opportunities
-
-### **Success Framework**
-- **Product-Market Fit**: NPS >50, retention >30%
-- **Business Model**: Unit economics positive by month 18
-- **Market Position**: Top 3 in each target market
-        """
-
-    # Enhanced Analysis Methods
-    def generate_competitive_analysis(self, competitor: str = None):
-        if competitor:
-            prompt = f"""
-            Conduct a comprehensive "David vs. Goliath" competitive analysis of WeWine.app against {competitor}.
-            
-            Focus on:
-            1. Strategic positioning opportunities where we can win
-            2. Specific product features that exploit their weaknesses
-            3. Marketing strategies that turn their size into a disadvantage
-            4. Partnership opportunities they're likely missing
-            5. Actionable competitive moves for the next 90 days
-            
-            Provide concrete examples and specific tactics we can implement immediately.
-            """
-        else:
-            prompt = """
-            Analyze the entire competitive landscape for WeWine.app. Identify:
-            1. Market gaps and white space opportunities
-            2. Competitive threats and how to counter them
-            3. Strategic partnerships we should pursue
-            4. Positioning strategy that differentiates us
-            5. Specific competitive advantages we can build
-            
-            Focus on actionable insights that drive growth and defend market position.
-            """
-        
-        return self._call_openai_api(prompt)
-
-    def generate_growth_strategy(self, focus_area: str = "user_acquisition"):
-        prompt = f"""
-        Develop a comprehensive growth strategy for WeWine.app focused on: {focus_area}
-        
-        Provide a detailed strategy including:
-        1. Specific growth tactics and experiments to run
-        2. 30-60-90 day milestone roadmap with measurable goals
-        3. Resource requirements and budget allocation
-        4. Success metrics and KPIs to track
-        5. Risk assessment and contingency plans
-        6. Competitive positioning during growth phase
-        7. Implementation priorities and quick wins
-        
-        Make recommendations specific, measurable, and implementable with current resources.
-        """
-        
-        return self._call_openai_api(prompt)
-
-    def generate_product_roadmap(self, timeframe: str = "90_days"):
-        prompt = f"""
-        Create a prioritized {timeframe} product roadmap for WeWine.app using the RICE scoring framework.
-        
-        Requirements:
-        1. Theme for the period with clear strategic focus
-        2. 5-7 prioritized features with RICE scores (Reach, Impact, Confidence, Effort)
-        3. Detailed feature descriptions with user value propositions
-        4. Technical requirements and dependencies
-        5. Success metrics for each feature
-        6. Resource allocation and team assignments
-        7. Risk mitigation for high-impact features
-        
-        Focus on features that maximize user engagement, retention, and business growth.
-        """
-        
-        return self._call_openai_api(prompt)
-
-    def multi_agent_analysis(self, query: str):
-        system_role = """
-        You are a team of specialized AI business experts for WeWine.app. Respond as multiple agents collaborating:
-        
-        🎯 **CEO Agent**: Strategic oversight, synthesis, final recommendations
-        📊 **Market Research Agent**: Competitive analysis, market sizing, trends
-        📈 **Growth Agent**: User acquisition, retention, viral strategies  
-        🛠️ **Product Agent**: Feature prioritization, UX/UI, technical roadmap
-        💰 **CFO Agent**: Financial modeling, unit economics, fundraising
-        🎨 **Brand Agent**: Positioning, messaging, community building
-        
-        Each agent provides their specialized perspective, then CEO synthesizes into actionable strategy.
-        """
-        
-        prompt = f"""
-        Multi-agent strategic analysis for WeWine.app: {query}
-        
-        Each agent should provide their expertise perspective on this question, followed by a CEO synthesis 
-        with specific action items, success metrics, and implementation timeline.
-        """
-        
-        return self._call_openai_api(prompt, system_role)
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Daily Cost", f"${daily_cost:.3f}", "")
+    with col2:
+        st.metric("API Calls", ledger.calls_today(), "")
+    st.caption(f"Your session: ${session_cost:.3f} across {session_calls} calls")
+    
+    # Enhanced progress bar
+    cost_percentage = min(daily_cost / ledger.budget, 1.0) if ledger.budget > 0 else 1.0
+    st.progress(cost_percentage)
+    
+    remaining = max(ledger.budget - daily_cost, 0.0)
+    
+    if cost_percentage >= 1.0:
+        st.error("🚫 Daily limit reached")
+    elif cost_percentage > 0.8:
+        st.warning(f"⚠️ ${remaining:.3f} remaining")
+    else:
+        st.info(f"💚 ${remaining:.3f} available")
+    
+    # System Status with better visual feedback
+    st.markdown("### 📊 Status")
+    
+    circuit = get_circuit_breaker().snapshot()
+    if api_key and circuit['state'] == CircuitBreaker.OPEN:
+        st.markdown('<div class="status-offline">🟠 AI Service Degraded</div>', unsafe_allow_html=True)
+        st.caption(f"Circuit open after repeated API failures - retrying in {circuit['retry_in']:.0f}s")
+    elif api_key:
+        st.markdown('<div class="status-connected">🟢 AI CEO Online</div>', unsafe_allow_html=True)
+        st.caption(f"Model: {selected_model_name}")
+    else:
+        st.markdown('<div class="status-offline">🔴 Offline Mode</div>', unsafe_allow_html=True)
+        st.caption("Framework Analysis Only")
+    queue = get_request_scheduler().stats()
+    if queue['queue_depth']:
+        st.caption(f"🚦 {queue['queue_depth']} request(s) queued for rate limits "
+                   f"(avg wait {queue['avg_wait']:.1f}s)")
 
-# --- ENHANCED MOBILE-RESPONSIVE SIDEBAR ---
 def setup_sidebar():
     with st.sidebar:
         st.markdown('<h2 style="color: #B8860B; text-align: center; margin-bottom: 1.5rem;">🍷 AI CEO Control</h2>', unsafe_allow_html=True)
@@ -905,61 +237,25 @@ def setup_sidebar():
         
         # Model Selection with better layout
         with st.expander("🧠 AI Model", expanded=False):
-            model_options = {
-                "GPT-4": "gpt-4",
-                "GPT-4 Turbo": "gpt-4-turbo-preview", 
-                "GPT-3.5 Turbo": "gpt-3.5-turbo",
-                "O1-Preview": "o1-preview",
-                "O1-Mini": "o1-mini"
-            }
-            
             selected_model_name = st.selectbox(
                 "Choose AI Model:",
-                list(model_options.keys()),
+                list(MODEL_OPTIONS.keys()),
                 index=0,
                 help="O1 models are best for complex reasoning"
             )
             
-            selected_model = model_options[selected_model_name]
-        
-        # Enhanced Cost Tracking
-        st.markdown("### 💰 Usage Monitor")
-        
-        col1, col2 = st.columns(2)
-        with col1:
-            st.metric("Daily Cost", f"${st.session_state.api_usage_cost:.3f}", "")
-        with col2:
-            st.metric("API Calls", st.session_state.api_calls_count, "")
-        
-        # Enhanced progress bar
-        cost_percentage = min(st.session_state.api_usage_cost / 1.0, 1.0)
-        st.progress(cost_percentage)
-        
-        remaining = 1.0 - st.session_state.api_usage_cost
-        
-        if cost_percentage > 0.8:
-            st.warning(f"⚠️ ${remaining:.3f} remaining")
-        elif cost_percentage >= 1.0:
-            st.error("🚫 Daily limit reached")
-        else:
-            st.info(f"💚 ${remaining:.3f} available")
-        
-        # System Status with better visual feedback
-        st.markdown("### 📊 Status")
-        
-        if api_key:
-            st.markdown('<div class="status-connected">🟢 AI CEO Online</div>', unsafe_allow_html=True)
-            st.caption(f"Model: {selected_model_name}")
-        else:
-            st.markdown('<div class="status-offline">🔴 Offline Mode</div>', unsafe_allow_html=True)
-            st.caption("Framework Analysis Only")
+            selected_model = MODEL_OPTIONS[selected_model_name]
+
+            st.toggle("Stream responses", value=True, key="stream_responses",
+                      help="Show the answer token-by-token as it is generated")
+            st.toggle("Parallel multi-agent", value=MULTI_AGENT_MODE == 'parallel', key="parallel_agents",
+                      help="Run the specialist agents concurrently, then a CEO synthesis")
+            st.toggle("Force refresh", value=False, key="force_refresh",
+                      help="Skip cached analyses and regenerate them from the AI")
+            st.toggle("Background jobs", value=True, key="background_jobs",
+                      help="Run roadmaps and multi-agent analyses as jobs that survive tab switches and reloads")
         
-        # Quick Actions
-        if st.button("🔄 Reset Usage", help="Reset daily API usage", use_container_width=True):
-            st.session_state.api_usage_cost = 0.0
-            st.session_state.api_calls_count = 0
-            st.success("✅ Usage reset!")
-            st.rerun()
+        usage_and_status(api_key, selected_model_name)
         
         # Compact Business Metrics
         with st.expander("📈 Key Metrics"):
@@ -990,9 +286,11 @@ def ai_ceo_dashboard(ai_ceo):
     # Compact Agent Overview for mobile
     st.subheader("🤖 AI Advisory Team")
     
-    # Responsive grid layout
-    col1, col2, col3 = st.columns(3)
-    
+    # Responsive grid layout, pre-rendered as a single element
+    st.markdown(agent_grid_html(), unsafe_allow_html=True)
+
+@st.cache_data
+def agent_grid_html() -> str:
     agents = [
         ("🎯 CEO Agent", "Strategic Leadership"),
         ("📊 Market Research", "Competitive Intel"),
@@ -1002,12 +300,154 @@ def ai_ceo_dashboard(ai_ceo):
         ("🎨 Brand Agent", "Market Positioning")
     ]
     
-    for i, (title, desc) in enumerate(agents):
-        col = [col1, col2, col3][i % 3]
-        with col:
-            st.markdown(f'<div class="agent-card">{title}<br><small>{desc}</small></div>', unsafe_allow_html=True)
+    cards = "".join(f'<div class="agent-card">{title}<br><small>{desc}</small></div>' for title, desc in agents)
+    return f'<div class="agent-grid">{cards}</div>'
+
+# --- AI RESPONSE RENDERING ---
+STREAM_RENDER_INTERVAL = 0.05  # seconds between incremental placeholder updates
+
+response_box_ids = itertools.count()
+
+def render_ai_response(response, header: str = None) -> tuple:
+    """Render a full or streamed AI response into the .ai-response container.
+
+    A stream is converted block by block: each finished block is written once as
+    its own element and only the open block is redrawn, so updates stay small
+    however long the response grows. Returns (text, answered), ``answered`` being
+    False when any of it was an OfflineAnswer rather than the model's reply.
+    """
+    heading = f"<h4>{html.escape(header)}</h4>" if header else ""
+    started = time.perf_counter()
+
+    if isinstance(response, str):
+        st.markdown(f'<div class="ai-response">{heading}{markdown_to_html(response)}</div>', unsafe_allow_html=True)
+        get_metrics().observe('wewine_render_seconds', time.perf_counter() - started, mode='full')
+        return response, is_model_answer(response)
+
+    box = st.container(key=f"ai-response-{next(response_box_ids)}", gap=None)
+    if heading:
+        box.markdown(heading, unsafe_allow_html=True)
+    renderer = StreamingMarkdown()
+    tail = box.empty()
+    parts = []
+    last_render = 0.0
+
+    def emit(blocks):
+        nonlocal tail
+        for block in blocks:
+            tail.markdown(block, unsafe_allow_html=True)
+            tail = box.empty()
+
+    for chunk in response:
+        parts.append(chunk)
+        emit(renderer.feed(chunk))
+        now = time.monotonic()
+        if now - last_render >= STREAM_RENDER_INTERVAL:
+            tail.markdown(renderer.preview() + "▌", unsafe_allow_html=True)
+            last_render = now
+
+    emit(renderer.close())
+    tail.empty()
+    # includes waiting on the stream; the upstream share is in wewine_stage_seconds
+    get_metrics().observe('wewine_render_seconds', time.perf_counter() - started, mode='stream')
+    text = "".join(parts)
+    return text, bool(text) and all(is_model_answer(part) for part in parts if part)
+
+def call_options() -> dict:
+    """Per-session request options chosen in the sidebar"""
+    return {
+        "stream": st.session_state.get('stream_responses', True),
+        "force_refresh": st.session_state.get('force_refresh', False)
+    }
+
+def run_in_background(ai_ceo) -> bool:
+    """Whether long analyses should go to the job queue for this session"""
+    return ai_ceo.api_available and st.session_state.get('background_jobs', True)
+
+def start_job(slot: str, ai_ceo, kind: str, **params) -> str:
+    """Queue a background analysis and remember it in the session and the page URL"""
+    job_id = get_job_runner().submit(kind, params, ai_ceo.api_key, ai_ceo.model)
+    st.session_state.setdefault('jobs', {})[slot] = job_id
+    st.query_params[f"job_{slot}"] = job_id
+    return job_id
+
+def active_job(slot: str) -> str:
+    """Job shown in ``slot``, recovered from the URL after a page reload"""
+    jobs = st.session_state.setdefault('jobs', {})
+    if slot not in jobs and f"job_{slot}" in st.query_params:
+        jobs[slot] = st.query_params[f"job_{slot}"]
+    return jobs.get(slot)
+
+def dismiss_job(slot: str):
+    st.session_state.get('jobs', {}).pop(slot, None)
+    st.query_params.pop(f"job_{slot}", None)
+
+def job_progress(job_id: str):
+    """Pending-job notice; reruns the page once the job has landed"""
+    job = get_job_runner().store.get(job_id)
+    if job is None or job['status'] not in JOB_PENDING:
+        st.rerun()
+    waited = time.time() - job['created_at']
+    st.info(f"⏳ Analysis {job['status']} in the background ({waited:.0f}s). "
+            "You can switch tabs or reload - the result will be waiting here.")
+    if not hasattr(st, 'fragment'):
+        st.button("🔄 Check status", key=f"poll_{job_id}")
+
+job_progress = fragment(job_progress, run_every=JOB_POLL_INTERVAL)
+
+def render_job(slot: str, header: str = None, on_done=None):
+    """Show the background job in ``slot``: live progress, its result, or its failure.
+
+    ``on_done(job)`` is called on every render of a finished job, so it must be idempotent.
+    """
+    job_id = active_job(slot)
+    if not job_id:
+        return
+    job = get_job_runner().store.get(job_id)
+    if job is None:
+        dismiss_job(slot)
+        return
+    if job['status'] in JOB_PENDING:
+        job_progress(job_id)
+        return
+
+    if job['status'] == 'done':
+        render_ai_response(job['result'], header)
+        if on_done:
+            on_done(job)
+    elif job['status'] == 'expired':
+        st.warning(f"⌛ Background analysis expired: {job['error']}")
+    else:
+        st.error(f"❌ Background analysis failed: {job['error']}")
+    st.button("✖ Dismiss", key=f"dismiss_{slot}", on_click=dismiss_job, args=(slot,))
+
+def active_conversation() -> str:
+    """Strategic Consultation thread of this session, recovered from the URL after a reload"""
+    if 'conversation_id' not in st.session_state:
+        st.session_state.conversation_id = st.query_params.get("conversation") or uuid.uuid4().hex
+    st.query_params["conversation"] = st.session_state.conversation_id
+    return st.session_state.conversation_id
+
+def new_conversation():
+    st.session_state.conversation_id = uuid.uuid4().hex
+    st.session_state.pop('job_questions', None)
+    dismiss_job("team")
+
+def conversation_caption(conversation_id: str):
+    store = get_conversation_store()
+    summarized = store.summary(conversation_id)['through']
+    recent = len(store.turns(conversation_id, after=summarized))
+    if summarized + recent == 0:
+        return
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        earlier = f" ({summarized} summarized)" if summarized else ""
+        st.caption(f"🧵 Follow-ups build on {summarized + recent} earlier exchange(s){earlier}.")
+    with col2:
+        st.button("🧹 New conversation", on_click=new_conversation, use_container_width=True)
 
 # --- ENHANCED STRATEGIC ANALYSIS TAB ---
+@fragment
 def strategic_analysis_tab(ai_ceo):
     st.header("🎯 Strategic Analysis")
     
@@ -1017,29 +457,32 @@ def strategic_analysis_tab(ai_ceo):
     # Single column layout for mobile-first
     if st.button("🏆 Competitive Analysis", use_container_width=True):
         with st.spinner("🤖 Analyzing competitive landscape..."):
-            response = ai_ceo.generate_competitive_analysis()
-            st.markdown(f'<div class="ai-response">{response}</div>', unsafe_allow_html=True)
+            response = ai_ceo.generate_competitive_analysis(**call_options())
+            render_ai_response(response)
     
     # Inline selectors for better mobile UX
     col1, col2 = st.columns(2)
     with col1:
-        growth_focus = st.selectbox("Growth Focus", 
-                                   ["user_acquisition", "retention", "monetization", 
-                                    "market_expansion", "product_growth"], key="growth_focus")
+        growth_focus = st.selectbox("Growth Focus", GROWTH_FOCUSES, key="growth_focus")
     
     with col2:
-        roadmap_period = st.selectbox("Roadmap Period", 
-                                     ["90_days", "6_months", "1_year"], key="roadmap_period")
+        roadmap_period = st.selectbox("Roadmap Period", ROADMAP_PERIODS, key="roadmap_period")
     
     if st.button("📈 Growth Strategy", use_container_width=True):
         with st.spinner(f"📈 Developing {growth_focus} strategy..."):
-            response = ai_ceo.generate_growth_strategy(growth_focus)
-            st.markdown(f'<div class="ai-response">{response}</div>', unsafe_allow_html=True)
+            response = ai_ceo.generate_growth_strategy(growth_focus, **call_options())
+            render_ai_response(response)
     
     if st.button("🛠️ Product Roadmap", use_container_width=True):
-        with st.spinner(f"🛠️ Creating {roadmap_period} roadmap..."):
-            response = ai_ceo.generate_product_roadmap(roadmap_period)
-            st.markdown(f'<div class="ai-response">{response}</div>', unsafe_allow_html=True)
+        dismiss_job("roadmap")
+        if run_in_background(ai_ceo):
+            start_job("roadmap", ai_ceo, "product_roadmap", timeframe=roadmap_period,
+                      force_refresh=call_options()["force_refresh"])
+        else:
+            with st.spinner(f"🛠️ Creating {roadmap_period} roadmap..."):
+                response = ai_ceo.generate_product_roadmap(roadmap_period, **call_options())
+                render_ai_response(response)
+    render_job("roadmap")
     
     st.divider()
     
@@ -1048,15 +491,7 @@ def strategic_analysis_tab(ai_ceo):
     
     # Expandable examples for cleaner mobile view
     with st.expander("💡 Example Questions"):
-        query_examples = [
-            "How can WeWine achieve 100K users in 12 months?",
-            "What's our best strategy against Vivino's dominance?",
-            "How should we price our premium subscription?",
-            "What partnerships should we prioritize for growth?",
-            "How can we improve our conversion rate from 3.2% to 5%?"
-        ]
-        
-        for example in query_examples:
+        for example in QUERY_EXAMPLES:
             if st.button(f"📝 {example}", key=f"example_{example[:20]}", use_container_width=True):
                 st.session_state.custom_query = example
     
@@ -1069,22 +504,49 @@ def strategic_analysis_tab(ai_ceo):
         key="custom_query_input"
     )
     
+    conversation_id = active_conversation()
+    conversation_caption(conversation_id)
+    
     # Action buttons with better mobile layout
     col1, col2 = st.columns(2)
     
     with col1:
         if st.button("🧠 Single Agent", type="primary", use_container_width=True) and custom_query:
             with st.spinner("🧠 AI CEO analyzing..."):
-                response = ai_ceo._call_openai_api(custom_query)
-                st.markdown(f'<div class="ai-response"><h4>🧠 AI CEO Response</h4>{response}</div>', unsafe_allow_html=True)
+                prompt = ai_ceo.conversation_prompt(conversation_id, custom_query)
+                # paraphrase matching ignores context, so only first questions use the semantic cache
+                semantic_mode = "single_agent" if prompt == custom_query else None
+                response = ai_ceo._call_openai_api(prompt, use_cache=True, semantic_mode=semantic_mode,
+                                                   priority=PRIORITY_INTERACTIVE, **call_options())
+                answer, answered = render_ai_response(response, "🧠 AI CEO Response")
+                if answered:
+                    ai_ceo.record_turn(conversation_id, custom_query, answer)
     
     with col2:
         if st.button("👥 Multi-Agent", type="primary", use_container_width=True) and custom_query:
-            with st.spinner("👥 Multi-agent team collaborating..."):
-                response = ai_ceo.multi_agent_analysis(custom_query)
-                st.markdown(f'<div class="ai-response"><h4>👥 Team Analysis</h4>{response}</div>', unsafe_allow_html=True)
+            dismiss_job("team")
+            query = ai_ceo.conversation_prompt(conversation_id, custom_query)
+            if run_in_background(ai_ceo):
+                job_id = start_job("team", ai_ceo, "multi_agent", query=query,
+                                   parallel=st.session_state.get('parallel_agents'),
+                                   force_refresh=call_options()["force_refresh"])
+                st.session_state.setdefault('job_questions', {})[job_id] = custom_query
+            else:
+                with st.spinner("👥 Multi-agent team collaborating..."):
+                    response = ai_ceo.multi_agent_analysis(query, parallel=st.session_state.get('parallel_agents'),
+                                                           **call_options())
+                    answer, answered = render_ai_response(response, "👥 Team Analysis")
+                    if answered:
+                        ai_ceo.record_turn(conversation_id, custom_query, answer)
+
+    def remember_team_answer(job):
+        question = st.session_state.get('job_questions', {}).get(job['id'])
+        if question and job['answered']:
+            ai_ceo.record_turn(conversation_id, question, job['result'], ref=job['id'])
+    render_job("team", "👥 Team Analysis", on_done=remember_team_answer)
 
 # --- ENHANCED COMPETITOR ANALYSIS TAB ---
+@fragment
 def competitor_analysis_tab(ai_ceo):
     st.header("🏆 Competitive Intelligence")
     
@@ -1092,37 +554,21 @@ def competitor_analysis_tab(ai_ceo):
     st.subheader("📊 Market Landscape")
     
     # Responsive metrics grid
-    metrics_data = [
-        ("Total Competitors", "20+"),
-        ("Market Leaders", "5"),
-        ("Total Funding", "$350M+"),
-        ("Combined Users", "85M+")
-    ]
-    
     cols = st.columns(2)
-    for i, (metric, value) in enumerate(metrics_data):
+    for i, (metric, value) in enumerate(MARKET_LANDSCAPE):
         with cols[i % 2]:
             st.metric(metric, value)
     
-    # Competitor database with better mobile layout
-    competitors = {
-        "Vivino": {"users": "70M+", "funding": "$224M", "strength": "Massive community", "weakness": "Information overload"},
-        "Delectable": {"users": "2M+", "funding": "$15M+", "strength": "Expert curation", "weakness": "Intimidating for beginners"},
-        "Firstleaf": {"users": "1M+", "funding": "$27.6M", "strength": "AI accuracy", "weakness": "US-only, subscription lock-in"},
-        "Wine-Searcher": {"users": "5M+", "funding": "Private", "strength": "Price data", "weakness": "Complex interface"},
-        "Nakedwines": {"users": "964K", "funding": "$10M", "strength": "Unique model", "weakness": "Limited selection"}
-    }
-    
     st.subheader("🎯 Competitor Analysis")
     
     selected_competitor = st.selectbox(
         "Select Competitor:",
-        list(competitors.keys()),
-        format_func=lambda x: f"{x} ({competitors[x]['users']} users)"
+        list(COMPETITORS.keys()),
+        format_func=lambda x: f"{x} ({COMPETITORS[x]['users']} users)"
     )
     
     if selected_competitor:
-        comp_data = competitors[selected_competitor]
+        comp_data = COMPETITORS[selected_competitor]
         
         # Mobile-friendly info display
         with st.expander(f"📋 {selected_competitor} Details", expanded=True):
@@ -1133,46 +579,49 @@ def competitor_analysis_tab(ai_ceo):
         
         if st.button(f"🔍 Analyze {selected_competitor}", use_container_width=True):
             with st.spinner(f"🔍 Analyzing {selected_competitor}..."):
-                analysis = ai_ceo.generate_competitive_analysis(selected_competitor)
-                st.markdown(f'<div class="ai-response"><h4>🔍 {selected_competitor} Analysis</h4>{analysis}</div>', unsafe_allow_html=True)
+                analysis = ai_ceo.generate_competitive_analysis(selected_competitor, **call_options())
+                render_ai_response(analysis, f"🔍 {selected_competitor} Analysis")
     
     # Strategic positioning with better UX
     st.subheader("📈 Positioning Strategy")
     
-    positioning_questions = [
-        "How should WeWine position against market leaders?",
-        "What's our unique value proposition vs. Vivino?", 
-        "Which competitor should we target first?",
-        "What partnerships can counter competitor advantages?"
-    ]
-    
-    selected_question = st.selectbox("Strategic Question:", positioning_questions)
+    selected_question = st.selectbox("Strategic Question:", POSITIONING_QUESTIONS)
     
     if st.button("💡 Get Strategy", use_container_width=True):
         with st.spinner("💡 Developing positioning strategy..."):
-            response = ai_ceo._call_openai_api(selected_question)
-            st.markdown(f'<div class="ai-response"><h4>💡 Positioning Strategy</h4>{response}</div>', unsafe_allow_html=True)
+            response = ai_ceo._call_openai_api(selected_question, use_cache=True, **call_options())
+            render_ai_response(response, "💡 Positioning Strategy")
 
 # --- ENHANCED BUSINESS METRICS TAB ---
+# Building a Plotly Express figure costs tens of milliseconds; the charts are
+# static, so they are built once per process and only serialized per run.
+@st.cache_resource(show_spinner=False)
+def growth_figures() -> tuple:
+    months = GROWTH_TREND['months']
+    
+    # Revenue chart
+    fig_revenue = px.line(x=months, y=GROWTH_TREND['revenue'], title="💰 Revenue Growth")
+    fig_revenue.update_traces(line=dict(color='#B8860B', width=3))
+    fig_revenue.update_layout(height=300, margin=dict(l=20, r=20, t=40, b=20))
+    
+    # User growth chart
+    fig_users = px.bar(x=months, y=GROWTH_TREND['users'], title="👥 User Growth")
+    fig_users.update_traces(marker_color='#722F37')
+    fig_users.update_layout(height=300, margin=dict(l=20, r=20, t=40, b=20))
+    return fig_revenue, fig_users
+
 def business_metrics_tab():
     st.header("📊 Business Intelligence")
     
     # Mobile-optimized KPI grid
     st.subheader("📈 Key Metrics")
     
-    metrics_data = [
-        ("Monthly Users", "15,000", "+12%", "success"),
-        ("Monthly Revenue", "$42,500", "+8%", "success"), 
-        ("Conversion Rate", "3.2%", "+0.3%", "normal"),
-        ("LTV:CAC", "7.1:1", "+0.5", "success")
-    ]
-    
     # Responsive 2x2 grid for mobile
-    for i in range(0, len(metrics_data), 2):
+    for i in range(0, len(BUSINESS_KPIS), 2):
         cols = st.columns(2)
         for j, col in enumerate(cols):
-            if i + j < len(metrics_data):
-                metric, value, delta, _ = metrics_data[i + j]
+            if i + j < len(BUSINESS_KPIS):
+                metric, value, delta = BUSINESS_KPIS[i + j]
                 with col:
                     st.metric(metric, value, delta)
     
@@ -1180,50 +629,26 @@ def business_metrics_tab():
     st.subheader("📈 Growth Trends")
     
     # Single column layout for better mobile viewing
-    months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun']
-    revenue = [35000, 37000, 39000, 41000, 38000, 42500]
-    users = [8000, 9200, 10500, 11800, 13200, 15000]
-    
-    # Revenue chart
-    fig_revenue = px.line(x=months, y=revenue, title="💰 Revenue Growth")
-    fig_revenue.update_traces(line=dict(color='#B8860B', width=3))
-    fig_revenue.update_layout(height=300, margin=dict(l=20, r=20, t=40, b=20))
+    fig_revenue, fig_users = growth_figures()
     st.plotly_chart(fig_revenue, use_container_width=True)
-    
-    # User growth chart
-    fig_users = px.bar(x=months, y=users, title="👥 User Growth")
-    fig_users.update_traces(marker_color='#722F37')
-    fig_users.update_layout(height=300, margin=dict(l=20, r=20, t=40, b=20))
     st.plotly_chart(fig_users, use_container_width=True)
     
     # Business health check with expandable sections
     st.subheader("💊 Business Health")
     
     with st.expander("✅ Strengths", expanded=True):
-        strengths = [
-            "Strong user growth (+12% monthly)",
-            "Healthy LTV:CAC ratio (7.1:1)",
-            "Good app rating (4.4/5)",
-            "Growing revenue (+8% monthly)"
-        ]
-        for strength in strengths:
+        for strength in BUSINESS_STRENGTHS:
             st.write(f"• {strength}")
     
     with st.expander("🎯 Areas for Improvement"):
-        improvements = [
-            "Conversion rate below target (3.2% vs 5%)",
-            "Need to reduce customer acquisition cost",
-            "Increase average order value",
-            "Improve retention rates"
-        ]
-        for improvement in improvements:
+        for improvement in BUSINESS_IMPROVEMENTS:
             st.write(f"• {improvement}")
 
 # --- ENHANCED FEATURE SHOWCASE TAB ---
-def feature_showcase_tab():
-    st.header("✨ AI Capabilities")
-    
-    # Mobile-optimized feature showcase
+# Static sections are pre-rendered to one Markdown string per expander and
+# memoized, so reruns emit a handful of unchanged elements instead of one per line.
+@st.cache_data
+def feature_sections() -> list:
     features = {
         "🎯 Strategic Analysis": [
             "Market positioning and competitive analysis",
@@ -1251,10 +676,16 @@ def feature_showcase_tab():
         ]
     }
     
-    for category, items in features.items():
+    return [(category, "\n".join(f"• {item}  " for item in items)) for category, items in features.items()]
+
+@fragment
+def feature_showcase_tab():
+    st.header("✨ AI Capabilities")
+    
+    # Mobile-optimized feature showcase
+    for category, body in feature_sections():
         with st.expander(category, expanded=False):
-            for item in items:
-                st.write(f"• {item}")
+            st.markdown(body)
     
     # Demo examples with better mobile UX
     st.subheader("🎬 Try These Examples")
@@ -1285,90 +716,192 @@ def feature_showcase_tab():
                 st.success("✅ Query copied! Paste it in Strategic Analysis tab.")
 
 # --- ENHANCED HELP TAB ---
+@st.cache_data
+def help_sections() -> list:
+    setup_steps = [
+        ("1. API Key Setup", "Add your OpenAI API key via sidebar or .env file"),
+        ("2. Model Selection", "Choose between GPT-4, GPT-3.5, or O1 reasoning models"),
+        ("3. Cost Control", f"Shared daily budget of \\${DAILY_BUDGET:.2f} across all users prevents overspend"),
+        ("4. Offline Mode", "Framework-based analysis when API unavailable")
+    ]
+    
+    practices = [
+        "Be specific in your questions for better AI responses",
+        "Use multi-agent analysis for complex strategic decisions",
+        "Ask follow-ups in Strategic Consultation - earlier answers are remembered; start a new conversation to change topic",
+        "Try competitor analysis before developing positioning",
+        "Review business metrics regularly to track progress"
+    ]
+    
+    issues = [
+        ("API Errors", "Check your API key and OpenAI account balance"),
+        ("Cost Limit", "Wait for daily reset or raise WEWINE_DAILY_BUDGET"),
+        ("Slow Responses", "O1 models take longer but provide better reasoning; run `python warmup.py` off-peak to precompute the canned analyses"),
+        ("No Response", "Check internet connection and API key validity"),
+        ("Working Offline", "Run `python mock_server.py` and set OPENAI_BASE_URL=http://127.0.0.1:8787/v1"),
+        ("Pipeline Metrics", "Off by default: WEWINE_ADMIN_TAB=1 adds the 📡 Admin tab, "
+                             "WEWINE_METRICS_PORT=9464 serves Prometheus /metrics")
+    ]
+    
+    resources = [
+        ("[OpenAI API Keys](https://platform.openai.com/api-keys)", "Get your API key"),
+        ("[WeWine Strategy](https://wewine.app/)", "Company information"),
+        ("[Business Canvas](https://canvanizer.com/)", "Strategy planning tool")
+    ]
+    
+    return [
+        ("🔧 Setup Guide", True, "\n\n".join(f"**{step}**\n\n{detail}" for step, detail in setup_steps)),
+        ("💡 Best Practices", False, "\n".join(f"• {practice}  " for practice in practices)),
+        ("🆘 Troubleshooting", False, "\n\n".join(f"**{issue}:** {solution}" for issue, solution in issues)),
+        ("🔗 Useful Resources", False, "\n".join(f"• {resource} - {desc}  " for resource, desc in resources))
+    ]
+
 def help_documentation_tab():
     st.header("📚 Help & Documentation")
     
     # Mobile-optimized help sections
-    with st.expander("🔧 Setup Guide", expanded=True):
-        st.write("**1. API Key Setup**")
-        st.write("Add your OpenAI API key via sidebar or .env file")
-        
-        st.write("**2. Model Selection**")
-        st.write("Choose between GPT-4, GPT-3.5, or O1 reasoning models")
-        
-        st.write("**3. Cost Control**")
-        st.write("Daily usage capped at $1.00 to prevent overspend")
-        
-        st.write("**4. Offline Mode**")
-        st.write("Framework-based analysis when API unavailable")
-    
-    with st.expander("💡 Best Practices"):
-        practices = [
-            "Be specific in your questions for better AI responses",
-            "Use multi-agent analysis for complex strategic decisions",
-            "Try competitor analysis before developing positioning",
-            "Review business metrics regularly to track progress"
+    for title, expanded, body in help_sections():
+        with st.expander(title, expanded=expanded):
+            st.markdown(body)
+
+# --- ADMIN TAB ---
+# opt-in: WEWINE_ADMIN_TAB=1 adds the tab; its Prometheus endpoint needs WEWINE_METRICS_PORT as well
+ADMIN_TAB = os.getenv('WEWINE_ADMIN_TAB', '0').lower() in ('1', 'true', 'yes')
+
+def latency_rows(name: str, scale: float = 1000.0) -> list:
+    """Percentile rows of a histogram, latencies in milliseconds"""
+    rows = []
+    for row in sorted(get_metrics().percentiles(name), key=lambda row: -row['count']):
+        rows.append({key: round(value * scale, 1) if key in ('mean', 'p50', 'p95', 'p99') else value
+                     for key, value in row.items()})
+    return rows
+
+def admin_tab():
+    st.header("📡 Pipeline Metrics")
+    metrics = get_metrics()
+    if METRICS_PORT:
+        st.caption(f"Prometheus endpoint: `http://{METRICS_HOST}:{METRICS_PORT}/metrics` - "
+                   f"percentiles cover the last {METRICS_WINDOW} samples per series")
+    else:
+        st.caption("Prometheus endpoint disabled (set WEWINE_METRICS_PORT to enable)")
+
+    st.subheader("⚡ Cache & Throughput")
+    cols = st.columns(3)
+    for col, (label, stats) in zip(cols, (("Response cache", get_response_cache().stats()),
+                                          ("Semantic cache", get_semantic_cache().stats()))):
+        lookups = stats['hits'] + stats['misses']
+        with col:
+            st.metric(f"{label} hit rate", f"{stats['hits'] / lookups:.0%}" if lookups else "-",
+                      f"{lookups} lookups", delta_color="off")
+    throughput = metrics.percentiles('wewine_completion_tokens_per_second')
+    with cols[2]:
+        samples = sum(row['count'] for row in throughput)
+        mean = sum(row['mean'] * row['count'] for row in throughput) / samples if samples else None
+        st.metric("Completion tokens/s", f"{mean:.0f}" if mean else "-", f"{samples} calls", delta_color="off")
+
+    sections = [
+        ("⏱️ Latency by entry point (ms)", latency_rows('wewine_request_seconds')),
+        ("🌐 Upstream calls (ms)", latency_rows('wewine_llm_call_seconds')),
+        ("🔬 Time by pipeline stage (ms)", latency_rows('wewine_stage_seconds')),
+        ("🖼️ Rendering (ms)", latency_rows('wewine_render_seconds')),
+        ("🚀 Token throughput (tokens/s)", latency_rows('wewine_completion_tokens_per_second', scale=1.0)),
+    ]
+    for title, rows in sections:
+        st.subheader(title)
+        if rows:
+            st.dataframe(rows, use_container_width=True, hide_index=True)
+        else:
+            st.caption("No samples yet.")
+
+    tokens = [{**labels, 'tokens': int(value)} for labels, value in metrics.counters('wewine_tokens_total')]
+    if tokens:
+        st.subheader("🔢 Tokens charged")
+        st.dataframe(tokens, use_container_width=True, hide_index=True)
+
+    with st.expander("🕒 Recent upstream calls"):
+        calls = [
+            {'at': datetime.fromtimestamp(call['at']).strftime('%H:%M:%S'), 'entry': call['entry'],
+             'model': call['model'], 'stream': call['stream'], 'outcome': call['outcome'],
+             'total_ms': round(call['seconds'] * 1000, 1),
+             **{f"{stage}_ms": round(seconds * 1000, 1) for stage, seconds in call['stages'].items()}}
+            for call in reversed(list(metrics.calls))
         ]
-        for practice in practices:
-            st.write(f"• {practice}")
+        if calls:
+            st.dataframe(calls, use_container_width=True, hide_index=True)
+        else:
+            st.caption("No upstream calls yet.")
+
+    with st.expander("🛡️ Resilience, scheduler & cache state"):
+        st.dataframe([{'metric': name, **labels, 'value': value} for name, _, labels, value in metrics.gauges()],
+                     use_container_width=True, hide_index=True)
+
+    with st.expander("📄 Prometheus exposition"):
+        st.code(metrics.render_prometheus(), language="text")
+
+# --- RUN PROFILE REPORT ---
+def profile_report():
+    """Store this run's timing breakdown and show it when profiling is enabled"""
+    report = profiler.report()
+    st.session_state['_run_profile'] = report
     
-    with st.expander("🆘 Troubleshooting"):
-        issues = [
-            ("API Errors", "Check your API key and OpenAI account balance"),
-            ("Cost Limit", "Wait for daily reset or increase limit in code"),
-            ("Slow Responses", "O1 models take longer but provide better reasoning"),
-            ("No Response", "Check internet connection and API key validity")
-        ]
-        for issue, solution in issues:
-            st.write(f"**{issue}:** {solution}")
+    if not (PROFILE_ENABLED or st.query_params.get('profile')):
+        return
     
-    with st.expander("🔗 Useful Resources"):
-        resources = [
-            ("[OpenAI API Keys](https://platform.openai.com/api-keys)", "Get your API key"),
-            ("[WeWine Strategy](https://wewine.app/)", "Company information"),
-            ("[Business Canvas](https://canvanizer.com/)", "Strategy planning tool")
-        ]
-        for resource, desc in resources:
-            st.write(f"• {resource} - {desc}")
+    with st.sidebar.expander("⏱️ Performance", expanded=False):
+        st.caption(f"Script run: {report['total'] * 1000:.1f} ms")
+        for name, seconds in report['spans']:
+            col1, col2 = st.columns([2, 1])
+            with col1:
+                st.caption(name)
+            with col2:
+                st.write(f"{seconds * 1000:.1f} ms")
 
 # --- MAIN APPLICATION ---
 def main():
+    # --- PAGE CONFIGURATION ---
+    st.set_page_config(
+        page_title="WeWine.app Strategic AI Co-Founder",
+        page_icon="🍷",
+        layout="wide",
+        initial_sidebar_state="collapsed"  # Better for mobile
+    )
+    
+    with profiler.span("css injection"):
+        inject_styles()
+    
     # Initialize session state for mobile UX
     if 'custom_query' not in st.session_state:
         st.session_state.custom_query = ''
+    bind_session()
     
     # Setup sidebar and get configuration
-    api_key, selected_model = setup_sidebar()
+    with profiler.span("sidebar"):
+        api_key, selected_model = setup_sidebar()
     
-    # Initialize AI CEO
-    ai_ceo = WeWineStrategicAICEO(api_key=api_key, model=selected_model)
+    # Shared AI CEO engine for this key and model
+    with profiler.span("engine init"):
+        ai_ceo = get_ai_ceo(api_key, selected_model)
     
     # Main dashboard
-    ai_ceo_dashboard(ai_ceo)
-    
-    # Enhanced mobile-friendly navigation
-    tab1, tab2, tab3, tab4, tab5 = st.tabs([
-        "🎯 Strategy",
-        "🏆 Competitors", 
-        "📊 Metrics",
-        "✨ Features",
-        "📚 Help"
-    ])
-    
-    with tab1:
-        strategic_analysis_tab(ai_ceo)
-    
-    with tab2:
-        competitor_analysis_tab(ai_ceo)
-    
-    with tab3:
-        business_metrics_tab()
-    
-    with tab4:
-        feature_showcase_tab()
-    
-    with tab5:
-        help_documentation_tab()
+    with profiler.span("dashboard"):
+        ai_ceo_dashboard(ai_ceo)
+    
+    # Enhanced mobile-friendly navigation; only the open tab's body runs
+    sections = [
+        ("🎯 Strategy", "strategy", lambda: strategic_analysis_tab(ai_ceo)),
+        ("🏆 Competitors", "competitors", lambda: competitor_analysis_tab(ai_ceo)),
+        ("📊 Metrics", "metrics", business_metrics_tab),
+        ("✨ Features", "features", feature_showcase_tab),
+        ("📚 Help", "help", help_documentation_tab)
+    ] + ([("📡 Admin", "admin", admin_tab)] if ADMIN_TAB else [])
+    tabs = lazy_tabs([label for label, _, _ in sections])
+    
+    for tab, (_, name, render) in zip(tabs, sections):
+        if tab_open(tab):
+            with tab, profiler.span(f"tab: {name}"):
+                render()
+    
+    profile_report()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,110 @@
+"""Shared plumbing for the benchmark scripts: percentiles, run metadata and baseline comparison.
+
+Every script writes one JSON report: ``{"meta": {...}, "results": [...]}``.
+Each result row is identified by its ``key`` fields. A later report is
+compared with a baseline row by row, on the metrics each script names.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+def isolate_environment(**variables):
+    """Keep the app's ledger, caches and job store out of the real data directory.
+
+    ``variables`` are further WEWINE_* defaults; anything already set in the
+    environment wins. Call before importing the app, which reads them at import.
+    """
+    os.environ.setdefault('WEWINE_DATA_DIR', tempfile.mkdtemp(prefix="wewine-bench-"))
+    os.environ.setdefault('WEWINE_METRICS_PORT', '')
+    for name, value in variables.items():
+        os.environ.setdefault(name, value)
+
+def percentile(samples: list, q: float) -> float:
+    """Nearest-rank percentile of an unsorted list"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered) + 0.5)) - 1))]
+
+def summarize(samples: list) -> dict:
+    """Latency summary in milliseconds"""
+    if not samples:
+        return {'count': 0}
+    ms = [sample * 1000 for sample in samples]
+    return {
+        'count': len(ms),
+        'mean': round(sum(ms) / len(ms), 2),
+        'p50': round(percentile(ms, 0.50), 2),
+        'p90': round(percentile(ms, 0.90), 2),
+        'p95': round(percentile(ms, 0.95), 2),
+        'p99': round(percentile(ms, 0.99), 2),
+        'max': round(max(ms), 2),
+    }
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def run_metadata(**settings) -> dict:
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'settings': settings,
+    }
+
+def write_report(report: dict, path: str = None):
+    """Write the JSON report to ``path``, or print it when no path is given"""
+    text = json.dumps(report, indent=2, sort_keys=False)
+    if not path:
+        print(text)
+        return
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as handle:
+        handle.write(text + "\n")
+    print(f"Results written to {path}", file=sys.stderr)
+
+def compare(results: list, baseline_path: str, key: tuple, checks: dict, tolerance: float) -> list:
+    """Regressions of ``results`` against a baseline report.
+
+    ``checks`` maps a dotted metric path to 'lower' or 'higher' (which way is
+    better). A row regresses when it is worse than the baseline by more than
+    ``tolerance`` (a fraction). Rows missing from either side are skipped.
+    """
+    with open(baseline_path, encoding='utf-8') as handle:
+        baseline = {tuple(row.get(field) for field in key): row for row in json.load(handle)['results']}
+
+    def lookup(row, path):
+        for part in path.split('.'):
+            row = row.get(part) if isinstance(row, dict) else None
+        return row
+
+    regressions = []
+    for row in results:
+        before = baseline.get(tuple(row.get(field) for field in key))
+        if before is None:
+            continue
+        for path, better in checks.items():
+            old, new = lookup(before, path), lookup(row, path)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (better == 'lower' and change > tolerance) or (better == 'higher' and -change > tolerance):
+                label = " ".join(f"{field}={row.get(field)}" for field in key)
+                regressions.append(f"{label}: {path} {old:g} -> {new:g} ({change:+.0%})")
+    return regressions
@@ -0,0 +1,165 @@
+"""Throughput and tail latency of the completion pipeline against the local mock API.
+
+Runs each entry point - _call_openai_api (blocking and streamed),
+the generate_* methods and multi_agent_analysis - under 1..N concurrent callers
+on both engines, with no network access needed:
+
+    python benchmarks/pipeline.py --concurrency 1,4,16 --requests 32 --output benchmarks/results/pipeline.json
+    python benchmarks/pipeline.py --baseline benchmarks/results/pipeline.json --tolerance 0.2
+
+Every simulated caller is its own session with its own API key, and caches are
+bypassed, so each request reaches the mock rather than being coalesced or
+served from cache. Rate limiting and the daily budget are lifted unless the
+corresponding WEWINE_* variables are set. With --baseline the run exits 1 when
+p95 latency or throughput regresses by more than --tolerance.
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from harness import compare, isolate_environment, run_metadata, summarize, write_report
+
+import mock_server
+
+TARGETS = ('call_openai_api', 'call_openai_api_stream', 'generate_competitive_analysis',
+           'generate_growth_strategy', 'generate_product_roadmap', 'multi_agent_analysis')
+
+def call(engine, target: str, i: int):
+    """Run request ``i`` of ``target``; returns seconds to the first streamed chunk, if any"""
+    from wewine.catalog import COMPETITORS, GROWTH_FOCUSES, ROADMAP_PERIODS
+    from wewine.scheduler import PRIORITY_INTERACTIVE
+
+    if target == 'call_openai_api':
+        engine._call_openai_api(f"Benchmark question {i}: how should WeWine grow in Lisbon?",
+                                priority=PRIORITY_INTERACTIVE)
+    elif target == 'call_openai_api_stream':
+        started = time.perf_counter()
+        first_chunk = None
+        for _ in engine._call_openai_api(f"Benchmark question {i}: which markets should WeWine enter?",
+                                         stream=True, priority=PRIORITY_INTERACTIVE):
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - started
+        return first_chunk
+    elif target == 'generate_competitive_analysis':
+        engine.generate_competitive_analysis(list(COMPETITORS)[i % len(COMPETITORS)], force_refresh=True)
+    elif target == 'generate_growth_strategy':
+        engine.generate_growth_strategy(GROWTH_FOCUSES[i % len(GROWTH_FOCUSES)], force_refresh=True)
+    elif target == 'generate_product_roadmap':
+        engine.generate_product_roadmap(ROADMAP_PERIODS[i % len(ROADMAP_PERIODS)], force_refresh=True)
+    elif target == 'multi_agent_analysis':
+        engine.multi_agent_analysis(f"Benchmark question {i}: should WeWine launch a subscription?",
+                                    force_refresh=True)
+    return None
+
+def upstream_errors() -> int:
+    from wewine.metrics import get_metrics
+
+    return sum(value for labels, value in get_metrics().counters('wewine_llm_calls_total')
+               if labels.get('outcome') == 'error')
+
+def run_level(engine_mode: str, target: str, concurrency: int, requests: int, model: str) -> dict:
+    # Imported only once main() has set up the environment: configuration is read at import
+    from wewine.engine import AsyncWeWineStrategicAICEO, WeWineStrategicAICEO
+    from wewine.resilience import resilience_metrics
+
+    engine_class = AsyncWeWineStrategicAICEO if engine_mode == 'async' else WeWineStrategicAICEO
+    engines = [engine_class(f"bench-{engine_mode}-{target}-{concurrency}-{worker}", model)
+               for worker in range(concurrency)]
+    latencies, first_chunks = [], []
+    lock = threading.Lock()
+    errors_before = upstream_errors()
+    retries_before = resilience_metrics()['retries_total']
+
+    def worker(slot: int):
+        for i in range(slot, requests, concurrency):
+            started = time.perf_counter()
+            first_chunk = call(engines[slot], target, i)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if first_chunk is not None:
+                    first_chunks.append(first_chunk)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="wewine-bench") as pool:
+        for future in [pool.submit(worker, slot) for slot in range(concurrency)]:
+            future.result()
+    wall = time.perf_counter() - started
+
+    row = {
+        'target': target, 'engine': engine_mode, 'concurrency': concurrency,
+        'requests': len(latencies), 'wall_seconds': round(wall, 3),
+        'throughput_rps': round(len(latencies) / wall, 3) if wall else None,
+        'latency_ms': summarize(latencies),
+        'upstream_errors': upstream_errors() - errors_before,
+        'retries': resilience_metrics()['retries_total'] - retries_before,
+    }
+    if first_chunks:
+        row['first_chunk_ms'] = summarize(first_chunks)
+    return row
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the completion pipeline against the local mock API.")
+    parser.add_argument("--targets", default=",".join(TARGETS), help=f"comma-separated subset of {', '.join(TARGETS)}")
+    parser.add_argument("--engines", default="async,threads", help="engine modes to run (async, threads)")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrent caller counts")
+    parser.add_argument("--requests", type=int, default=16, help="requests per target and concurrency level")
+    parser.add_argument("--model", default="gpt-4")
+    parser.add_argument("--base-url", help="use an already running mock (or other API) instead of starting one")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="earlier report to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression as a fraction")
+    mock_server.add_behavior_arguments(parser)
+    parser.set_defaults(latency=0.05, jitter=0.01, token_rate=400.0, completion_tokens=120, seed=7)
+    args = parser.parse_args(argv)
+    args.targets = [target for target in args.targets.split(',') if target]
+    args.engines = [engine for engine in args.engines.split(',') if engine]
+    args.concurrency = [int(level) for level in args.concurrency.split(',') if level]
+    unknown = set(args.targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+    return args
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    behavior = None
+    base_url = args.base_url
+    if not base_url:
+        behavior = mock_server.behavior_from_args(args)
+        _, base_url = mock_server.start_mock_server(behavior)
+    os.environ['OPENAI_BASE_URL'] = base_url
+    isolate_environment(WEWINE_CACHE_DB='', WEWINE_DAILY_BUDGET='1000000',
+                        WEWINE_RATE_LIMIT_RPM='0', WEWINE_RATE_LIMIT_TPM='0')
+
+    logging.getLogger("streamlit").setLevel(logging.ERROR)  # bare-mode "no runtime" warnings
+
+    results = []
+    for engine_mode in args.engines:
+        for target in args.targets:
+            for concurrency in args.concurrency:
+                row = run_level(engine_mode, target, concurrency, args.requests, args.model)
+                results.append(row)
+                print(f"{engine_mode:8} {target:30} x{concurrency:<3} {row['throughput_rps']:8.2f} req/s  "
+                      f"p50 {row['latency_ms']['p50']:8.1f} ms  p99 {row['latency_ms']['p99']:8.1f} ms",
+                      file=sys.stderr)
+
+    settings = {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')}
+    report = {'meta': run_metadata(**settings), 'results': results}
+    if behavior is not None:
+        report['meta']['mock'] = behavior.snapshot()
+    write_report(report, args.output)
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, ('target', 'engine', 'concurrency'),
+                              {'latency_ms.p95': 'lower', 'throughput_rps': 'higher'}, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
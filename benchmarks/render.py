@@ -0,0 +1,203 @@
+"""Rerun cost of the Streamlit script, per tab, measured with the headless test runner.
+
+Drives app.py through streamlit.testing's AppTest: one cold run, then --reruns
+warm reruns of the same session (what every widget interaction costs). Tabs
+render lazily, so each one is then opened in turn through the tab query
+parameter and rerun the same way. Per rerun and per section - the sidebar, the
+page above the tabs and each tab - it records script time, the number of
+elements and blocks sent, and the serialized payload bytes:
+
+    python benchmarks/render.py --reruns 10 --output benchmarks/results/render.json
+    python benchmarks/render.py --budget benchmarks/render_budget.json --baseline benchmarks/results/render.json
+
+Section times come from the app's own run profiler (the "tab: ..." spans main()
+already records). Payload is measured on the message queue as it stands when
+the run ends, i.e. after Streamlit has coalesced replaced deltas - what a
+browser connecting at that moment would receive. The run exits 1 when a
+section exceeds its budget (p95_ms, elements, payload_bytes; see
+render_budget.json) or regresses past --tolerance against --baseline.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+from harness import REPO_ROOT, compare, isolate_environment, run_metadata, summarize, write_report
+
+from streamlit import logger as streamlit_logger
+from streamlit.testing.v1 import app_test
+from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+
+DEFAULT_BUDGET = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'render_budget.json')
+MAIN, SIDEBAR = 0, 1  # delta_path roots
+EMPTY_SECTION = {'elements': 0, 'blocks': 0, 'payload_bytes': 0}
+
+class RecordingScriptRunner(LocalScriptRunner):
+    """LocalScriptRunner that keeps the last run's forward messages for measurement"""
+    last_messages = []
+
+    def forward_msgs(self):
+        messages = super().forward_msgs()
+        RecordingScriptRunner.last_messages = list(messages)
+        return messages
+
+def tab_blocks(messages: list) -> list:
+    """(delta_path, label) of each tab, in order"""
+    return [(tuple(msg.metadata.delta_path), msg.delta.add_block.tab.label) for msg in messages
+            if msg.WhichOneof('type') == 'delta' and msg.delta.WhichOneof('type') == 'add_block'
+            and msg.delta.add_block.WhichOneof('type') == 'tab']
+
+def measure_messages(messages: list, tab_names: list) -> dict:
+    """Elements, blocks and bytes per section, plus the whole run's element types.
+
+    Closed tabs send no content, so the tabs that did are paired in order with
+    the "tab: ..." spans the run recorded.
+    """
+    blocks = tab_blocks(messages)
+    paths = [tuple(msg.metadata.delta_path) for msg in messages if msg.WhichOneof('type') == 'delta']
+    rendered = [path for path, _ in blocks if any(len(other) > len(path) and other[:len(path)] == path
+                                                   for other in paths)]
+    tabs = dict(zip(rendered, tab_names))
+    sections = {}
+    element_types = Counter()
+
+    def section_of(path: tuple) -> str:
+        if path and path[0] == SIDEBAR:
+            return 'sidebar'
+        for tab_path, name in tabs.items():
+            if path[:len(tab_path)] == tab_path and len(path) > len(tab_path):
+                return name
+        return 'page'
+
+    for msg in messages:
+        kind = msg.WhichOneof('type')
+        section = section_of(tuple(msg.metadata.delta_path)) if kind == 'delta' else 'page'
+        stats = sections.setdefault(section, dict(EMPTY_SECTION))
+        stats['payload_bytes'] += msg.ByteSize()
+        if kind != 'delta':
+            continue
+        delta = msg.delta.WhichOneof('type')
+        if delta == 'new_element':
+            stats['elements'] += 1
+            element_types[msg.delta.new_element.WhichOneof('type')] += 1
+        elif delta == 'add_block':
+            stats['blocks'] += 1
+    total = {key: sum(stats[key] for stats in sections.values()) for key in EMPTY_SECTION}
+    return {'sections': sections, 'total': total, 'element_types': dict(element_types.most_common()),
+            'tab_labels': [label for _, label in blocks]}
+
+def run_once(at) -> dict:
+    started = time.perf_counter()
+    at.run()
+    wall = time.perf_counter() - started
+    if at.exception:
+        raise RuntimeError(f"app raised during the run: {at.exception[0].message}")
+    profile = at.session_state['_run_profile']
+    tab_names = [name for name, _ in profile['spans'] if name.startswith('tab: ')]
+    return {'wall': wall, 'profile': profile, 'tab_names': tab_names,
+            **measure_messages(RecordingScriptRunner.last_messages, tab_names)}
+
+def visit(at, reruns: int) -> tuple:
+    """(first run, warm reruns) of the page as it is currently set up"""
+    first = run_once(at)
+    return first, [run_once(at) for _ in range(reruns)]
+
+def span_seconds(run: dict, name: str) -> float:
+    return sum(seconds for span, seconds in run['profile']['spans'] if span == name)
+
+def section_rows(first: dict, runs: list, sections: list, first_key: str) -> list:
+    last = runs[-1] if runs else first
+    rows = []
+    for section in sections:
+        row = {'section': section, **last['sections'].get(section, EMPTY_SECTION)}
+        if section != 'page':  # the page is the sum of several spans; the rerun row covers it
+            row[first_key] = round(span_seconds(first, section) * 1000, 2)
+            row['latency_ms'] = summarize([span_seconds(run, section) for run in runs])
+        rows.append(row)
+    return rows
+
+def measure(at, reruns: int, tab_param: str) -> list:
+    """The whole rerun, sidebar and page on the default tab, then each tab opened in turn"""
+    cold, warm = visit(at, reruns)
+    last = warm[-1] if warm else cold
+    results = [{
+        'section': 'rerun',
+        'cold_ms': round(cold['profile']['total'] * 1000, 2),
+        'latency_ms': summarize([run['profile']['total'] for run in warm]),
+        'wall_ms': summarize([run['wall'] for run in warm]),
+        **last['total'],
+        'element_types': last['element_types'],
+    }] + section_rows(cold, warm, ['sidebar', 'page'], 'cold_ms')
+
+    seen = set()
+    for label in last['tab_labels']:
+        at.query_params[tab_param] = label
+        first, runs = visit(at, reruns)
+        opened = [name for name in (runs[-1] if runs else first)['tab_names'] if name not in seen]
+        seen.update(opened)
+        for row in section_rows(first, runs, opened, 'open_ms'):  # open_ms: the tab switch itself
+            row['rerun_ms'] = summarize([run['profile']['total'] for run in runs])
+            results.append(row)
+    return results
+
+def check_budget(rows: list, budget: dict) -> list:
+    """Sections over budget; a budget maps section -> {p95_ms, elements, payload_bytes}"""
+    violations = []
+    for row in rows:
+        limits = budget.get(row['section'], {})
+        measured = {'p95_ms': (row.get('latency_ms') or {}).get('p95'),
+                    'elements': row.get('elements'), 'payload_bytes': row.get('payload_bytes')}
+        for metric, limit in limits.items():
+            value = measured.get(metric)
+            if value is not None and value > limit:
+                violations.append(f"{row['section']}: {metric} {value:g} over budget {limit:g}")
+    return violations
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Streamlit rerun cost per tab with the headless test runner.")
+    parser.add_argument("--script", default=os.path.join(REPO_ROOT, 'app.py'))
+    parser.add_argument("--reruns", type=int, default=10, help="warm reruns measured after the cold run")
+    parser.add_argument("--tab-param", default="tab", help="query parameter the app binds the selected tab to")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds allowed per script run")
+    parser.add_argument("--budget", default=DEFAULT_BUDGET, help="JSON budgets per section ('' to skip)")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="earlier report to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression as a fraction")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    isolate_environment()
+    streamlit_logger.set_log_level("error")  # bare-mode and deprecation warnings on every rerun
+    streamlit_logger.get_logger("streamlit.deprecation_util").disabled = True
+    app_test.LocalScriptRunner = RecordingScriptRunner
+
+    at = app_test.AppTest.from_file(args.script, default_timeout=args.timeout)
+    results = measure(at, args.reruns, args.tab_param)
+
+    for row in results:
+        latency = row.get('latency_ms') or {}
+        timing = f"p50 {latency['p50']:8.1f} ms  p95 {latency['p95']:8.1f} ms" if latency.get('count') else " " * 30
+        print(f"{row['section']:18} {timing}  {row['elements']:4} elements  {row['payload_bytes']:8} bytes",
+              file=sys.stderr)
+
+    settings = {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')}
+    write_report({'meta': run_metadata(**settings), 'results': results}, args.output)
+
+    failures = []
+    if args.budget:
+        with open(args.budget, encoding='utf-8') as handle:
+            failures += [f"OVER BUDGET {violation}" for violation in check_budget(results, json.load(handle))]
+    if args.baseline:
+        regressions = compare(results, args.baseline, ('section',),
+                              {'latency_ms.p95': 'lower', 'elements': 'lower', 'payload_bytes': 'lower'},
+                              args.tolerance)
+        failures += [f"REGRESSION {regression}" for regression in regressions]
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,383 @@
+"""Local stand-in for the OpenAI chat-completions API, for offline development and benchmarks.
+
+Serves blocking and streamed (server-sent events) completions with tunable
+latency, token rate, error rate, dropped streams and rate limiting:
+
+    python mock_server.py --port 8787 --latency 0.3 --token-rate 60 --error-rate 0.02 --rate-limit-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8787/v1 OPENAI_API_KEY=mock streamlit run app.py
+
+Rate limiting happens two ways: --rpm rejects requests beyond a sliding
+one-minute window like the real API, and --rate-limit-rate rejects a random
+fraction. Both answer 429 with a Retry-After header. --drop-rate ends that
+fraction of streams halfway through, cleanly but without the closing
+data: [DONE], like a connection lost mid-answer. GET /mock/stats reports
+what was served. The server also runs in-process via start_mock_server().
+
+The batch interface is mocked too: POST /v1/files takes a JSONL upload,
+POST /v1/batches answers every line up front, and GET /v1/batches/{id} reports
+the batch in progress until --batch-delay has passed, then --batch-outcome
+(completed, or e.g. expired without output); /v1/files/{id}/content serves
+the output and error files.
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+VOCABULARY = (
+    "wine discovery community tasting journey palate curious enthusiasts boutique wineries retention "
+    "conversion premium subscription events Lisbon sommelier personalization growth loyalty pairing "
+    "experiences referral onboarding cohort margin partnership vintage region varietal recommendation"
+).split()
+
+class MockBehavior:
+    """How the mock answers: timing, response length and injected failures"""
+
+    def __init__(self, latency: float = 0.2, jitter: float = 0.05, token_rate: float = 80.0,
+                 completion_tokens: int = 300, error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 rpm: int = 0, retry_after: float = 1.0, drop_rate: float = 0.0, batch_delay: float = 0.0,
+                 batch_outcome: str = 'completed', seed: int = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.token_rate = token_rate
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rpm = rpm
+        self.retry_after = retry_after
+        self.drop_rate = drop_rate
+        self.batch_delay = batch_delay
+        self.batch_outcome = batch_outcome
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window = deque()
+        self.files = {}  # file id -> content
+        self.batches = {}  # batch id -> (batch object, output file id, error file id)
+        self.stats = {'requests': 0, 'completed': 0, 'streamed': 0, 'rate_limited': 0, 'errors': 0,
+                      'dropped': 0, 'batches': 0, 'prompt_tokens': 0, 'completion_tokens': 0}
+
+    def admit(self):
+        """None to serve the request, or the (status, message) to fail it with"""
+        with self._lock:
+            self.stats['requests'] += 1
+            now = time.monotonic()
+            while self._window and now - self._window[0] > 60:
+                self._window.popleft()
+            roll = self.random.random()
+            if self.rpm and len(self._window) >= self.rpm:
+                self.stats['rate_limited'] += 1
+                return 429, f"Rate limit reached: {self.rpm} requests per minute"
+            if roll < self.rate_limit_rate:
+                self.stats['rate_limited'] += 1
+                return 429, "Rate limit reached (injected)"
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.stats['errors'] += 1
+                return self.random.choice((500, 502, 503)), "The server had an error (injected)"
+            self._window.append(now)
+            return None
+
+    def drop_after(self, count: int) -> int:
+        """Tokens to stream before cutting a stream of ``count`` short, or None to finish it"""
+        with self._lock:
+            if self.random.random() >= self.drop_rate:
+                return None
+            self.stats['dropped'] += 1
+            return count // 2
+
+    def first_byte_delay(self) -> float:
+        with self._lock:
+            return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+    def words(self, count: int, seed: str) -> list:
+        """Deterministic Markdown-ish answer of ``count`` tokens for a prompt"""
+        rng = random.Random(seed)
+        words = ["##", "Strategic", "Overview\n\n"]
+        while len(words) < count:
+            if rng.random() < 0.08:
+                words.append("\n- **" + rng.choice(VOCABULARY) + "**:")
+            else:
+                words.append(rng.choice(VOCABULARY) + ("." if rng.random() < 0.1 else ""))
+        return words[:count]
+
+    def answer(self, request: dict) -> tuple:
+        """(words, usage) answering a chat-completions request"""
+        prompt = " ".join(str(message.get('content') or '') for message in request.get('messages') or [])
+        prompt_tokens = max(1, len(re.findall(r"\w+|[^\w\s]", prompt)))
+        budget = request.get('max_tokens') or self.completion_tokens
+        words = self.words(max(1, min(budget, self.completion_tokens)), prompt)
+        return words, {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                       "total_tokens": prompt_tokens + len(words)}
+
+    def record(self, prompt_tokens: int, completion_tokens: int, streamed: bool):
+        with self._lock:
+            self.stats['completed'] += 1
+            self.stats['streamed'] += int(streamed)
+            self.stats['prompt_tokens'] += prompt_tokens
+            self.stats['completion_tokens'] += completion_tokens
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.stats)
+
+    def add_file(self, content: bytes) -> str:
+        file_id = f"file-mock-{uuid.uuid4().hex[:12]}"
+        with self._lock:
+            self.files[file_id] = content
+        return file_id
+
+    def create_batch(self, request: dict) -> dict:
+        """Answer every line of the input file now; batch() reveals the results once batch_delay has passed"""
+        with self._lock:
+            content = self.files[request['input_file_id']]
+        outputs, errors = [], []
+        for line in (json.loads(line) for line in content.decode('utf-8').splitlines() if line.strip()):
+            result = {"id": f"batch_req_mock_{uuid.uuid4().hex[:12]}", "custom_id": line.get('custom_id'),
+                      "error": None}
+            failure = self.admit()
+            if failure:
+                status, message = failure
+                result["response"] = {"status_code": status, "body": {"error": {"message": message}}}
+                errors.append(result)
+                continue
+            words, usage = self.answer(line['body'])
+            self.record(usage['prompt_tokens'], usage['completion_tokens'], streamed=False)
+            result["response"] = {"status_code": 200, "body": completion_body(line['body'], words, usage)}
+            outputs.append(result)
+
+        def results_file(results):
+            return self.add_file("".join(json.dumps(result) + "\n" for result in results).encode('utf-8'))
+
+        batch = {
+            "id": f"batch_mock_{uuid.uuid4().hex[:12]}", "object": "batch", "endpoint": request.get('endpoint'),
+            "input_file_id": request['input_file_id'], "completion_window": request.get('completion_window'),
+            "status": "validating", "created_at": time.time(), "metadata": request.get('metadata') or {},
+            "output_file_id": None, "error_file_id": None,
+            "request_counts": {"total": len(outputs) + len(errors), "completed": len(outputs),
+                               "failed": len(errors)}
+        }
+        output_file_id = results_file(outputs) if outputs else None
+        error_file_id = results_file(errors) if errors else None
+        with self._lock:
+            self.stats['batches'] += 1
+            self.batches[batch["id"]] = (batch, output_file_id, error_file_id)
+        return dict(batch)
+
+    def batch(self, batch_id: str) -> dict:
+        """The batch object as of now, or None for an unknown id"""
+        with self._lock:
+            if batch_id not in self.batches:
+                return None
+            batch, output_file_id, error_file_id = self.batches[batch_id]
+            batch = dict(batch)
+            if time.time() < batch["created_at"] + self.batch_delay:
+                batch["status"] = "in_progress"
+            else:
+                batch["status"] = self.batch_outcome
+                if self.batch_outcome == 'completed':
+                    batch.update(output_file_id=output_file_id, error_file_id=error_file_id)
+            return batch
+
+def completion_body(request: dict, words: list, usage: dict) -> dict:
+    """A non-streamed chat.completion answer"""
+    return {
+        "id": f"chatcmpl-mock-{uuid.uuid4().hex[:12]}", "object": "chat.completion", "created": int(time.time()),
+        "model": request.get('model', 'gpt-4'),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)},
+                     "finish_reason": "stop"}],
+        "usage": usage
+    }
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    behavior = None
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _chunk(self, text: str):
+        data = text.encode('utf-8')
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _invalid(self, status: int, message: str):
+        self._json(status, {"error": {"message": message, "type": "invalid_request_error"}})
+
+    def do_GET(self):
+        path = self.path.rstrip('/')
+        batch = re.fullmatch(r"/v1/batches/([\w-]+)", path)
+        batch = batch and self.behavior.batch(batch.group(1))
+        content = re.fullmatch(r"/v1/files/([\w-]+)/content", path)
+        if path == '/mock/stats':
+            self._json(200, self.behavior.snapshot())
+        elif path == '/v1/models':
+            models = ["gpt-4", "gpt-4-turbo", "gpt-3.5-turbo", "o1-preview", "o1-mini"]
+            self._json(200, {"object": "list", "data": [{"id": model, "object": "model"} for model in models]})
+        elif batch:
+            self._json(200, batch)
+        elif content and content.group(1) in self.behavior.files:
+            data = self.behavior.files[content.group(1)]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self._invalid(404, f"No route {self.path}")
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        path = self.path.rstrip('/')
+        if path == '/v1/files':
+            self._upload(body)
+            return
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            self._invalid(400, "Invalid JSON body")
+            return
+        if path == '/v1/batches':
+            if request.get('input_file_id') not in self.behavior.files:
+                self._invalid(400, f"No such file: {request.get('input_file_id')}")
+                return
+            self._json(200, self.behavior.create_batch(request))
+        elif path == '/v1/chat/completions':
+            self._complete(request)
+        else:
+            self._invalid(404, f"No route {self.path}")
+
+    def _upload(self, body: bytes):
+        """A multipart/form-data file upload, as the batch interface sends it"""
+        header = f"Content-Type: {self.headers.get('Content-Type', '')}\r\n\r\n".encode('latin-1')
+        message = BytesParser(policy=HTTP).parsebytes(header + body)
+        parts = {part.get_param('name', header='content-disposition'): part
+                 for part in (message.iter_parts() if message.is_multipart() else ())}
+        if 'file' not in parts:
+            self._invalid(400, "Expected a multipart upload with a file part")
+            return
+        content = parts['file'].get_payload(decode=True)
+        purpose = parts['purpose'].get_content().strip() if 'purpose' in parts else None
+        self._json(200, {"id": self.behavior.add_file(content), "object": "file", "bytes": len(content),
+                         "created_at": int(time.time()), "filename": parts['file'].get_filename(),
+                         "purpose": purpose})
+
+    def _complete(self, request: dict):
+        behavior = self.behavior
+        failure = behavior.admit()
+        if failure:
+            status, message = failure
+            headers = {"Retry-After": f"{behavior.retry_after:g}"} if status == 429 else {}
+            error_type = "rate_limit_exceeded" if status == 429 else "server_error"
+            self._json(status, {"error": {"message": message, "type": error_type, "code": error_type}}, headers)
+            return
+
+        words, usage = behavior.answer(request)
+        prompt_tokens = usage['prompt_tokens']
+        model = request.get('model', 'gpt-4')
+        completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+        per_token = 1.0 / behavior.token_rate if behavior.token_rate > 0 else 0.0
+
+        time.sleep(behavior.first_byte_delay())
+        if not request.get('stream'):
+            time.sleep(per_token * len(words))
+            behavior.record(prompt_tokens, len(words), streamed=False)
+            self._json(200, completion_body(request, words, usage))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        drop_after = behavior.drop_after(len(words))
+        try:
+            for i, word in enumerate(words):
+                if i == drop_after:
+                    self.wfile.write(b"0\r\n\r\n")  # a clean end of the body, but no [DONE]
+                    self.close_connection = True
+                    return
+                delta = {"content": word if i == 0 else " " + word}
+                event = {"id": completion_id, "object": "chat.completion.chunk", "model": model,
+                         "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+                self._chunk(f"data: {json.dumps(event)}\n\n")
+                time.sleep(per_token)
+            if (request.get('stream_options') or {}).get('include_usage'):
+                self._chunk(f"data: {json.dumps({'id': completion_id, 'choices': [], 'usage': usage})}\n\n")
+            self._chunk("data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            return  # the client hung up mid-stream
+        behavior.record(prompt_tokens, len(words), streamed=True)
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):  # clients dropping idle keep-alive connections
+            super().handle_error(request, client_address)
+
+def start_mock_server(behavior: MockBehavior = None, host: str = "127.0.0.1", port: int = 0):
+    """Serve the mock on a daemon thread; returns (server, base_url) with base_url ending in /v1"""
+    handler = type('Handler', (MockHandler,), {'behavior': behavior or MockBehavior()})
+    server = MockServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="wewine-mock-api", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+def add_behavior_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first byte")
+    parser.add_argument("--jitter", type=float, default=0.05, help="uniform +/- jitter on the latency")
+    parser.add_argument("--token-rate", type=float, default=80.0, help="completion tokens generated per second")
+    parser.add_argument("--completion-tokens", type=int, default=300, help="tokens per answer (capped by max_tokens)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with 5xx")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered 429")
+    parser.add_argument("--rpm", type=int, default=0, help="requests per minute before 429s (0 = unlimited)")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on 429s")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="fraction of streams cut off before [DONE]")
+    parser.add_argument("--batch-delay", type=float, default=0.0, help="seconds a batch stays in progress")
+    parser.add_argument("--batch-outcome", default="completed",
+                        help="status a batch ends in (e.g. expired or failed, which come without output)")
+    parser.add_argument("--seed", type=int, help="random seed for repeatable failure patterns")
+
+def behavior_from_args(args) -> MockBehavior:
+    return MockBehavior(latency=args.latency, jitter=args.jitter, token_rate=args.token_rate,
+                        completion_tokens=args.completion_tokens, error_rate=args.error_rate,
+                        rate_limit_rate=args.rate_limit_rate, rpm=args.rpm, retry_after=args.retry_after,
+                        drop_rate=args.drop_rate, batch_delay=args.batch_delay,
+                        batch_outcome=args.batch_outcome, seed=args.seed)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Mock OpenAI chat-completions and batch server for offline runs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    add_behavior_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server, base_url = start_mock_server(behavior_from_args(args), args.host, args.port)
+    print(f"Mock API listening - set OPENAI_BASE_URL={base_url}", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+"""Shared fixtures. The wewine package reads its WEWINE_* settings at import, so the
+environment is isolated here, before any test module imports it."""
+import atexit
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+import streamlit as st
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import mock_server
+
+DATA_DIR = tempfile.mkdtemp(prefix="wewine-test-")
+atexit.register(shutil.rmtree, DATA_DIR, ignore_errors=True)
+os.environ['WEWINE_DATA_DIR'] = DATA_DIR
+os.environ['WEWINE_METRICS_PORT'] = ''
+os.environ['WEWINE_CACHE_DB'] = ''
+
+logging.getLogger("streamlit").setLevel(logging.ERROR)  # bare-mode "no runtime" warnings
+
+@pytest.fixture(scope="session")
+def app():
+    """The Streamlit script itself, imported in bare mode; only page-level code needs it"""
+    import app as page
+    return page
+
+@pytest.fixture
+def mock_api(monkeypatch):
+    """A fast in-process mock API with fresh engine singletons; tests tune the returned MockBehavior"""
+    behavior = mock_server.MockBehavior(latency=0.01, jitter=0.0, token_rate=0.0, completion_tokens=40)
+    server, base_url = mock_server.start_mock_server(behavior)
+    monkeypatch.setattr('wewine.engine.OPENAI_CHAT_URL', f"{base_url}/chat/completions")
+    monkeypatch.setattr('wewine.batch.OPENAI_BASE_URL', base_url)
+    st.cache_resource.clear()
+    yield behavior
+    server.shutdown()
+    server.server_close()
+    st.cache_resource.clear()
@@ -0,0 +1,36 @@
+"""Telling the model's answers apart from error notices and offline stand-ins."""
+from wewine.engine import OfflineAnswer, WeWineStrategicAICEO, is_model_answer
+from wewine.jobs import JobStore
+
+def engine():
+    return WeWineStrategicAICEO("test-key")
+
+def test_completion_is_a_model_answer(mock_api):
+    response = engine()._call_openai_api("How should we price our premium subscription?")
+    assert is_model_answer(response)
+
+def test_upstream_failure_is_offline(mock_api, monkeypatch):
+    monkeypatch.setattr('wewine.resilience.RETRY_MAX_ATTEMPTS', 1)
+    mock_api.error_rate = 1.0
+    response = engine()._call_openai_api("How should we price our premium subscription?")
+    assert isinstance(response, OfflineAnswer)
+    assert not is_model_answer(response)
+
+def test_failed_stream_yields_offline_chunk(mock_api, monkeypatch):
+    monkeypatch.setattr('wewine.resilience.RETRY_MAX_ATTEMPTS', 1)
+    mock_api.error_rate = 1.0
+    parts = list(engine()._call_openai_api("How should we price our premium subscription?", stream=True))
+    assert parts and not all(is_model_answer(part) for part in parts)
+
+def test_no_api_key_answers_offline():
+    response = WeWineStrategicAICEO(None)._call_openai_api("Should we expand to Spain?")
+    assert isinstance(response, OfflineAnswer)
+
+def test_job_records_whether_the_model_answered(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    answered = store.create("multi_agent", "gpt-4", {"query": "q"}, "user", "host:1")
+    offline = store.create("multi_agent", "gpt-4", {"query": "q"}, "user", "host:1")
+    store.finish(answered, "## Strategy")
+    store.finish(offline, OfflineAnswer("Using offline strategic framework..."))
+    assert store.get(answered)['answered'] == 1
+    assert store.get(offline)['answered'] == 0
@@ -0,0 +1,48 @@
+"""The async engine keeps blocking local work off its event loop."""
+import asyncio
+import threading
+
+from wewine.ledger import current_user, get_cost_ledger
+from wewine.engine import AsyncWeWineStrategicAICEO, is_model_answer
+
+OFF_LOOP = ('_prepare_call', '_build_payload', '_token_reservation', '_reserve_spend', '_settle_spend')
+
+def spy_on(engine, monkeypatch, names):
+    seen = {}
+    for name in names:
+        original = getattr(engine, name)
+
+        def spy(*args, _name=name, _original=original, **kwargs):
+            seen[_name] = (threading.current_thread(), current_user.get())
+            return _original(*args, **kwargs)
+
+        monkeypatch.setattr(engine, name, spy)
+    return seen
+
+def test_cache_ledger_and_token_work_run_in_worker_threads(mock_api, monkeypatch):
+    engine = AsyncWeWineStrategicAICEO("test-key")
+    seen = spy_on(engine, monkeypatch, OFF_LOOP)
+
+    async def ask():
+        current_user.set("founder")
+        return threading.current_thread(), await engine._acall_openai_api("Should we expand to Spain?", use_cache=True)
+
+    loop_thread, answer = asyncio.run(ask())
+    assert is_model_answer(answer)
+    assert set(seen) == set(OFF_LOOP)
+    for name, (thread, user) in seen.items():
+        assert thread is not loop_thread, f"{name} ran on the event loop"
+        assert user == "founder", f"{name} lost the session context"
+
+def test_stream_settles_off_the_loop(mock_api, monkeypatch):
+    engine = AsyncWeWineStrategicAICEO("test-key")
+    seen = spy_on(engine, monkeypatch, ('_build_payload', '_reserve_spend', '_finish_stream'))
+
+    async def stream():
+        chunks = [chunk async for chunk in await engine._acall_openai_api("Should we expand to Spain?", stream=True)]
+        return threading.current_thread(), chunks
+
+    loop_thread, chunks = asyncio.run(stream())
+    assert chunks
+    assert all(thread is not loop_thread for thread, _ in seen.values())
+    assert get_cost_ledger()._reserved.get('interactive', 0.0) == 0.0
@@ -0,0 +1,128 @@
+"""Batch warm-up: submission, collection into the response cache and the warmup.py --batch flow."""
+import contextvars
+import json
+import time
+
+import pytest
+
+import warmup
+from wewine.ledger import CostLedger
+from wewine.cache import get_response_cache
+from wewine.engine import WeWineStrategicAICEO
+from wewine.batch import LocalBatchBackend, OpenAIBatchBackend, collect_batch, open_batch_manifests, submit_batch
+
+MODEL = "gpt-3.5-turbo"
+
+@pytest.fixture
+def ledger(tmp_path, monkeypatch):
+    ledger = CostLedger(db_path=str(tmp_path / "ledger.sqlite3"), budget=5.0, flush_interval=60, warmup_budget=5.0)
+    for module in ('wewine.ledger', 'wewine.tokens', 'wewine.engine', 'wewine.batch', 'warmup'):
+        monkeypatch.setattr(f"{module}.get_cost_ledger", lambda: ledger)
+    return ledger
+
+@pytest.fixture
+def batches(mock_api, ledger, tmp_path, monkeypatch):
+    """The mock API with batch manifests kept in a fresh directory"""
+    monkeypatch.setattr('wewine.batch.BATCH_DIR', str(tmp_path / "batches"))
+    monkeypatch.setenv('OPENAI_API_KEY', "test-key")
+    return mock_api
+
+def growth_entries(engine):
+    """(custom_id, payload, meta) batch entries for the canned growth analyses"""
+    return [(engine.cache_key(instructions, prompt), engine._build_payload(instructions, prompt),
+             {'model': engine.model, 'label': label})
+            for label, instructions, prompt in engine.canned_requests() if label.startswith("growth: ")]
+
+def run_warmup(*argv):
+    """warmup.main in its own context, so the warm-up user does not leak into later tests"""
+    return contextvars.copy_context().run(warmup.main, ["--batch", "--model", MODEL, "--max-cost", "1", *argv])
+
+def report(capsys) -> dict:
+    return json.loads(capsys.readouterr().out)
+
+def test_local_batch_round_trip_fills_the_cache(batches, ledger):
+    engine = WeWineStrategicAICEO("test-key", MODEL)
+    entries = growth_entries(engine)
+    backend = LocalBatchBackend("test-key")
+    manifest = submit_batch(backend, entries, ttl=3600)
+    assert [open_manifest['batch_id'] for open_manifest in open_batch_manifests()] == [manifest['batch_id']]
+
+    result = collect_batch(backend, manifest)
+    assert result['state'] == 'collected'
+    assert [item['status'] for item in result['items']] == ['done'] * len(entries)
+    assert ledger.spent_today() == pytest.approx(sum(item['cost'] for item in result['items']), abs=1e-5)
+    assert open_batch_manifests() == [], "a collected manifest is not picked up again"
+    with open(manifest['path'], encoding='utf-8') as handle:
+        assert json.load(handle)['state'] == 'collected'
+
+    cache = get_response_cache()
+    assert all(cache.get(key) for key, _, _ in entries)
+    served = batches.snapshot()['requests']
+    engine.generate_growth_strategy("retention")
+    assert batches.snapshot()['requests'] == served, "the app serves the batch answer from the cache"
+
+def test_provider_batch_is_collected_once_it_finishes(batches, ledger):
+    batches.batch_delay = 0.3
+    engine = WeWineStrategicAICEO("test-key", MODEL)
+    entries = growth_entries(engine)
+    backend = OpenAIBatchBackend("test-key")
+    manifest = submit_batch(backend, entries, ttl=3600)
+    assert batches.snapshot()['batches'] == 1
+
+    assert collect_batch(backend, manifest) == {'state': 'submitted', 'items': []}
+    assert [open_manifest['batch_id'] for open_manifest in open_batch_manifests()] == [manifest['batch_id']]
+    assert get_response_cache().get(entries[0][0]) is None
+
+    time.sleep(0.3)
+    result = collect_batch(backend, manifest)
+    assert result['state'] == 'collected'
+    assert [item['status'] for item in result['items']] == ['done'] * len(entries)
+    assert all(get_response_cache().get(key) for key, _, _ in entries)
+    assert open_batch_manifests() == []
+
+def test_failed_batch_lines_are_reported_and_not_cached(batches):
+    batches.error_rate = 1.0
+    entries = growth_entries(WeWineStrategicAICEO("test-key", MODEL))
+    backend = OpenAIBatchBackend("test-key")
+    result = collect_batch(backend, submit_batch(backend, entries, ttl=3600))
+    assert result['state'] == 'collected'
+    assert [item['status'] for item in result['items']] == ['failed'] * len(entries)
+    assert not any(get_response_cache().get(key) for key, _, _ in entries)
+
+def test_batch_from_an_older_prompt_version_is_closed_uncached(batches, monkeypatch):
+    entries = growth_entries(WeWineStrategicAICEO("test-key", MODEL))
+    backend = OpenAIBatchBackend("test-key")
+    manifest = submit_batch(backend, entries, ttl=3600)
+    monkeypatch.setattr('wewine.batch.PROMPT_VERSION', "next")
+    assert collect_batch(backend, manifest) == {'state': 'collected', 'items': []}
+    assert not any(get_response_cache().get(key) for key, _, _ in entries)
+    assert open_batch_manifests() == []
+
+def test_warmup_batch_run_warms_everything_then_finds_it_fresh(batches, capsys):
+    assert run_warmup("--batch-backend", "local") == 0
+    first = report(capsys)
+    assert first['summary']['done'] == len(first['items']) > 0
+
+    assert run_warmup("--batch-backend", "local") == 0
+    second = report(capsys)
+    assert second['summary']['fresh'] == len(second['items']) == len(first['items'])
+    assert open_batch_manifests() == []
+
+def test_warmup_skips_requests_still_pending_in_a_batch(batches, capsys):
+    batches.batch_delay = 60
+    assert run_warmup() == 0
+    first = report(capsys)
+    assert first['summary']['submitted'] == len(first['items']) > 0
+
+    assert run_warmup() == 0
+    second = report(capsys)
+    assert second['summary']['pending'] == len(second['items']) == len(first['items'])
+    assert batches.snapshot()['batches'] == 1, "nothing is submitted twice while the first batch runs"
+
+def test_warmup_fails_requests_of_a_batch_that_ended_without_results(batches, capsys):
+    batches.batch_outcome = 'expired'
+    assert run_warmup() == 1
+    rows = report(capsys)['items']
+    assert rows and all(row['status'] == 'failed' for row in rows)
+    assert {row['error'] for row in rows} == {"batch expired without a result"}
+    assert open_batch_manifests() == [], "an expired batch is not collected again"
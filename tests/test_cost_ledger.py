@@ -0,0 +1,71 @@
+"""Daily budget enforcement: reservations hold under concurrency and scopes stay apart."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from wewine.scheduler import RequestScheduler
+from wewine.ledger import CostLedger, WARMUP_USER
+from wewine.engine import WeWineStrategicAICEO, is_model_answer
+
+@pytest.fixture
+def ledger(tmp_path):
+    return CostLedger(db_path=str(tmp_path / "ledger.sqlite3"), budget=1.0, flush_interval=60,
+                      warmup_budget=0.5)
+
+def test_concurrent_reservations_never_exceed_the_budget(ledger):
+    barrier = threading.Barrier(50)
+
+    def reserve():
+        barrier.wait()
+        return ledger.reserve(0.125, 'interactive')
+
+    with ThreadPoolExecutor(max_workers=50) as pool:
+        granted = list(pool.map(lambda _: reserve(), range(50)))
+    assert sum(granted) == 8
+    assert ledger.remaining('interactive') == pytest.approx(0.0, abs=1e-9)
+    assert not ledger.within_budget('interactive')
+
+def test_record_swaps_the_hold_for_the_actual_cost(ledger):
+    assert ledger.reserve(0.5, 'interactive')
+    assert ledger.remaining('interactive') == pytest.approx(0.5)
+    ledger.record(0.2, 100, 50, "gpt-4", user_id="founder", reserved=0.5)
+    assert ledger.remaining('interactive') == pytest.approx(0.8)
+    assert ledger.reserve(0.3, 'interactive')
+    ledger.release(0.3, 'interactive')
+    assert ledger.remaining('interactive') == pytest.approx(0.8)
+
+def test_warmup_spend_has_its_own_budget(ledger):
+    assert ledger.reserve(0.5, 'warmup')
+    assert not ledger.reserve(0.01, 'warmup')
+    ledger.record(0.5, 1000, 1000, "gpt-4", user_id=WARMUP_USER, reserved=0.5)
+    assert ledger.spent_today('warmup') == pytest.approx(0.5)
+    assert ledger.remaining('interactive') == pytest.approx(1.0)
+    assert ledger.spent_today() == pytest.approx(0.5)
+
+def test_flushed_spend_counts_in_other_processes(ledger, tmp_path):
+    ledger.record(0.7, 100, 50, "gpt-4", user_id="founder")
+    ledger.flush()
+    other = CostLedger(db_path=str(tmp_path / "ledger.sqlite3"), budget=1.0, flush_interval=60)
+    assert other.spent_today('interactive') == pytest.approx(0.7)
+    assert not other.reserve(0.4, 'interactive')
+
+def test_engine_calls_stay_within_budget_under_concurrency(mock_api, ledger, monkeypatch):
+    mock_api.latency = 0.2
+    mock_api.completion_tokens = 200
+    ledger.budget = 0.30
+    for module in ('wewine.ledger', 'wewine.tokens', 'wewine.engine'):
+        monkeypatch.setattr(f"{module}.get_cost_ledger", lambda: ledger)
+    monkeypatch.setattr('wewine.engine.get_request_scheduler', lambda: RequestScheduler(rpm=0, tpm=0))
+
+    def ask(i):
+        return WeWineStrategicAICEO(f"key-{i}")._call_openai_api(f"Question {i} about growth")
+
+    with ThreadPoolExecutor(max_workers=24) as pool:
+        answers = list(pool.map(ask, range(24)))
+    answered = sum(is_model_answer(answer) for answer in answers)
+    assert 0 < answered < 24
+    assert mock_api.snapshot()['requests'] == answered, "rejected calls never reach the API"
+    assert ledger.spent_today('interactive') <= 0.30
+    assert ledger.remaining('interactive') >= 0
+    assert ledger._reserved.get('interactive', 0.0) == pytest.approx(0.0, abs=1e-9)
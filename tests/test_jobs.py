@@ -0,0 +1,45 @@
+"""Background jobs: key provenance and recovery of jobs orphaned by a dead process."""
+import socket
+import time
+
+import pytest
+
+from wewine.jobs import JobRunner, JobStore
+
+DEAD_WORKER = f"{socket.gethostname()}:{2 ** 22 + 7}"
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"))
+
+def wait_for(store, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while store.get(job_id)['status'] in ('queued', 'running'):
+        assert time.monotonic() < deadline, "job never finished"
+        time.sleep(0.05)
+    return store.get(job_id)
+
+def test_submit_records_where_the_key_came_from(mock_api, store, monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', "server-key")
+    runner = JobRunner(store, workers=1)
+    server_job = runner.submit("growth_strategy", {"focus_area": "retention"}, "server-key", "gpt-4")
+    user_job = runner.submit("growth_strategy", {"focus_area": "retention"}, "user-key", "gpt-4")
+    assert store.get(server_job)['key_source'] == 'server'
+    assert store.get(user_job)['key_source'] == 'user'
+    assert wait_for(store, user_job)['status'] == 'done'
+
+def test_orphaned_user_key_jobs_expire_instead_of_resuming(store):
+    user_job = store.create("growth_strategy", "gpt-4", {"focus_area": "retention"}, "founder", DEAD_WORKER, 'user')
+    server_job = store.create("growth_strategy", "gpt-4", {"focus_area": "retention"}, "founder", DEAD_WORKER,
+                              'server')
+    JobRunner(store, workers=1)
+
+    expired = store.get(user_job)
+    assert expired['status'] == 'expired'
+    assert "run it again" in expired['error']
+    assert wait_for(store, server_job)['status'] == 'done'
+
+def test_jobs_held_by_a_live_process_are_left_alone(store):
+    job_id = store.create("growth_strategy", "gpt-4", {}, "founder", f"{socket.gethostname()}:1", 'user')
+    JobRunner(store, workers=1)
+    assert store.get(job_id)['status'] == 'queued'
@@ -0,0 +1,68 @@
+"""Knowledge retrieval: relevant chunks per request, the pinned company core and stable cache keys."""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+import streamlit as st
+
+from wewine.knowledge import KNOWLEDGE_PINNED, KnowledgeStore, company_identity, knowledge_corpus
+from wewine.engine import WeWineStrategicAICEO
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUERIES = ("How do we beat Vivino?", "What is our conversion rate and CAC?",
+           "Which framework should we use to prioritize features?", "Who is our target audience?", "Hello there")
+
+@pytest.fixture
+def store():
+    return KnowledgeStore(knowledge_corpus())
+
+@pytest.mark.parametrize("query, title", [
+    ("How do we beat Vivino?", "Vivino"),
+    ("What is our conversion rate and CAC?", "Current Metrics"),
+    ("Which framework should we use to prioritize features?", "RICE scoring"),
+    ("Who is our target audience?", "Target Audience"),
+])
+def test_query_retrieves_the_relevant_section(store, query, title):
+    assert store.search(query)[0][1]['title'] == title
+    assert f"[{title}]" in store.context(query, "gpt-4")
+
+def test_unrelated_query_retrieves_nothing(store):
+    assert store.search("Hello there") == []
+    assert store.context("Hello there", "gpt-4") == ""
+
+def test_context_stays_within_its_token_budget(store):
+    full = store.context("What is our conversion rate and CAC?", "gpt-4")
+    tight = store.context("What is our conversion rate and CAC?", "gpt-4", budget=60)
+    assert 0 < len(tight) < len(full)
+    assert store.context("What is our conversion rate and CAC?", "gpt-4", budget=0) == ""
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_company_core_rides_in_every_prompt(query):
+    identity = company_identity()
+    assert all(f"{heading}:" in identity for heading in KNOWLEDGE_PINNED)
+    prefix = WeWineStrategicAICEO("test-key")._build_messages(None, query)[0]['content']
+    assert identity in prefix
+
+def test_pinned_sections_are_not_retrieved_again():
+    assert not any(title.upper() in KNOWLEDGE_PINNED for _, title, _ in knowledge_corpus())
+
+def test_cache_keys_survive_a_rebuilt_index():
+    keys = [WeWineStrategicAICEO("test-key").cache_key(None, query) for query in QUERIES]
+    st.cache_resource.clear()
+    assert [WeWineStrategicAICEO("test-key").cache_key(None, query) for query in QUERIES] == keys
+
+def test_cache_keys_match_across_processes():
+    """warmup.py and every app process share cache entries, so retrieval must not depend on hash seeds"""
+    script = ("import json, sys\n"
+              "from wewine.engine import WeWineStrategicAICEO\n"
+              "engine = WeWineStrategicAICEO('test-key')\n"
+              "print(json.dumps([engine.cache_key(None, query) for query in sys.argv[1:]]))\n")
+    keys = []
+    for seed in ("1", "2", "3"):
+        done = subprocess.run([sys.executable, "-c", script, *QUERIES], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True, env={**os.environ, 'PYTHONHASHSEED': seed})
+        keys.append(json.loads(done.stdout.splitlines()[-1]))
+    local = [WeWineStrategicAICEO("test-key").cache_key(None, query) for query in QUERIES]
+    assert keys == [local] * 3
@@ -0,0 +1,59 @@
+"""The Markdown renderer only ever emits safe links and escaped text."""
+import pytest
+
+from wewine.markdown import StreamingMarkdown, markdown_to_html
+
+def render_streamed(text, chunk=7):
+    renderer = StreamingMarkdown()
+    blocks = []
+    for start in range(0, len(text), chunk):
+        blocks += renderer.feed(text[start:start + chunk])
+    return "".join(blocks + renderer.close())
+
+@pytest.mark.parametrize("url", [
+    "javascript:alert(1)",
+    "JaVaScRiPt:alert(document.cookie)",
+    "javascript&#58;alert(1)",
+    "data:text/html;base64,PHNjcmlwdD4=",
+    "vbscript:msgbox(1)",
+    "javascript:a((1))",
+])
+def test_unsafe_links_are_dropped_whole(url):
+    html = markdown_to_html(f"see [the plan]({url}) today")
+    assert html == "<p>see the plan today</p>"
+
+def test_quotes_cannot_break_out_of_href():
+    html = markdown_to_html('[x](https://example.com/"onmouseover="alert(1))')
+    assert 'href="https://example.com/&quot;onmouseover=&quot;alert(1)"' in html
+    assert '"onmouseover' not in html
+
+def test_safe_links_keep_balanced_parentheses():
+    html = markdown_to_html("[Port](https://en.wikipedia.org/wiki/Port_(wine)) and [mail](mailto:ceo@wewine.app)")
+    assert '<a href="https://en.wikipedia.org/wiki/Port_(wine)" target="_blank" rel="noopener noreferrer">Port</a>' in html
+    assert '<a href="mailto:ceo@wewine.app"' in html
+
+@pytest.mark.parametrize("url", ["https://example.com/a_b_c/", "https://example.com/_foo_/",
+                                 "https://example.com/*x*/**y**/~~z~~"])
+def test_emphasis_never_reaches_into_link_targets(url):
+    html = markdown_to_html(f"[x]({url})")
+    assert html == f'<p><a href="{url}" target="_blank" rel="noopener noreferrer">x</a></p>'
+
+def test_emphasis_around_and_inside_links_still_renders():
+    html = markdown_to_html("**see [the _plan_](https://example.com/x_y)** and _this_")
+    assert html == ('<p><strong>see <a href="https://example.com/x_y" target="_blank" rel="noopener noreferrer">'
+                    'the <em>plan</em></a></strong> and <em>this</em></p>')
+
+def test_relative_link_keeps_only_its_label():
+    assert markdown_to_html("[x](/a_b_c/) and [y](/_foo_/)") == "<p>x and y</p>"
+
+def test_raw_html_is_escaped():
+    assert markdown_to_html("<script>alert(1)</script> <img src=x onerror=alert(1)>") == (
+        "<p>&lt;script&gt;alert(1)&lt;/script&gt; &lt;img src=x onerror=alert(1)&gt;</p>"
+    )
+
+def test_streaming_renderer_sanitizes_the_same():
+    text = ("## Plan\n\nsee [x](javascript:alert(1)) now\n\n"
+            "- [ok](https://wewine.app/a_(b)) item\n- <b>bold</b>\n\n| a | b |\n|---|---|\n| [c](data:x) | d |\n")
+    assert render_streamed(text) == markdown_to_html(text)
+    assert "javascript" not in render_streamed(text)
+    assert ")" not in render_streamed("[x](javascript:alert(1))")
@@ -0,0 +1,101 @@
+"""Metrics: Prometheus exposition of counters and histograms, and the opt-in endpoint and admin tab."""
+import os
+import socket
+import threading
+
+import httpx
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+from wewine.metrics import MetricsRegistry, get_metrics
+
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+
+def exposition(registry) -> list:
+    return registry.render_prometheus().splitlines()
+
+def test_counters_are_exposed_per_label_set():
+    registry = MetricsRegistry()
+    registry.inc('wewine_llm_calls_total', outcome='ok', model='gpt-4', entry='direct')
+    registry.inc('wewine_llm_calls_total', outcome='ok', model='gpt-4', entry='direct')
+    registry.inc('wewine_llm_calls_total', outcome='error', model='gpt-4', entry='direct')
+    lines = exposition(registry)
+    assert lines[:2] == ["# HELP wewine_llm_calls_total Upstream completions by outcome",
+                         "# TYPE wewine_llm_calls_total counter"]
+    assert 'wewine_llm_calls_total{entry="direct",model="gpt-4",outcome="ok"} 2' in lines
+    assert 'wewine_llm_calls_total{entry="direct",model="gpt-4",outcome="error"} 1' in lines
+
+def test_histograms_expose_cumulative_buckets_sum_and_count():
+    registry = MetricsRegistry()
+    for seconds in (0.03, 0.3, 100):
+        registry.observe('wewine_request_seconds', seconds, entry='competitive_analysis')
+    lines = exposition(registry)
+    assert "# TYPE wewine_request_seconds histogram" in lines
+    series = 'wewine_request_seconds_bucket{entry="competitive_analysis",le="%s"}'
+    assert f"{series % '0.025'} 0" in lines
+    assert f"{series % '0.05'} 1" in lines
+    assert f"{series % '0.5'} 2" in lines
+    assert f"{series % '80'} 2" in lines
+    assert f"{series % '+Inf'} 3" in lines
+    assert 'wewine_request_seconds_sum{entry="competitive_analysis"} 100.330000' in lines
+    assert 'wewine_request_seconds_count{entry="competitive_analysis"} 3' in lines
+    row, = registry.percentiles('wewine_request_seconds')
+    assert (row['count'], row['p50'], row['p99']) == (3, 0.3, 100)
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.inc('wewine_fallback_answers_total', intents='say "hi"\\\n')
+    assert 'wewine_fallback_answers_total{intents="say \\"hi\\"\\\\\\n"} 1' in exposition(registry)
+
+def test_gauges_are_polled_and_broken_collectors_skipped():
+    registry = MetricsRegistry()
+    registry.collector(lambda: [("wewine_breaker_open", "breaker open", {}, 1)])
+    registry.collector(lambda: 1 / 0)
+    lines = exposition(registry)
+    assert "# TYPE wewine_breaker_open gauge" in lines
+    assert "wewine_breaker_open 1" in lines
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+@pytest.fixture
+def fresh_metrics():
+    st.cache_resource.clear()
+    yield
+    st.cache_resource.clear()
+
+def test_no_endpoint_without_a_metrics_port(fresh_metrics):
+    assert get_metrics().endpoint is None
+    assert not any(thread.name == "wewine-metrics" for thread in threading.enumerate())
+
+def test_metrics_port_serves_the_exposition(fresh_metrics, monkeypatch):
+    port = free_port()
+    monkeypatch.setattr('wewine.metrics.METRICS_PORT', str(port))
+    registry = get_metrics()
+    try:
+        registry.inc('wewine_llm_calls_total', outcome='ok', model='gpt-4', entry='direct')
+        response = httpx.get(f"http://127.0.0.1:{port}/metrics")
+        assert response.status_code == 200
+        assert 'wewine_llm_calls_total{entry="direct",model="gpt-4",outcome="ok"} 1' in response.text
+        assert httpx.get(f"http://127.0.0.1:{port}/other").status_code == 404
+    finally:
+        registry.endpoint.shutdown()
+        registry.endpoint.server_close()
+
+def tab_labels(at) -> list:
+    return [tab.label for tab in at.tabs]
+
+def test_admin_tab_is_opt_in(monkeypatch):
+    at = AppTest.from_file(APP_SCRIPT, default_timeout=30)
+    at.run()
+    assert not at.exception
+    assert "📡 Admin" not in tab_labels(at)
+
+    monkeypatch.setenv('WEWINE_ADMIN_TAB', "1")
+    at = AppTest.from_file(APP_SCRIPT, default_timeout=30)
+    at.run()
+    assert not at.exception
+    assert "📡 Admin" in tab_labels(at)
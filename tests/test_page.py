@@ -0,0 +1,53 @@
+"""The page across reruns: cached engines must keep working with each new run of app.py."""
+import os
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from wewine.ledger import get_cost_ledger
+from wewine.memory import get_conversation_store
+
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+QUESTION = "How should we price our premium subscription?"
+
+def open_page() -> AppTest:
+    at = AppTest.from_file(APP_SCRIPT, default_timeout=30)
+    at.run()
+    at.run()  # the engine is now cached from an earlier run of the script
+    assert not at.exception
+    return at
+
+@pytest.fixture
+def page(mock_api, monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', "test-key")
+    monkeypatch.setattr('wewine.resilience.RETRY_MAX_ATTEMPTS', 1)
+    return open_page()
+
+def ask(at, question: str):
+    at.text_area(key="custom_query_input").input(question)
+    next(button for button in at.button if button.label == "🧠 Single Agent").click()
+    at.run()
+    assert not at.exception
+
+def test_only_model_answers_become_turns_after_reruns(page, mock_api):
+    mock_api.error_rate = 1.0
+    ask(page, QUESTION)
+    turns = get_conversation_store().turns(page.session_state.conversation_id)
+    assert turns == [], "an error notice was stored as a conversation turn"
+
+    mock_api.error_rate = 0.0
+    ask(page, QUESTION)
+    turns = get_conversation_store().turns(page.session_state.conversation_id)
+    assert [turn['question'] for turn in turns] == [QUESTION]
+
+def test_spend_is_charged_to_each_session_across_reruns(page):
+    other = open_page()  # a second session on the same cached engine
+    ask(page, QUESTION)
+    ask(other, "Should we expand to Spain?")
+    ledger = get_cost_ledger()
+    for at in (page, other):
+        at.run()  # the sidebar renders before the tab, so the next run shows the call
+        cost, calls = ledger.user_usage(at.session_state.user_id)
+        assert calls == 1 and cost > 0
+        assert f"Your session: ${cost:.3f} across 1 calls" in [caption.value for caption in at.caption]
+    assert ledger.user_usage('anonymous') == (0.0, 0)
@@ -0,0 +1,87 @@
+"""Circuit breaker cycle and retries against the mock API."""
+import time
+
+import httpx
+import pytest
+
+from wewine.resilience import CircuitBreaker, call_with_resilience
+from wewine.engine import OfflineAnswer, WeWineStrategicAICEO, is_model_answer
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == breaker.OPEN
+    assert not breaker.allow()
+    assert breaker.snapshot()['trips'] == 1
+
+def test_breaker_half_open_probe_closes_on_success():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.is_open()
+    time.sleep(0.06)
+    assert not breaker.is_open()  # checking does not use up the probe
+    assert breaker.allow()
+    assert breaker.state == breaker.HALF_OPEN
+    assert not breaker.allow(), "only one probe at a time"
+    breaker.record_success()
+    assert breaker.state == breaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+def test_breaker_failed_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == breaker.OPEN
+    assert not breaker.allow()
+    assert breaker.snapshot()['trips'] == 2
+
+def test_released_probe_can_be_retaken():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+@pytest.fixture
+def breaker(mock_api, monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+    for module in ('wewine.resilience', 'wewine.engine'):
+        monkeypatch.setattr(f"{module}.get_circuit_breaker", lambda: breaker)
+    monkeypatch.setattr('wewine.resilience.RETRY_BASE_DELAY', 0.01)
+    return breaker
+
+def test_engine_cycles_the_breaker_through_the_api(mock_api, breaker):
+    engine = WeWineStrategicAICEO("test-key")
+    mock_api.error_rate = 1.0
+    failed = engine._call_openai_api("Should we expand to Spain?")
+    assert isinstance(failed, OfflineAnswer)
+    assert breaker.state == breaker.OPEN
+
+    served = mock_api.snapshot()['requests']
+    offline = engine._call_openai_api("Should we expand to Spain?")
+    assert isinstance(offline, OfflineAnswer)
+    assert mock_api.snapshot()['requests'] == served, "an open circuit must not reach the API"
+
+    mock_api.error_rate = 0.0
+    time.sleep(0.25)
+    assert is_model_answer(engine._call_openai_api("Should we expand to Spain?"))
+    assert breaker.state == breaker.CLOSED
+
+def test_transient_failures_are_retried(mock_api, breaker):
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 2:
+            raise httpx.ConnectError("connection refused")
+        return "ok"
+
+    assert call_with_resilience(flaky) == "ok"
+    assert len(calls) == 2
+    assert breaker.state == breaker.CLOSED
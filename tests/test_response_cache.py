@@ -0,0 +1,88 @@
+"""Response cache keys, expiry and prompt-version invalidation."""
+import time
+
+import pytest
+
+from wewine.ledger import get_cost_ledger
+from wewine.cache import ResponseCache, get_semantic_cache, response_cache_key
+from wewine.engine import AsyncWeWineStrategicAICEO, WeWineStrategicAICEO, is_model_answer
+
+def key(**overrides):
+    request = dict(model="gpt-4", prompt_prefix="prefix", instructions="", user_prompt="Should we expand to Spain?",
+                   temperature=0.7, knowledge="")
+    request.update(overrides)
+    return response_cache_key(**request)
+
+def test_key_covers_everything_that_shapes_the_answer():
+    base = key()
+    assert key() == base
+    for change in (dict(model="gpt-4-turbo"), dict(prompt_prefix="other"), dict(instructions="Be brief."),
+                   dict(user_prompt="Should we expand to France?"), dict(temperature=0.2), dict(knowledge="kb")):
+        assert key(**change) != base, change
+
+def test_prompt_version_bump_invalidates_disk_entries(monkeypatch, tmp_path):
+    db_path = str(tmp_path / "responses.sqlite3")
+    old_key = key()
+    ResponseCache(db_path=db_path).put(old_key, "old answer")
+    assert ResponseCache(db_path=db_path).get(old_key) == "old answer", "the disk tier outlives the process"
+
+    monkeypatch.setattr('wewine.cache.PROMPT_VERSION', "next")
+    cache = ResponseCache(db_path=db_path)
+    assert key() != old_key
+    assert cache.get(key()) is None
+    cache.put(key(), "new answer")
+    assert cache.describe(key())['version'] == "next"
+
+def test_entries_expire():
+    cache = ResponseCache()
+    cache.put("k", "v", ttl=0.05)
+    assert cache.get("k") == "v"
+    time.sleep(0.06)
+    assert cache.get("k") is None
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.get("a")
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1" and cache.get("c") == "3"
+
+def test_engine_serves_repeat_calls_from_the_cache(mock_api):
+    engine = WeWineStrategicAICEO("test-key")
+    first = engine.generate_growth_strategy("user_acquisition")
+    second = engine.generate_growth_strategy("user_acquisition")
+    assert first == second
+    assert mock_api.snapshot()['requests'] == 1
+
+@pytest.mark.parametrize("engine_class", [WeWineStrategicAICEO, AsyncWeWineStrategicAICEO])
+def test_stream_cut_short_is_charged_but_not_cached(mock_api, engine_class):
+    engine = engine_class("test-key")
+    question = "Should we expand to Spain?"
+
+    def ask():
+        return list(engine._call_openai_api(question, stream=True, use_cache=True, semantic_mode="single_agent"))
+
+    mock_api.drop_rate = 1.0
+    parts = ask()
+    assert parts[:-1] and all(is_model_answer(part) for part in parts[:-1]), "the partial text was shown"
+    assert not is_model_answer(parts[-1]), "and flagged as incomplete"
+    assert get_cost_ledger().user_usage()[1] == 1
+    assert get_semantic_cache().lookup(engine.model, "single_agent", question) is None
+
+    mock_api.drop_rate = 0.0
+    complete = "".join(ask())
+    assert mock_api.snapshot()['requests'] == 2, "the cut-short answer was not served from cache"
+    assert engine._call_openai_api(question, use_cache=True) == complete
+    assert mock_api.snapshot()['requests'] == 2
+
+def test_cached_answers_need_no_key_or_budget(mock_api, monkeypatch):
+    answer = WeWineStrategicAICEO("test-key").generate_growth_strategy("user_acquisition")
+    assert is_model_answer(answer)
+    assert WeWineStrategicAICEO(None).generate_growth_strategy("user_acquisition") == answer
+
+    monkeypatch.setattr('wewine.engine.check_cost_limit', lambda: False)
+    assert WeWineStrategicAICEO("test-key").generate_growth_strategy("user_acquisition") == answer
+    assert not is_model_answer(WeWineStrategicAICEO("test-key").generate_growth_strategy("retention"))
+    assert mock_api.snapshot()['requests'] == 1
@@ -0,0 +1,65 @@
+"""Offline routing: canned requests reach their framework, the keyword trie and sharing one router."""
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from wewine.router import FALLBACK_INTENTS, FallbackRouter, get_fallback_router
+from wewine.engine import WeWineStrategicAICEO
+
+CANNED_ROUTES = {
+    "competitive: ": ['market'],
+    "growth: user_acquisition": ['growth'],
+    "growth: retention": ['growth'],
+    "growth: market_expansion": ['growth', 'gtm'],
+    "growth: product_growth": ['growth', 'product'],
+    "roadmap: ": ['product'],
+    "positioning: ": ['market'],
+    "example: How should we price": ['general'],
+}
+
+@pytest.fixture
+def router():
+    return get_fallback_router()
+
+def test_canned_requests_route_to_their_framework(router):
+    checked = 0
+    for label, _, prompt in WeWineStrategicAICEO("test-key").canned_requests():
+        for prefix, intents in CANNED_ROUTES.items():
+            if label.startswith(prefix):
+                assert router.route(prompt) == intents, label
+                checked += 1
+    assert checked >= 16
+
+def test_weak_matches_fall_back_to_the_general_framework(router):
+    assert router.route("market") == ['general']
+    assert router.route("Tell me something nice") == ['general']
+
+def test_close_runner_up_joins_the_answer(router):
+    assert router.route("Our competitors keep growing") == ['market', 'growth']
+
+def test_longest_phrase_wins(router):
+    scores = router.scores("What is our market expansion plan?")
+    assert scores['gtm'] == 4.0
+    assert scores['market'] == 0.0, "'market expansion' is not also 'market'"
+
+def test_stems_plurals_and_multiword_names_match(router):
+    assert router.scores("The competitors")['market'] == 2.5
+    assert router.scores("Which features first?")['product'] == 2.0
+    assert router.scores("Compare us with Wine-Searcher")['market'] == 3.0
+
+def test_repeats_count_sublinearly(router):
+    once = router.scores("user retention")['growth']
+    assert router.scores("user user user user retention")['growth'] < once + 3 * 0.5
+
+def test_one_router_serves_concurrent_prompts(monkeypatch):
+    words = [f"word{i}" for i in range(200)] + "market competitors growth roadmap launch pricing".split()
+    rng = random.Random(7)
+    prompts = [" ".join(rng.choice(words) for _ in range(30)) for _ in range(400)]
+    expected = [FallbackRouter(FALLBACK_INTENTS).scores(prompt) for prompt in prompts]
+
+    monkeypatch.setattr('wewine.router.FALLBACK_VOCABULARY_MAX', 16)  # constant eviction while threads read
+    shared = FallbackRouter(FALLBACK_INTENTS)
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        assert list(pool.map(shared.scores, prompts)) == expected
+    assert shared._entry.cache_info().currsize <= 16
@@ -0,0 +1,134 @@
+"""Rate-limit scheduler token accounting and queue order."""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from wewine.scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE, RateLimitWaitError, RequestScheduler
+from wewine.engine import AsyncWeWineStrategicAICEO, WeWineStrategicAICEO, is_model_answer
+
+def test_acquire_reserves_and_settle_refunds():
+    scheduler = RequestScheduler(rpm=60, tpm=6000)
+    scheduler.acquire(1000)
+    assert scheduler.tokens.tokens == pytest.approx(5000, abs=5)
+    assert scheduler.requests.tokens == pytest.approx(59, abs=0.1)
+    scheduler.settle(1000, 400)
+    assert scheduler.tokens.tokens == pytest.approx(5600, abs=5)
+    scheduler.settle(400, 900)  # used more than reserved: nothing to refund
+    assert scheduler.tokens.tokens == pytest.approx(5600, abs=5)
+
+def test_refunds_never_exceed_capacity():
+    scheduler = RequestScheduler(rpm=0, tpm=6000)
+    scheduler.acquire(100)
+    scheduler.settle(100, 0)
+    scheduler.settle(100, 0)
+    assert scheduler.tokens.tokens <= scheduler.tokens.capacity
+
+def test_oversized_wait_is_rejected():
+    scheduler = RequestScheduler(rpm=0, tpm=600, max_wait=0.2)  # 10 tokens a second
+    scheduler.acquire(600)
+    with pytest.raises(RateLimitWaitError):
+        scheduler.acquire(100)
+    assert scheduler.stats()['rejected'] == 1
+    assert scheduler.stats()['queue_depth'] == 0
+
+def test_caller_deadline_shortens_the_wait():
+    scheduler = RequestScheduler(rpm=0, tpm=6000, max_wait=30)  # 100 tokens a second
+    scheduler.acquire(6000)
+    started = time.monotonic()
+    with pytest.raises(RateLimitWaitError):
+        scheduler.acquire(100, max_wait=0.1)
+    assert time.monotonic() - started < 0.5
+
+def test_interactive_requests_overtake_bulk():
+    scheduler = RequestScheduler(rpm=0, tpm=6000)  # 100 tokens a second
+    scheduler.acquire(6000)
+    order = []
+
+    def request(priority, name):
+        scheduler.acquire(40, priority)
+        order.append(name)
+
+    bulk = threading.Thread(target=request, args=(PRIORITY_BULK, "bulk"))
+    bulk.start()
+    time.sleep(0.05)
+    interactive = threading.Thread(target=request, args=(PRIORITY_INTERACTIVE, "interactive"))
+    interactive.start()
+    bulk.join(5)
+    interactive.join(5)
+    assert order == ["interactive", "bulk"]
+
+def test_completion_is_charged_its_actual_usage(mock_api, monkeypatch):
+    scheduler = RequestScheduler(rpm=0, tpm=6000)
+    monkeypatch.setattr('wewine.engine.get_request_scheduler', lambda: scheduler)
+    started = time.monotonic()
+    engine = WeWineStrategicAICEO("test-key")
+    assert is_model_answer(engine._call_openai_api("Should we expand to Spain?"))
+    served = mock_api.snapshot()
+    used = served['prompt_tokens'] + served['completion_tokens']
+    refill = (time.monotonic() - started) * scheduler.tokens.rate
+    stats = scheduler.stats()
+    assert stats['admitted'] == 1
+    assert 6000 - used <= stats['tpm_available'] <= 6000 - used + refill + 1
+
+def test_async_waiters_hold_no_threads():
+    scheduler = RequestScheduler(rpm=0, tpm=6000, max_wait=2)  # 100 tokens a second
+    scheduler.acquire(6000)
+
+    async def scenario():
+        waiters = [asyncio.ensure_future(scheduler.aacquire(100)) for _ in range(64)]
+        await asyncio.sleep(0.05)
+        assert scheduler.stats()['queue_depth'] == 64
+        # more queued calls than the default executor has threads, yet worker threads stay free
+        assert await asyncio.wait_for(asyncio.to_thread(lambda: "free"), 1) == "free"
+        first = await waiters[0]
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        return first
+
+    assert 0.9 < asyncio.run(scenario()) < 1.5
+    assert scheduler.stats()['queue_depth'] == 0
+
+def test_cancelled_async_waiter_takes_nothing():
+    scheduler = RequestScheduler(rpm=0, tpm=6000)
+    scheduler.acquire(6000)
+
+    async def scenario():
+        waiter = asyncio.ensure_future(scheduler.aacquire(3000, PRIORITY_INTERACTIVE))
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(scenario())
+    assert scheduler.stats()['queue_depth'] == 0
+    assert scheduler.stats()['admitted'] == 1
+    scheduler.settle(6000, 0)
+    assert scheduler.acquire(6000, max_wait=0.1) < 0.1, "nothing is left queued ahead or taken"
+
+def test_async_waiter_wakes_when_tokens_are_refunded():
+    scheduler = RequestScheduler(rpm=0, tpm=6000)  # refills a waiter needing 3000 in 30s
+    scheduler.acquire(6000)
+
+    async def scenario():
+        waiter = asyncio.ensure_future(scheduler.aacquire(3000))
+        await asyncio.sleep(0.05)
+        await asyncio.to_thread(scheduler.settle, 6000, 1000)
+        return await asyncio.wait_for(waiter, 1)
+
+    assert asyncio.run(scenario()) < 0.5
+
+@pytest.mark.parametrize("error", [asyncio.CancelledError, KeyError])
+def test_async_admission_refunds_a_call_that_never_finished(monkeypatch, error):
+    scheduler = RequestScheduler(rpm=0, tpm=6000)
+    monkeypatch.setattr('wewine.engine.get_request_scheduler', lambda: scheduler)
+
+    async def call():
+        async with AsyncWeWineStrategicAICEO._aadmitted(4000, PRIORITY_INTERACTIVE):
+            raise error()
+
+    with pytest.raises(error):
+        asyncio.run(call())
+    assert scheduler.tokens.tokens == pytest.approx(6000, abs=5)
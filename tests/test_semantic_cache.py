@@ -0,0 +1,57 @@
+"""Semantic cache matching: paraphrases share an answer, near misses never do."""
+import pytest
+
+from wewine.cache import HashedNgramEmbedder, SemanticCache
+
+PARAPHRASES = [
+    ("How can WeWine achieve 100K users in 12 months?", "How can we reach 100K users in 12 months?"),
+    ("How can WeWine achieve 100K users in 12 months?", "how can wewine get to 100k users within 12 months"),
+    ("What's our best strategy against Vivino's dominance?", "Best strategy to counter Vivino's dominance?"),
+    ("What's our best strategy against Vivino's dominance?", "How do we compete with Vivino's dominance?"),
+    ("How should we price our premium subscription?", "What price should we set for our premium subscription?"),
+    ("What partnerships should we prioritize for growth?", "Which partnerships should we focus on for growth?"),
+    ("Should we expand to Spain?", "Should WeWine expand into Spain?"),
+    ("What are the biggest risks for WeWine next year?", "What are WeWine's biggest risks next year?"),
+]
+
+NEAR_MISSES = [
+    ("Should we expand to Spain?", "Should we not expand to Spain?"),
+    ("Should we expand to Spain?", "Why shouldn't we expand to Spain?"),
+    ("Should we expand to Spain?", "Should we expand to France?"),
+    ("Should we launch a premium subscription?", "Should we never launch a premium subscription?"),
+    ("Is Vivino a threat to WeWine?", "Is Vivino not a threat to WeWine?"),
+    ("How should we price our premium subscription?", "How should we market our premium subscription?"),
+    ("How can we increase our prices?", "How can we decrease our prices?"),
+    ("What's our best strategy against Vivino's dominance?",
+     "What's our best strategy against Delectable's dominance?"),
+    ("What marketing channels work for wine apps?", "What marketing channels work for beer apps?"),
+    ("How can we improve our conversion rate from 3.2% to 5%?",
+     "How can we improve our conversion rate from 3.2% to 6%?"),
+]
+
+@pytest.fixture
+def cache():
+    return SemanticCache(HashedNgramEmbedder())
+
+@pytest.mark.parametrize("cached, asked", PARAPHRASES)
+def test_paraphrase_hits(cache, cached, asked):
+    cache.add("gpt-4", "strategy", cached, "answer")
+    match = cache.lookup("gpt-4", "strategy", asked)
+    assert match is not None, f"{asked!r} should reuse the answer to {cached!r}"
+    assert match[0] == "answer"
+
+@pytest.mark.parametrize("cached, asked", NEAR_MISSES)
+def test_near_miss_misses(cache, cached, asked):
+    cache.add("gpt-4", "strategy", cached, "answer")
+    assert cache.lookup("gpt-4", "strategy", asked) is None, f"{asked!r} must not reuse {cached!r}"
+
+def test_negation_guard_is_independent_of_threshold():
+    cache = SemanticCache(HashedNgramEmbedder(), threshold=0.0)
+    cache.add("gpt-4", "strategy", "Should we expand to Spain?", "yes")
+    assert cache.lookup("gpt-4", "strategy", "Should we not expand to Spain?") is None
+    assert cache.lookup("gpt-4", "strategy", "Shouldn't we never expand to Spain?") [0] == "yes"
+
+def test_model_and_mode_are_separate(cache):
+    cache.add("gpt-4", "strategy", "Should we expand to Spain?", "answer")
+    assert cache.lookup("gpt-4", "competitors", "Should we expand to Spain?") is None
+    assert cache.lookup("gpt-3.5-turbo", "strategy", "Should we expand to Spain?") is None
@@ -0,0 +1,145 @@
+"""Concurrent identical calls share one upstream request."""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+
+from wewine.clients import get_http_client
+from wewine.coalescing import SingleFlight
+from wewine.engine import AsyncWeWineStrategicAICEO, WeWineStrategicAICEO
+
+def run_together(count, fn):
+    barrier = threading.Barrier(count)
+
+    def call():
+        barrier.wait()
+        return fn()
+
+    with ThreadPoolExecutor(max_workers=count) as pool:
+        futures = [pool.submit(call) for _ in range(count)]
+        return [future.result(timeout=10) for future in futures]
+
+def test_concurrent_calls_share_one_leader():
+    flights = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return "answer"
+
+    results = run_together(8, lambda: flights.do("key", slow))
+    assert len(calls) == 1
+    assert [result for result, _ in results] == ["answer"] * 8
+    assert sum(leader for _, leader in results) == 1
+    assert flights.stats() == {'in_flight': 0, 'leaders': 1, 'coalesced': 7}
+
+def test_followers_share_the_leaders_error():
+    flights = SingleFlight()
+
+    def failing():
+        time.sleep(0.2)
+        raise ValueError("upstream said no")
+
+    def call():
+        try:
+            flights.do("key", failing)
+        except ValueError as error:
+            return str(error)
+
+    assert run_together(4, call) == ["upstream said no"] * 4
+    assert flights.stats()['leaders'] == 1
+
+def test_distinct_keys_and_later_calls_fly_separately():
+    flights = SingleFlight()
+    assert flights.do("a", lambda: 1) == (1, True)
+    assert flights.do("b", lambda: 2) == (2, True)
+    assert flights.do("a", lambda: 3) == (3, True), "a landed flight is not a cache"
+
+def test_cancelled_async_leader_hands_over():
+    flights = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.3 if len(calls) == 1 else 0.01)
+        return len(calls)
+
+    async def scenario():
+        leader = asyncio.ensure_future(flights.ado("key", fetch))
+        await asyncio.sleep(0.05)
+        follower = asyncio.ensure_future(flights.ado("key", fetch))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(scenario()) == (2, True)
+
+def test_follower_gives_up_at_its_own_deadline():
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def slow():
+        release.wait(5)
+        return "answer"
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        leader = pool.submit(flights.do, "key", slow)
+        time.sleep(0.05)
+        started = time.monotonic()
+        with pytest.raises(httpx.TimeoutException):
+            flights.do("key", slow, deadline=time.monotonic() + 0.2)
+        assert time.monotonic() - started < 1
+        release.set()
+        assert leader.result(timeout=5) == ("answer", True), "the leader's flight carries on"
+
+def test_async_follower_gives_up_at_its_own_deadline():
+    flights = SingleFlight()
+
+    async def slow():
+        await asyncio.sleep(0.5)
+        return "answer"
+
+    async def scenario():
+        leader = asyncio.ensure_future(flights.ado("key", slow))
+        await asyncio.sleep(0.05)
+        started = time.monotonic()
+        with pytest.raises(httpx.TimeoutException):
+            await flights.ado("key", slow, deadline=time.monotonic() + 0.1)
+        assert time.monotonic() - started < 0.4
+        return await leader
+
+    assert asyncio.run(scenario()) == ("answer", True)
+
+@pytest.mark.parametrize("engine_class", [WeWineStrategicAICEO, AsyncWeWineStrategicAICEO])
+def test_identical_completions_reach_the_api_once(mock_api, engine_class):
+    mock_api.latency = 0.3
+    engine = engine_class("test-key")
+    results = run_together(6, lambda: engine._complete(get_http_client(), "Be brief.", "Should we expand to Spain?"))
+    assert mock_api.snapshot()['requests'] == 1
+    assert len({content for content, _ in results}) == 1
+    assert sum(usage is not None for _, usage in results) == 1, "only the leader gets the usage to charge"
+
+@pytest.mark.parametrize("engine_class", [WeWineStrategicAICEO, AsyncWeWineStrategicAICEO])
+def test_joining_a_slow_call_respects_the_callers_timeout(mock_api, engine_class):
+    mock_api.latency = 1.0
+    engine = engine_class("test-key")
+
+    def ask(timeout=None):
+        return engine._complete(get_http_client(), "Be brief.", "Should we expand to Spain?", timeout=timeout)
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        leader = pool.submit(ask)
+        time.sleep(0.2)
+        started = time.monotonic()
+        with pytest.raises(httpx.TimeoutException) as raised:
+            ask(timeout=0.3)
+        assert time.monotonic() - started < 0.8
+        assert engine._describe_api_error(raised.value).startswith("⏱️ **Timeout:**")
+        assert leader.result(timeout=10)[1] is not None
+    assert mock_api.snapshot()['requests'] == 1
@@ -0,0 +1,28 @@
+"""Content-versioned stylesheet builds."""
+import os
+import shutil
+
+import pytest
+
+@pytest.fixture
+def static_dir(app, tmp_path, monkeypatch):
+    shutil.copy(os.path.join(app.STATIC_DIR, app.STYLESHEET), tmp_path)
+    monkeypatch.setattr(app, 'STATIC_DIR', str(tmp_path))
+    app.load_stylesheet.clear()
+    yield tmp_path
+    app.load_stylesheet.clear()
+
+def test_new_build_replaces_earlier_versions(app, static_dir):
+    (static_dir / "wewine.0123456789.min.css").write_text("old")
+    (static_dir / "wewine.abcdefabcd.min.css").write_text("older")
+    (static_dir / "vendor.0123456789.min.css").write_text("not ours")
+
+    asset, css = app.load_stylesheet()
+    assert (static_dir / asset).read_text(encoding='utf-8') == css
+    assert sorted(os.listdir(static_dir)) == sorted([app.STYLESHEET, asset, "vendor.0123456789.min.css"])
+
+def test_unchanged_stylesheet_reuses_its_build(app, static_dir):
+    asset, _ = app.load_stylesheet()
+    app.load_stylesheet.clear()
+    assert app.load_stylesheet()[0] == asset
+    assert sorted(os.listdir(static_dir)) == sorted([app.STYLESHEET, asset])
@@ -0,0 +1,55 @@
+"""Token counting and completion sizing against the context window and the daily budget."""
+import pytest
+import tiktoken
+
+from wewine.ledger import CostLedger
+from wewine.tokens import (MIN_COMPLETION_TOKENS, DailyBudgetError, PromptBudgetError, TokenCounter,
+                           size_completion)
+from wewine.engine import WeWineStrategicAICEO, is_model_answer
+
+@pytest.fixture
+def ledger(tmp_path, monkeypatch):
+    ledger = CostLedger(db_path=str(tmp_path / "ledger.sqlite3"), budget=1.0, flush_interval=60)
+    monkeypatch.setattr('wewine.tokens.get_cost_ledger', lambda: ledger)
+    return ledger
+
+def test_counts_fall_back_to_characters_when_tiktoken_cannot_load(monkeypatch):
+    def offline(model):
+        raise ConnectionError("cannot download the BPE file")
+
+    monkeypatch.setattr(tiktoken, 'encoding_for_model', offline)
+    counter = TokenCounter()
+    assert not counter.exact
+    assert counter.count("a" * 9, "gpt-4") == 3
+    assert counter.count("a" * 8, "gpt-4", static=True) == 2
+    assert counter.count_chat("gpt-4", ("a" * 8,), ("a" * 4,)) == 3 + 3 * 2 + 2 + 1
+
+def test_unknown_model_names_use_the_family_encoding():
+    counter = TokenCounter()
+    assert counter.count("Should we expand to Spain?", "gpt-4-0613") == counter.count("Should we expand to Spain?",
+                                                                                        "gpt-4")
+
+def test_completion_is_trimmed_to_the_context_window(ledger):
+    assert size_completion("gpt-4", 8192 - 500, 2000) == 500
+
+def test_prompt_overflowing_the_context_window_is_rejected(ledger):
+    with pytest.raises(PromptBudgetError, match="8,192-token context window") as raised:
+        size_completion("gpt-4", 8192 - MIN_COMPLETION_TOKENS + 1, 1000)
+    assert not isinstance(raised.value, DailyBudgetError)
+
+def test_completion_is_trimmed_to_what_the_budget_affords(ledger):
+    ledger.budget = 0.05
+    assert size_completion("gpt-4", 100, 2000) == int((0.05 - 100 * 0.03 / 1000) / (0.06 / 1000))
+
+def test_low_remaining_budget_is_rejected(ledger):
+    ledger.budget = 0.05
+    ledger.record(0.04, 1000, 100, "gpt-4", user_id="founder")
+    with pytest.raises(DailyBudgetError, match=r"\$0\.010 left"):
+        size_completion("gpt-4", 100, 1000)
+    assert size_completion("gpt-3.5-turbo", 100, 1000) == 1000, "a cheaper model still fits"
+
+def test_oversized_prompt_never_reaches_the_api(mock_api):
+    answer = WeWineStrategicAICEO("test-key")._call_openai_api("wine " * 9000)
+    assert not is_model_answer(answer)
+    assert "Request not sent" in answer
+    assert mock_api.snapshot()['requests'] == 0
@@ -0,0 +1,257 @@
+"""Precompute every canned WeWine analysis into the shared response cache.
+
+Run it off-peak (e.g. nightly from cron) so the canned buttons - competitor
+analyses, growth focuses, roadmap periods, positioning questions and example
+queries - are served from cache instead of waiting on the model:
+
+    python warmup.py --model gpt-4 --model gpt-3.5-turbo --concurrency 4 --max-cost 0.50
+
+Answers land in the response cache's SQLite tier (WEWINE_CACHE_DB) stamped with
+the current PROMPT_VERSION. Entries that are already stamped with it and stay
+fresh past --refresh-within are skipped unless --force is given. Spend is charged
+to the shared cost ledger as user "warmup", against its own daily budget
+(WEWINE_WARMUP_BUDGET) rather than the interactive WEWINE_DAILY_BUDGET, so a
+run can never lock users out; --max-cost caps a single run within it.
+
+With --batch the plan is written to a JSONL file and submitted through the
+provider's asynchronous batch interface instead, at the batch discount:
+
+    python warmup.py --batch            # submit tonight's batch
+    python warmup.py --batch            # next run: ingest the finished batch, submit what is stale
+
+Each run first collects outstanding batches (manifests in WEWINE_BATCH_DIR) into
+the cache and only then plans new work; --wait polls until the submitted batch
+has finished. --batch-backend local runs the file through the interactive
+endpoint instead, for development against a stand-in server.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from wewine.clients import get_http_client
+from wewine.scheduler import PRIORITY_BULK
+from wewine.ledger import WARMUP_BUDGET, WARMUP_USER, current_user, estimate_cost, get_cost_ledger, usage_cost
+from wewine.tokens import DailyBudgetError, PromptBudgetError
+from wewine.catalog import MODEL_OPTIONS
+from wewine.cache import PROMPT_VERSION, get_response_cache
+from wewine.metrics import current_entry
+from wewine.engine import create_engine
+from wewine.batch import BATCH_BACKENDS, collect_batch, open_batch_manifests, submit_batch
+
+logging.getLogger("streamlit").setLevel(logging.ERROR)  # bare-mode "no runtime" warnings
+
+class CostCap:
+    """Reserves each request's worst-case cost before it is sent, so concurrent calls never overshoot.
+
+    With ``wait`` a reservation that does not fit waits for in-flight requests to
+    settle - they usually cost far less than their worst case - and only fails
+    once nothing is left in flight to free room.
+    """
+
+    def __init__(self, limit: float):
+        self.limit = limit
+        self.committed = 0.0
+        self.in_flight = 0
+        self._settled = threading.Condition()
+
+    def reserve(self, amount: float, wait: bool = False) -> bool:
+        with self._settled:
+            while self.committed + amount > self.limit:
+                if not wait or not self.in_flight:
+                    return False
+                self._settled.wait()
+            self.committed += amount
+            self.in_flight += 1
+            return True
+
+    def settle(self, reserved: float, actual: float):
+        with self._settled:
+            self.committed += actual - reserved
+            self.in_flight -= 1
+            self._settled.notify_all()
+
+def parse_args(argv=None):
+    models = [m for m in os.getenv('WEWINE_WARMUP_MODELS', '').split(',') if m]
+    parser = argparse.ArgumentParser(description="Precompute the canned WeWine analyses into the response cache.")
+    parser.add_argument("--model", action="append", dest="models",
+                        help="model to warm (repeatable; default: WEWINE_WARMUP_MODELS or every selectable model)")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv('WEWINE_WARMUP_CONCURRENCY', '4')),
+                        help="requests in flight at once")
+    parser.add_argument("--max-cost", type=float,
+                        default=float(os.getenv('WEWINE_WARMUP_MAX_COST', str(WARMUP_BUDGET))),
+                        help="spend cap in dollars for this run (worst case is reserved per request); "
+                             "never more than what is left of WEWINE_WARMUP_BUDGET today")
+    parser.add_argument("--ttl", type=float, default=36, help="hours a precomputed answer stays valid")
+    parser.add_argument("--refresh-within", type=float, default=12,
+                        help="regenerate current entries that expire within this many hours")
+    parser.add_argument("--force", action="store_true", help="regenerate everything, fresh or not")
+    parser.add_argument("--dry-run", action="store_true", help="list the plan and its worst-case cost only")
+    parser.add_argument("--batch", action="store_true", help="submit the plan through the asynchronous batch API")
+    parser.add_argument("--batch-backend", choices=sorted(BATCH_BACKENDS), default="openai",
+                        help="where batches run: the provider's batch API or a local stand-in")
+    parser.add_argument("--wait", action="store_true", help="with --batch, poll until the new batch is collected")
+    parser.add_argument("--poll-interval", type=float, default=60, help="seconds between batch status polls")
+    args = parser.parse_args(argv)
+    args.models = args.models or models or list(MODEL_OPTIONS.values())
+    return args
+
+def plan(engines: list, cache, args, pending: set = frozenset()) -> tuple:
+    """(tasks, skipped): one task per model and canned request that needs (re)computing"""
+    horizon = time.time() + args.refresh_within * 3600
+    tasks, skipped = [], []
+    for engine in engines:
+        for label, instructions, prompt in engine.canned_requests():
+            key = engine.cache_key(instructions, prompt)
+            if key in pending:
+                skipped.append({'model': engine.model, 'label': label, 'status': 'pending'})
+                continue
+            stamp = cache.describe(key)
+            if (not args.force and stamp and stamp['version'] == PROMPT_VERSION
+                    and stamp['expires_at'] > horizon):
+                skipped.append({'model': engine.model, 'label': label, 'status': 'fresh'})
+                continue
+            tasks.append((engine, label, instructions, prompt, key))
+    return tasks, skipped
+
+def worst_case_cost(engine, instructions: str, prompt: str, batch: bool = False) -> float:
+    payload = engine._build_payload(instructions, prompt)
+    return estimate_cost(engine._count_prompt_tokens(instructions, prompt), payload['max_tokens'],
+                             engine.model, batch=batch)
+
+def warm(task: tuple, reserved: float, cap: CostCap, cache, ttl: float) -> dict:
+    engine, label, instructions, prompt, key = task
+    current_user.set(WARMUP_USER)
+    current_entry.set('warmup')
+    row = {'model': engine.model, 'label': label}
+    actual = 0.0
+    try:
+        content, usage = engine._complete(get_http_client(), instructions, prompt, priority=PRIORITY_BULK)
+        if usage:  # already charged to the ledger by the engine
+            actual = usage_cost(usage, engine.model)
+        cache.put(key, content, ttl=ttl)
+        row.update(status='done', cost=round(actual, 6))
+    except DailyBudgetError:
+        row.update(status='over_budget')
+    except Exception as e:
+        row.update(status='failed', error=f"{e.__class__.__name__}: {e}")
+    finally:
+        cap.settle(reserved, actual)
+    print(f"[{row['status']}] {engine.model} {label}", file=sys.stderr)
+    return row
+
+def collect(backend, rows: list) -> set:
+    """Ingest every finished batch; returns the cache keys still waiting on an unfinished one"""
+    pending = set()
+    for manifest in open_batch_manifests():
+        if manifest['backend'] != backend.name:
+            continue
+        result = collect_batch(backend, manifest, api_key=getattr(backend, 'api_key', None))
+        if result['state'] == 'submitted':
+            pending.update(manifest['items'])
+        rows += result['items']
+        print(f"[batch {result['state']}] {manifest['batch_id']}", file=sys.stderr)
+    return pending
+
+def submit(backend, tasks: list, cap: CostCap, rows: list, ttl: float):
+    """Reserve each task's discounted worst case against the cap and submit the affordable ones as one batch"""
+    entries = []
+    for engine, label, instructions, prompt, key in tasks:
+        try:
+            reserved = worst_case_cost(engine, instructions, prompt, batch=backend.discounted)
+        except DailyBudgetError:
+            rows.append({'model': engine.model, 'label': label, 'status': 'over_budget'})
+            continue
+        except PromptBudgetError as e:
+            rows.append({'model': engine.model, 'label': label, 'status': 'failed', 'error': str(e)})
+            continue
+        if not cap.reserve(reserved):
+            rows.append({'model': engine.model, 'label': label, 'status': 'over_budget'})
+            continue
+        entries.append((key, engine._build_payload(instructions, prompt), {'model': engine.model, 'label': label}))
+    if not entries:
+        return None
+    manifest = submit_batch(backend, entries, ttl)
+    rows += [{'model': meta['model'], 'label': meta['label'], 'status': 'submitted'} for _, _, meta in entries]
+    print(f"[batch submitted] {manifest['batch_id']} ({len(entries)} requests)", file=sys.stderr)
+    return manifest
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key and not args.dry_run:
+        print("OPENAI_API_KEY is not set; nothing to warm.", file=sys.stderr)
+        return 2
+
+    current_user.set(WARMUP_USER)
+    left = get_cost_ledger().remaining('warmup')
+    if args.max_cost > left:
+        print(f"--max-cost {args.max_cost:g} lowered to the ${max(left, 0):.3f} left of today's warm-up budget",
+              file=sys.stderr)
+        args.max_cost = max(left, 0.0)
+    cache = get_response_cache()
+    engines = [create_engine(api_key, model) for model in args.models]
+    backend = BATCH_BACKENDS[args.batch_backend](api_key) if args.batch else None
+    cap = CostCap(args.max_cost)
+    rows = []
+    pending = collect(backend, rows) if backend and not args.dry_run else set()
+    tasks, skipped = plan(engines, cache, args, pending)
+    rows += skipped
+
+    if args.dry_run:
+        for engine, label, instructions, prompt, _ in tasks:
+            cost = worst_case_cost(engine, instructions, prompt, batch=bool(backend and backend.discounted))
+            rows.append({'model': engine.model, 'label': label, 'status': 'planned',
+                         'worst_case_cost': round(cost, 6)})
+    elif backend:
+        manifest = submit(backend, tasks, cap, rows, args.ttl * 3600)
+        while manifest and manifest['state'] == 'submitted':
+            result = collect_batch(backend, manifest, api_key=api_key)
+            if result['state'] == 'submitted':
+                if not args.wait:
+                    break
+                time.sleep(args.poll_interval)
+                continue
+            print(f"[batch {result['state']}] {manifest['batch_id']}", file=sys.stderr)
+            collected = {(item['model'], item['label']): item for item in result['items']}
+            missing = {'status': 'failed', 'error': f"batch {result['state']} without a result"}
+            rows = [collected.get((row['model'], row['label']), {**row, **missing})
+                    if row['status'] == 'submitted' else row for row in rows]
+    else:
+        slots = threading.BoundedSemaphore(args.concurrency)
+        futures = []
+        with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="wewine-warmup") as pool:
+            for task in tasks:
+                engine, label, instructions, prompt, _ = task
+                try:
+                    reserved = worst_case_cost(engine, instructions, prompt)
+                except DailyBudgetError:
+                    rows.append({'model': engine.model, 'label': label, 'status': 'over_budget'})
+                    continue
+                except PromptBudgetError as e:
+                    rows.append({'model': engine.model, 'label': label, 'status': 'failed', 'error': str(e)})
+                    continue
+                slots.acquire()  # reserve against settled spend, not against every queued task
+                if not cap.reserve(reserved, wait=True):
+                    slots.release()
+                    rows.append({'model': engine.model, 'label': label, 'status': 'over_budget'})
+                    continue
+                future = pool.submit(warm, task, reserved, cap, cache, args.ttl * 3600)
+                future.add_done_callback(lambda _: slots.release())
+                futures.append(future)
+        rows += [future.result() for future in futures]
+        get_cost_ledger().flush()
+
+    summary = {'prompt_version': PROMPT_VERSION, 'models': args.models,
+               'spent': round(sum(row.get('cost', 0) for row in rows), 6), 'max_cost': args.max_cost}
+    for status in ('done', 'fresh', 'over_budget', 'failed', 'planned', 'submitted', 'pending'):
+        summary[status] = sum(1 for row in rows if row['status'] == status)
+    print(json.dumps({'summary': summary, 'items': rows}, indent=2))
+    return 1 if summary['failed'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
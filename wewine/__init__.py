@@ -0,0 +1,12 @@
+"""WeWine's strategy engine, shared by the Streamlit app, the warm-up job and the benchmarks.
+
+Streamlit re-executes app.py in a fresh namespace on every rerun, while
+st.cache_resource hands back objects built during an earlier one. Anything such
+an object refers to - its class, the context variables it reads, the exception
+types callers catch - therefore lives here, in modules that are imported once
+per process, and app.py keeps only the page itself.
+"""
+from dotenv import load_dotenv
+
+# Load environment variables before any module reads its settings
+load_dotenv()
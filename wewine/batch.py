@@ -0,0 +1,209 @@
+"""Asynchronous batch submission for the warm-up job (provider batch API or a local stand-in)"""
+
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import OPENAI_BASE_URL
+from .clients import get_http_client
+from .resilience import call_with_resilience
+from .ledger import DATA_DIR, current_user, get_cost_ledger, usage_cost
+from .cache import PROMPT_VERSION, get_response_cache
+
+# --- BATCH API ---
+BATCH_DIR = os.getenv('WEWINE_BATCH_DIR', os.path.join(DATA_DIR, 'batches'))
+BATCH_COMPLETION_WINDOW = os.getenv('WEWINE_BATCH_COMPLETION_WINDOW', '24h')
+BATCH_PENDING_STATES = ('validating', 'in_progress', 'finalizing', 'cancelling')
+
+def openai_api_url(path: str) -> str:
+    """URL of another endpoint on the configured API"""
+    return OPENAI_BASE_URL + path
+
+def batch_line(custom_id: str, payload: dict) -> str:
+    """One request line of a chat-completions batch input file"""
+    return json.dumps({"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": payload},
+                      ensure_ascii=False)
+
+class OpenAIBatchBackend:
+    """The provider's asynchronous batch interface: upload a JSONL file, create a batch, poll, download"""
+    name = 'openai'
+    discounted = True
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+
+    def _headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+    def submit(self, input_path: str, metadata: dict = None) -> str:
+        client = get_http_client()
+        with open(input_path, 'rb') as handle:
+            upload = client.post(openai_api_url("/files"), headers=self._headers(),
+                                 data={"purpose": "batch"},
+                                 files={"file": (os.path.basename(input_path), handle, "application/jsonl")})
+        upload.raise_for_status()
+        created = client.post(openai_api_url("/batches"), headers=self._headers(), json={
+            "input_file_id": upload.json()["id"],
+            "endpoint": "/v1/chat/completions",
+            "completion_window": BATCH_COMPLETION_WINDOW,
+            "metadata": metadata or {}
+        })
+        created.raise_for_status()
+        return created.json()["id"]
+
+    def status(self, batch_id: str) -> dict:
+        """{'state': provider status, 'output': output file id or None, 'counts': request counts}"""
+        response = get_http_client().get(openai_api_url(f"/batches/{batch_id}"), headers=self._headers())
+        response.raise_for_status()
+        batch = response.json()
+        return {'state': batch['status'], 'output': batch.get('output_file_id'),
+                'errors': batch.get('error_file_id'), 'counts': batch.get('request_counts') or {}}
+
+    def results(self, status: dict):
+        """Yield the decoded output (and error) lines of a finished batch"""
+        for file_id in (status.get('output'), status.get('errors')):
+            if not file_id:
+                continue
+            response = get_http_client().get(openai_api_url(f"/files/{file_id}/content"), headers=self._headers())
+            response.raise_for_status()
+            for line in response.text.splitlines():
+                if line.strip():
+                    yield json.loads(line)
+
+class LocalBatchBackend:
+    """Stand-in that runs a batch file through the interactive endpoint, for development and tests.
+
+    It writes an output file in the provider's format and is complete as soon as
+    submit() returns; calls bill at interactive prices.
+    """
+    name = 'local'
+    discounted = False
+
+    def __init__(self, api_key: str, concurrency: int = 4):
+        self.api_key = api_key
+        self.concurrency = concurrency
+
+    def _run_line(self, request: dict) -> dict:
+        def send():
+            response = get_http_client().post(
+                openai_api_url(request["url"][len("/v1"):]),
+                headers={"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"},
+                json=request["body"]
+            )
+            response.raise_for_status()
+            return response
+
+        try:
+            response = call_with_resilience(send)
+            reply = {"status_code": response.status_code, "body": response.json()}
+            return {"custom_id": request["custom_id"], "response": reply, "error": None}
+        except Exception as e:
+            return {"custom_id": request["custom_id"], "response": None,
+                    "error": {"code": e.__class__.__name__, "message": str(e)}}
+
+    def submit(self, input_path: str, metadata: dict = None) -> str:
+        with open(input_path, encoding='utf-8') as handle:
+            requests = [json.loads(line) for line in handle if line.strip()]
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="wewine-batch") as pool:
+            outputs = list(pool.map(self._run_line, requests))
+        output_path = input_path[:-len('.jsonl')] + '.output.jsonl'
+        with open(output_path, 'w', encoding='utf-8') as handle:
+            handle.writelines(json.dumps(output, ensure_ascii=False) + "\n" for output in outputs)
+        return output_path
+
+    def status(self, batch_id: str) -> dict:
+        return {'state': 'completed', 'output': batch_id, 'errors': None, 'counts': {}}
+
+    def results(self, status: dict):
+        with open(status['output'], encoding='utf-8') as handle:
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+
+BATCH_BACKENDS = {backend.name: backend for backend in (OpenAIBatchBackend, LocalBatchBackend)}
+
+def submit_batch(backend, entries: list, ttl: float) -> dict:
+    """Serialize (custom_id, payload, meta) entries to JSONL, submit them and save a manifest.
+
+    ``custom_id`` is the response-cache key the answer will be stored under and
+    ``meta`` carries at least the model, used for per-item cost accounting. The
+    manifest in BATCH_DIR lets a later run collect the results.
+    """
+    os.makedirs(BATCH_DIR, exist_ok=True)
+    stem = os.path.join(BATCH_DIR, f"batch-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}")
+    with open(stem + '.jsonl', 'w', encoding='utf-8') as handle:
+        handle.writelines(batch_line(custom_id, payload) + "\n" for custom_id, payload, _ in entries)
+
+    manifest = {
+        'batch_id': backend.submit(stem + '.jsonl', {'source': 'wewine'}),
+        'backend': backend.name,
+        'state': 'submitted',
+        'submitted_at': time.time(),
+        'ttl': ttl,
+        'prompt_version': PROMPT_VERSION,
+        'items': {custom_id: meta for custom_id, _, meta in entries},
+        'path': stem + '.json'
+    }
+    save_batch_manifest(manifest)
+    return manifest
+
+def save_batch_manifest(manifest: dict):
+    with open(manifest['path'], 'w', encoding='utf-8') as handle:
+        json.dump(manifest, handle, ensure_ascii=False, indent=2)
+
+def open_batch_manifests() -> list:
+    """Manifests of batches that have not been collected yet, oldest first"""
+    if not os.path.isdir(BATCH_DIR):
+        return []
+    manifests = []
+    for name in sorted(os.listdir(BATCH_DIR)):
+        if name.endswith('.json'):
+            with open(os.path.join(BATCH_DIR, name), encoding='utf-8') as handle:
+                manifest = json.load(handle)
+            if manifest['state'] == 'submitted':
+                manifests.append(manifest)
+    return manifests
+
+def collect_batch(backend, manifest: dict, api_key: str = None) -> dict:
+    """Ingest a finished batch into the response cache, charging each item to the ledger.
+
+    Returns the manifest's new state and per-item outcomes; a batch still in
+    progress is left untouched ('submitted') for a later run.
+    """
+    status = backend.status(manifest['batch_id'])
+    if status['state'] in BATCH_PENDING_STATES:
+        return {'state': 'submitted', 'items': []}
+
+    items = []
+    if status['state'] == 'completed' and manifest['prompt_version'] == PROMPT_VERSION:
+        cache = get_response_cache()
+        ledger = get_cost_ledger()
+        for line in backend.results(status):
+            meta = manifest['items'].get(line.get('custom_id'))
+            if meta is None:
+                continue
+            outcome = {'label': meta.get('label'), 'model': meta['model']}
+            reply = line.get('response') or {}
+            if line.get('error') or reply.get('status_code') != 200:
+                outcome.update(status='failed', error=str(line.get('error') or reply.get('body')))
+                items.append(outcome)
+                continue
+            body = reply['body']
+            usage = body.get('usage')
+            cost = 0.0
+            if usage:
+                cost = usage_cost(usage, meta['model'], batch=backend.discounted)
+                cached_tokens = (usage.get('prompt_tokens_details') or {}).get('cached_tokens') or 0
+                ledger.record(cost, usage['prompt_tokens'], usage['completion_tokens'], meta['model'],
+                              api_key=api_key, user_id=current_user.get(), cached_tokens=cached_tokens)
+            cache.put(line['custom_id'], body['choices'][0]['message']['content'], ttl=manifest['ttl'])
+            outcome.update(status='done', cost=round(cost, 6))
+            items.append(outcome)
+        ledger.flush()
+
+    manifest['state'] = 'collected' if status['state'] == 'completed' else status['state']
+    manifest['collected_at'] = time.time()
+    save_batch_manifest(manifest)
+    return {'state': manifest['state'], 'items': items}
@@ -0,0 +1,328 @@
+"""Exact-match response cache (memory + SQLite) and the semantic cache of free-form queries"""
+
+import hashlib
+import importlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import streamlit as st
+
+from .lazy import np
+from .ledger import DATA_DIR
+from .knowledge import fold_plural
+
+# --- RESPONSE CACHE ---
+RESPONSE_CACHE_TTL = float(os.getenv('WEWINE_CACHE_TTL', str(24 * 3600)))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('WEWINE_CACHE_MAX_ENTRIES', '256'))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv('WEWINE_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
+RESPONSE_CACHE_DB = os.getenv('WEWINE_CACHE_DB', os.path.join(DATA_DIR, 'responses.sqlite3'))  # '' disables the disk tier
+RESPONSE_CACHE_DB_MAX_ENTRIES = int(os.getenv('WEWINE_CACHE_DB_MAX_ENTRIES', '5000'))
+PROMPT_VERSION = "2026.10.1"  # bump when prompt templates change meaning; stamps and re-keys every cached answer
+
+def response_cache_key(model: str, prompt_prefix: str, instructions: str,
+                       user_prompt: str, temperature, knowledge: str = "") -> str:
+    """Content address of a completion request"""
+    material = json.dumps([PROMPT_VERSION, model, prompt_prefix, instructions, user_prompt, temperature, knowledge],
+                          ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """Completed AI responses: an in-memory LRU tier over an optional SQLite tier.
+
+    Entries carry their own expiry; the memory tier is bounded by entry count and
+    total bytes, the disk tier by entry count (least recently used evicted first).
+    Disk entries are stamped with the prompt version and creation time, which lets
+    other processes (e.g. warmup.py) write answers the app then serves.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+                 max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+                 default_ttl: float = RESPONSE_CACHE_TTL,
+                 db_path: str = None, db_max_entries: int = RESPONSE_CACHE_DB_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.db_max_entries = db_max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._db = None
+        if db_path:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=10)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    version TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            self._db.commit()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                self._evict(key)
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row and row[1] > now:
+                    self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                    self._db.commit()
+                    self._store(key, row[0], row[1])
+                    self.hits += 1
+                    return row[0]
+                if row:
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: str, ttl: float = None):
+        now = time.time()
+        expires_at = now + (self.default_ttl if ttl is None else ttl)
+        with self._lock:
+            self._store(key, value, expires_at)
+
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, expires_at, last_access, version, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, value, expires_at, now, PROMPT_VERSION, now)
+                )
+                self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+                self._db.execute("""
+                    DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.db_max_entries,))
+                self._db.commit()
+
+    def describe(self, key: str) -> dict:
+        """Stamp of a live entry - version, created_at, expires_at - or None"""
+        now = time.time()
+        with self._lock:
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT version, created_at, expires_at FROM responses WHERE key = ? AND expires_at > ?",
+                    (key, now)
+                ).fetchone()
+                if row:
+                    return {'version': row[0], 'created_at': row[1], 'expires_at': row[2]}
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                return {'version': PROMPT_VERSION, 'created_at': None, 'expires_at': entry[0]}
+        return None
+
+    def _store(self, key: str, value: str, expires_at: float):
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._evict(key)
+        self._entries[key] = (expires_at, value, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+@st.cache_resource(show_spinner=False)
+def get_response_cache() -> ResponseCache:
+    """Response cache shared by all sessions in this process"""
+    return ResponseCache(db_path=RESPONSE_CACHE_DB)
+
+# --- SEMANTIC QUERY CACHE ---
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('WEWINE_SEMANTIC_THRESHOLD', '0.80'))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv('WEWINE_SEMANTIC_MAX_ENTRIES', '512'))
+SEMANTIC_CACHE_TTL = float(os.getenv('WEWINE_SEMANTIC_TTL', str(RESPONSE_CACHE_TTL)))
+QUERY_EMBEDDER = os.getenv('WEWINE_EMBEDDER')  # optional "package.module:factory" override
+
+# Every query is about WeWine, so the brand and filler phrasing carry no signal; negations
+# are left to the cache's polarity guard rather than the vector
+_STOPWORDS = frozenset(
+    "a an and any app are as at be best by can cannot could did do does for from good how i idea in "
+    "into is it its never no nor not of on or our plan s should so that the their there this to us "
+    "way we wewine what when where which who why will with within without would".split()
+)
+
+# Query vocabulary that means the same thing to the strategist, folded to one term
+_SYNONYMS = {
+    word: canonical
+    for canonical, words in {
+        'reach': "achieve attain get hit reach",
+        'improve': "boost improve lift",
+        'compete': "against beat compete counter fight",
+        'price': "price pricing",
+        'prioritize': "focus prioritise prioritize",
+        'expand': "enter expand expansion",
+    }.items()
+    for word in words.split()
+}
+
+_NEGATIONS = re.compile(r"\b(?:not|no|never|without|nor|cannot)\b|n['\u2019]t\b")
+
+class HashedNgramEmbedder:
+    """Offline query embedder using signed feature hashing.
+
+    Features are word unigrams/bigrams (stopwords removed, plurals and known
+    synonyms folded) plus character n-grams at ``char_weight``, weighted by
+    sublinear term frequency and L2-normalised, so cosine similarity is a
+    plain dot product.
+    """
+
+    def __init__(self, dim: int = 2048, char_ngrams=(3, 4, 5), char_weight: float = 0.5):
+        self.dim = dim
+        self.char_ngrams = char_ngrams
+        self.char_weight = char_weight
+
+    def _features(self, text: str):
+        words = re.findall(r"[a-z0-9%$.']+", text.lower().replace('\u2019', "'"))
+        content = []
+        for word in words:
+            word = word.strip(".'")
+            word = word[:-2] if word.endswith("'s") else word
+            if word and word not in _STOPWORDS and not word.endswith("n't"):
+                word = fold_plural(word)
+                content.append(_SYNONYMS.get(word, word))
+        features = [(word, 1.0) for word in content]
+        features += [(f"{a} {b}", 1.0) for a, b in zip(content, content[1:])]
+        joined = f" {' '.join(content)} "
+        for n in self.char_ngrams:
+            features += [(f"#{joined[i:i + n]}", self.char_weight) for i in range(len(joined) - n + 1)]
+        return features
+
+    def __call__(self, text: str) -> 'np.ndarray':
+        counts = {}
+        for feature, weight in self._features(text):
+            digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+            value = int.from_bytes(digest, 'little')
+            index = value % self.dim
+            sign = 1.0 if (value >> 63) & 1 else -1.0
+            counts[index] = counts.get(index, 0.0) + sign * weight
+
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for index, count in counts.items():
+            vector[index] = np.sign(count) * (1.0 + np.log(abs(count))) if abs(count) >= 1 else count
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+def load_query_embedder():
+    """Embedder for the semantic cache: WEWINE_EMBEDDER factory or the hashed n-gram default"""
+    if QUERY_EMBEDDER:
+        module_name, _, factory = QUERY_EMBEDDER.partition(':')
+        return getattr(importlib.import_module(module_name), factory or 'embedder')()
+    return HashedNgramEmbedder()
+
+class SemanticCache:
+    """Answers to free-form queries, matched by embedding similarity.
+
+    Each (model, mode) pair gets a fixed-capacity NumPy matrix of unit vectors
+    searched by brute-force dot product; the oldest slot is overwritten once full.
+    Queries whose numbers differ ("3.2% to 5%" vs "3.2% to 6%") or whose
+    polarity differs ("expand to Spain" vs "not expand to Spain") never match,
+    however close their vectors are.
+    """
+
+    def __init__(self, embedder, threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES, ttl: float = SEMANTIC_CACHE_TTL):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._indexes = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _guard(text: str) -> tuple:
+        """Facts a match must share exactly: the numbers quoted and whether the question is negated"""
+        numbers = frozenset(re.findall(r"\d+(?:[.,]\d+)?", text))
+        negated = len(_NEGATIONS.findall(text.lower())) % 2 == 1
+        return numbers, negated
+
+    def _index(self, model: str, mode: str, dim: int) -> dict:
+        key = (model, mode)
+        if key not in self._indexes:
+            self._indexes[key] = {
+                "vectors": np.zeros((self.max_entries, dim), dtype=np.float32),
+                "expires": np.zeros(self.max_entries, dtype=np.float64),
+                "answers": [None] * self.max_entries,
+                "guards": [None] * self.max_entries,
+                "next": 0
+            }
+        return self._indexes[key]
+
+    def lookup(self, model: str, mode: str, query: str):
+        """Return (answer, similarity) for the closest live match above threshold, else None"""
+        vector = self.embedder(query)
+        guard = self._guard(query)
+        with self._lock:
+            index = self._indexes.get((model, mode))
+            if index is not None:
+                scores = index["vectors"] @ vector
+                scores[index["expires"] <= time.time()] = -1.0
+                for slot in np.argsort(scores)[::-1][:5]:
+                    if scores[slot] < self.threshold:
+                        break
+                    if index["guards"][slot] == guard:
+                        self.hits += 1
+                        return index["answers"][slot], float(scores[slot])
+            self.misses += 1
+            return None
+
+    def add(self, model: str, mode: str, query: str, answer: str):
+        vector = self.embedder(query)
+        with self._lock:
+            index = self._index(model, mode, vector.shape[0])
+            slot = index["next"]
+            index["vectors"][slot] = vector
+            index["expires"][slot] = time.time() + self.ttl
+            index["answers"][slot] = answer
+            index["guards"][slot] = self._guard(query)
+            index["next"] = (slot + 1) % self.max_entries
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = sum(int((index["expires"] > time.time()).sum()) for index in self._indexes.values())
+            return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+@st.cache_resource(show_spinner=False)
+def get_semantic_cache() -> SemanticCache:
+    """Semantic query cache shared by all sessions in this process"""
+    return SemanticCache(load_query_embedder())
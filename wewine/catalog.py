@@ -0,0 +1,38 @@
+"""The canned analyses offered in the UI: competitors, growth focuses, roadmap periods and examples"""
+
+# --- CANNED ANALYSIS CATALOG ---
+# Closed input sets behind the canned buttons; warmup.py precomputes every combination.
+MODEL_OPTIONS = {
+    "GPT-4": "gpt-4",
+    "GPT-4 Turbo": "gpt-4-turbo-preview",
+    "GPT-3.5 Turbo": "gpt-3.5-turbo",
+    "O1-Preview": "o1-preview",
+    "O1-Mini": "o1-mini"
+}
+
+COMPETITORS = {
+    "Vivino": {"users": "70M+", "funding": "$224M", "strength": "Massive community", "weakness": "Information overload"},
+    "Delectable": {"users": "2M+", "funding": "$15M+", "strength": "Expert curation", "weakness": "Intimidating for beginners"},
+    "Firstleaf": {"users": "1M+", "funding": "$27.6M", "strength": "AI accuracy", "weakness": "US-only, subscription lock-in"},
+    "Wine-Searcher": {"users": "5M+", "funding": "Private", "strength": "Price data", "weakness": "Complex interface"},
+    "Nakedwines": {"users": "964K", "funding": "$10M", "strength": "Unique model", "weakness": "Limited selection"}
+}
+
+GROWTH_FOCUSES = ["user_acquisition", "retention", "monetization", "market_expansion", "product_growth"]
+
+ROADMAP_PERIODS = ["90_days", "6_months", "1_year"]
+
+POSITIONING_QUESTIONS = [
+    "How should WeWine position against market leaders?",
+    "What's our unique value proposition vs. Vivino?",
+    "Which competitor should we target first?",
+    "What partnerships can counter competitor advantages?"
+]
+
+QUERY_EXAMPLES = [
+    "How can WeWine achieve 100K users in 12 months?",
+    "What's our best strategy against Vivino's dominance?",
+    "How should we price our premium subscription?",
+    "What partnerships should we prioritize for growth?",
+    "How can we improve our conversion rate from 3.2% to 5%?"
+]
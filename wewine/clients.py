@@ -0,0 +1,106 @@
+"""Process-wide HTTP connection pools, the agent thread pool and the async engine's event loop"""
+
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import streamlit as st
+
+from .lazy import httpx
+from .config import (
+    AGENT_POOL_SIZE, HTTP_CONNECT_TIMEOUT, HTTP_KEEPALIVE_EXPIRY, HTTP_MAX_CONNECTIONS, HTTP_READ_TIMEOUT
+)
+
+# --- SHARED HTTP CLIENT ---
+# Process-wide resources may be first requested from agent threads or the engine
+# loop, which have no script run to show a cache spinner in - hence show_spinner=False.
+def http_client_options() -> dict:
+    """Connection settings shared by the blocking and async clients"""
+    try:
+        import h2  # noqa: F401 -- HTTP/2 is negotiated via ALPN only when h2 is installed
+        http2 = True
+    except ImportError:
+        http2 = False
+
+    return dict(
+        http2=http2,
+        timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        )
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_http_client() -> 'httpx.Client':
+    """Process-wide keep-alive connection pool shared by every session and rerun"""
+    return httpx.Client(**http_client_options())
+
+@st.cache_resource(show_spinner=False)
+def get_agent_executor() -> ThreadPoolExecutor:
+    """Bounded worker pool for concurrent specialist-agent calls, shared process-wide"""
+    return ThreadPoolExecutor(max_workers=AGENT_POOL_SIZE, thread_name_prefix="wewine-agent")
+
+# --- ASYNC ENGINE LOOP ---
+class EngineLoop:
+    """One asyncio event loop on a daemon thread, shared by every session.
+
+    Streamlit script threads hand coroutines to it and block only on their own
+    result, so many completions can be in flight on a single thread.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="wewine-engine-loop", daemon=True)
+        self._thread.start()
+
+    def submit(self, coro) -> Future:
+        """Schedule a coroutine without waiting for it.
+
+        It runs in a copy of the caller's context, so context variables such as
+        the current user and metrics entry point carry over to the loop.
+        """
+        context = contextvars.copy_context()
+
+        async def in_caller_context():
+            return await self.loop.create_task(coro, context=context)
+        return asyncio.run_coroutine_threadsafe(in_caller_context(), self.loop)
+
+    def run(self, coro, timeout: float = None):
+        """Run a coroutine on the loop and block the calling thread for its result"""
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("cannot block on the engine loop from its own thread")
+        return self.submit(coro).result(timeout)
+
+    def iterate(self, agen):
+        """Drive an async generator from synchronous code, one item per round trip"""
+        try:
+            while True:
+                try:
+                    yield self.run(agen.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            if threading.current_thread() is self._thread:
+                self.loop.create_task(agen.aclose())
+            else:
+                self.run(agen.aclose())
+
+    def resolve(self, coro):
+        """Like ``run``, but async-iterator results come back as plain iterators"""
+        result = self.run(coro)
+        if hasattr(result, '__anext__'):
+            return self.iterate(result)
+        return result
+
+@st.cache_resource(show_spinner=False)
+def get_engine_loop() -> EngineLoop:
+    return EngineLoop()
+
+@st.cache_resource(show_spinner=False)
+def get_async_http_client() -> 'httpx.AsyncClient':
+    """Async counterpart of get_http_client; only use it on the engine loop"""
+    return httpx.AsyncClient(**http_client_options())
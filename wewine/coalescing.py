@@ -0,0 +1,126 @@
+"""Single-flight coalescing of identical in-flight completions"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+import streamlit as st
+
+from .lazy import httpx
+
+# --- REQUEST COALESCING ---
+COALESCE_WAIT = float(os.getenv('WEWINE_COALESCE_WAIT', '180'))  # longest a follower waits, deadline or not
+
+class FlightAbandoned(Exception):
+    """The leading request ended without a result that followers can share"""
+
+class SingleFlight:
+    """Collapse concurrent identical upstream requests into one.
+
+    The first caller for a fingerprint becomes the leader and performs the call;
+    callers arriving while it is in flight wait on the leader's future and share
+    its result (or its error). Nothing is retained once the flight lands - that
+    is the response cache's job. A follower waits no longer than its own
+    deadline allows and then times out like a request of its own would.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def begin(self, key: str):
+        """Return (future, is_leader) for the flight keyed by ``key``"""
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._flights[key] = Future()
+            self.leaders += 1
+            return future, True
+
+    def land(self, key: str, future: Future, result=None, error: Exception = None):
+        """Resolve a leader's flight; later calls for the key start a new one"""
+        with self._lock:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    @staticmethod
+    def _patience(deadline: float = None) -> float:
+        """Seconds a follower may wait: COALESCE_WAIT, or what is left before a monotonic ``deadline``"""
+        if deadline is None:
+            return COALESCE_WAIT
+        return max(0.0, min(COALESCE_WAIT, deadline - time.monotonic()))
+
+    def follow(self, future: Future, deadline: float = None):
+        """The leader's result (or error) for a follower; httpx.TimeoutException once the wait runs out"""
+        try:
+            return future.result(timeout=self._patience(deadline))
+        except FutureTimeoutError:
+            raise httpx.TimeoutException("gave up waiting on an identical request in flight") from None
+
+    async def afollow(self, future: Future, deadline: float = None):
+        """Coroutine twin of ``follow``; cancelling the wait leaves the leader's flight alone"""
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self._patience(deadline))
+        except asyncio.TimeoutError:
+            raise httpx.TimeoutException("gave up waiting on an identical request in flight") from None
+
+    def do(self, key: str, fn, deadline: float = None):
+        """Run ``fn`` once per concurrent ``key``; returns (result, is_leader)"""
+        while True:
+            future, leader = self.begin(key)
+            if not leader:
+                try:
+                    return self.follow(future, deadline), False
+                except FlightAbandoned:
+                    continue
+            try:
+                result = fn()
+            except BaseException as error:
+                self.land(key, future, error=error)
+                raise
+            self.land(key, future, result)
+            return result, True
+
+    async def ado(self, key: str, fn, deadline: float = None):
+        """Coroutine twin of ``do``; ``fn`` returns an awaitable.
+
+        A leader cancelled mid-flight (e.g. by a timeout) abandons the flight so
+        its followers issue the request themselves.
+        """
+        while True:
+            future, leader = self.begin(key)
+            if not leader:
+                try:
+                    return await self.afollow(future, deadline), False
+                except FlightAbandoned:
+                    continue
+            try:
+                result = await fn()
+            except asyncio.CancelledError:
+                self.land(key, future, error=FlightAbandoned())
+                raise
+            except BaseException as error:
+                self.land(key, future, error=error)
+                raise
+            self.land(key, future, result)
+            return result, True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'in_flight': len(self._flights), 'leaders': self.leaders, 'coalesced': self.coalesced}
+
+@st.cache_resource(show_spinner=False)
+def get_single_flight() -> SingleFlight:
+    return SingleFlight()
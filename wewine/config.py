@@ -0,0 +1,16 @@
+"""Runtime settings shared by the engine modules, read from WEWINE_* and OPENAI_* variables at import"""
+
+import os
+
+# --- RUNTIME CONFIGURATION ---
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1').rstrip('/')  # e.g. mock_server.py
+OPENAI_CHAT_URL = f"{OPENAI_BASE_URL}/chat/completions"
+HTTP_CONNECT_TIMEOUT = float(os.getenv('WEWINE_HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.getenv('WEWINE_HTTP_READ_TIMEOUT', '120'))
+HTTP_MAX_CONNECTIONS = int(os.getenv('WEWINE_HTTP_MAX_CONNECTIONS', '20'))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('WEWINE_HTTP_KEEPALIVE_EXPIRY', '60'))
+MULTI_AGENT_MODE = os.getenv('WEWINE_MULTI_AGENT_MODE', 'parallel')  # 'parallel' fan-out or 'single' call
+AGENT_MAX_TOKENS = int(os.getenv('WEWINE_AGENT_MAX_TOKENS', '900'))
+AGENT_TIMEOUT = float(os.getenv('WEWINE_AGENT_TIMEOUT', '60'))
+AGENT_POOL_SIZE = int(os.getenv('WEWINE_AGENT_POOL_SIZE', '16'))
+ENGINE_MODE = os.getenv('WEWINE_ENGINE', 'async')  # 'async' event-loop engine or 'threads'
@@ -0,0 +1,1335 @@
+"""The strategy engines: prompt building, the completion pipeline and the shared engine cache"""
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import textwrap
+import time
+from concurrent.futures import wait
+from contextlib import asynccontextmanager, contextmanager
+
+import streamlit as st
+
+from .lazy import httpx
+from .config import AGENT_MAX_TOKENS, AGENT_TIMEOUT, ENGINE_MODE, MULTI_AGENT_MODE, OPENAI_CHAT_URL
+from .clients import get_agent_executor, get_async_http_client, get_engine_loop, get_http_client
+from .resilience import (
+    CircuitOpenError, acall_with_resilience, call_with_resilience, get_circuit_breaker, time_left
+)
+from .scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE, RateLimitWaitError, get_request_scheduler
+from .ledger import CostLedger, check_cost_limit, estimate_cost, get_cost_ledger
+from .tokens import DailyBudgetError, PromptBudgetError, get_token_counter, size_completion
+from .catalog import COMPETITORS, GROWTH_FOCUSES, POSITIONING_QUESTIONS, QUERY_EXAMPLES, ROADMAP_PERIODS
+from .knowledge import COMPANY_PROFILE, KNOWLEDGE_TOKENS, company_identity, get_knowledge_store
+from .cache import get_response_cache, get_semantic_cache, response_cache_key
+from .coalescing import FlightAbandoned, get_single_flight
+from .memory import (
+    CONVERSATION_SUMMARY_INSTRUCTIONS, CONVERSATION_SUMMARY_TOKENS, ConversationStore, contextualize,
+    conversation_budget, conversation_window, extractive_summary, get_conversation_store, turn_text
+)
+from .router import get_fallback_router
+from .metrics import (
+    finish_call_trace, get_metrics, http_trace, instrumented, new_call_trace, record_stage, stage_span
+)
+
+# --- AI CEO CORE CLASS ---
+class OfflineAnswer(str):
+    """Text shown in place of a model answer: an API error notice or an offline framework.
+
+    Engine calls return (or, when streaming, yield) this type for anything the
+    model did not write, so callers can tell a real answer from a stand-in
+    without parsing the rendered text.
+    """
+
+def is_model_answer(response: str) -> bool:
+    """Whether a finished response is the model's own answer (fresh or cached)"""
+    return bool(response) and not isinstance(response, OfflineAnswer)
+
+class WeWineStrategicAICEO:
+    SPECIALIST_AGENTS = [
+        ("📊 Market Research Agent", "Competitive analysis, market sizing, trends"),
+        ("📈 Growth Agent", "User acquisition, retention, viral strategies"),
+        ("🛠️ Product Agent", "Feature prioritization, UX/UI, technical roadmap"),
+        ("💰 CFO Agent", "Financial modeling, unit economics, fundraising"),
+        ("🎨 Brand Agent", "Positioning, messaging, community building")
+    ]
+    FALLBACK_FRAMEWORKS = {
+        'market': '_market_analysis_framework',
+        'growth': '_growth_strategy_framework',
+        'product': '_product_strategy_framework',
+        'gtm': '_gtm_framework',
+        'general': '_general_strategic_framework',
+    }
+
+    def __init__(self, api_key: str = None, model: str = "gpt-4"):
+        self.api_key = api_key or os.getenv('OPENAI_API_KEY')
+        self.model = model
+        self.api_available = self.api_key is not None
+        
+        self.company_context = COMPANY_PROFILE
+        
+        self.system_prompt = """
+        You are "Aura," the Strategic AI Co-Founder of WeWine.app. Your persona blends:
+        - Seasoned venture-backed CEO with exits
+        - Master sommelier with deep wine knowledge  
+        - Brilliant product strategist with user obsession
+        - Growth expert with proven scaling experience
+        
+        GUIDING PRINCIPLES:
+        1. **Founder's Mentality:** Think ROI, growth levers, user LTV, sustainable competitive advantage. 
+           Every recommendation must be actionable with clear success metrics.
+        2. **User-Obsessed:** Frame decisions around removing friction and creating "wow" moments for 
+           "Curious Enthusiasts." Use behavioral psychology and UX best practices.
+        3. **Framework-Driven:** Structure analysis using OKRs, RICE scoring, AARRR metrics, Jobs-to-be-Done, 
+           and proven Go-To-Market strategies.
+        4. **Brand Voice:** Sophisticated yet accessible. Expert authority with mentor warmth. Avoid jargon.
+        5. **Strategic Depth:** Connect tactical recommendations to long-term strategic advantages and moat-building.
+        
+        OUTPUT FORMAT: Use clear Markdown with executive summaries, headers, bullet points. Start responses 
+        with 2-3 sentence strategic overview, then detailed analysis with specific action items and success metrics.
+        """
+
+        self.prompt_prefix = self._assemble_prompt_prefix()
+
+    # --- PROMPT ASSEMBLY ---
+    # Every request starts with the same byte-identical prefix (persona, company
+    # profile, agent roster) so the provider's prompt cache can reuse it across
+    # all call types; per-call instructions and the user prompt follow it.
+    def _assemble_prompt_prefix(self) -> str:
+        roster = [("🎯 CEO Agent", "Strategic oversight, synthesis, final recommendations")] + self.SPECIALIST_AGENTS
+        roster_lines = "\n".join(f"- {name}: {focus}" for name, focus in roster)
+        # with retrieval on, the rest of the profile arrives per request as retrieved knowledge
+        company = company_identity() if KNOWLEDGE_TOKENS > 0 else textwrap.dedent(self.company_context).strip()
+        return (
+            f"{textwrap.dedent(self.system_prompt).strip()}\n\n"
+            f"{company}\n\n"
+            f"ADVISORY TEAM (personas you may be asked to adopt):\n{roster_lines}"
+        )
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return textwrap.dedent(text).strip() if text else ""
+
+    def _knowledge(self, instructions: str, user_prompt: str) -> str:
+        """Retrieved knowledge block for a request ("" when none applies)"""
+        return get_knowledge_store().context(f"{instructions or ''}\n{user_prompt}", self.model)
+
+    def _build_messages(self, instructions: str, user_prompt: str) -> list:
+        messages = [{"role": "system", "content": self.prompt_prefix}]
+        if instructions:
+            messages.append({"role": "system", "content": self._normalize(instructions)})
+        knowledge = self._knowledge(instructions, user_prompt)
+        if knowledge:
+            messages.append({"role": "system", "content": knowledge})
+        messages.append({"role": "user", "content": self._normalize(user_prompt)})
+        return messages
+
+    def _build_payload(self, instructions: str, user_prompt: str, stream: bool = False,
+                       max_tokens: int = None) -> dict:
+        """Chat completions request body shared by blocking and streaming calls"""
+        default_max_tokens = 2500 if self.model.startswith('o1') else 3000
+        prompt_tokens = self._count_prompt_tokens(instructions, user_prompt)
+        payload = {
+            "model": self.model,
+            "messages": self._build_messages(instructions, user_prompt),
+            "max_tokens": size_completion(self.model, prompt_tokens, max_tokens or default_max_tokens),
+            "temperature": self._temperature()
+        }
+        if stream:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+
+    def _count_prompt_tokens(self, instructions: str, user_prompt: str) -> int:
+        """Pre-flight prompt size; only the per-call user prompt is tokenized afresh"""
+        knowledge = self._knowledge(instructions, user_prompt)
+        return get_token_counter().count_chat(
+            self.model,
+            static_parts=(self.prompt_prefix, self._normalize(instructions), knowledge),
+            dynamic_parts=(self._normalize(user_prompt),),
+            messages=2 + bool(instructions) + bool(knowledge)
+        )
+
+    def _temperature(self):
+        return 0.7 if not self.model.startswith('o1') else None
+
+    def _request_headers(self) -> dict:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    def _record_usage(self, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0,
+                      reserved: float = 0.0):
+        """Charge a finished call to the shared cost ledger, releasing its reservation"""
+        get_cost_ledger().record(estimate_cost(prompt_tokens, completion_tokens, self.model, cached_tokens),
+                                 prompt_tokens, completion_tokens, self.model, api_key=self.api_key,
+                                 cached_tokens=cached_tokens, reserved=reserved)
+        metrics = get_metrics()
+        for kind, tokens in (('prompt', prompt_tokens), ('completion', completion_tokens), ('cached', cached_tokens)):
+            metrics.inc('wewine_tokens_total', tokens, model=self.model, kind=kind)
+
+    def _charge_usage(self, usage: dict, reserved: float = 0.0):
+        """Record an API usage object, including provider-reported cached prefix tokens"""
+        cached_tokens = (usage.get('prompt_tokens_details') or {}).get('cached_tokens') or 0
+        self._record_usage(usage['prompt_tokens'], usage['completion_tokens'], cached_tokens, reserved)
+
+    def _reserve_spend(self, instructions: str, user_prompt: str, payload: dict) -> float:
+        """Hold a request's worst-case cost in the ledger before sending; raises when it no longer fits"""
+        prompt_tokens = self._count_prompt_tokens(instructions, user_prompt)
+        cost = estimate_cost(prompt_tokens, payload['max_tokens'], self.model)
+        ledger = get_cost_ledger()
+        if not ledger.reserve(cost):
+            raise DailyBudgetError(
+                f"Request would cost more than the ${max(ledger.remaining(), 0):.3f} left in today's budget "
+                f"({prompt_tokens:,} prompt tokens on {self.model})."
+            )
+        return cost
+
+    def _settle_spend(self, instructions: str, user_prompt: str, reserved: float, usage: dict, content: str):
+        """Charge a completed call, from its usage object or a local count when the server sent none"""
+        if usage:
+            self._charge_usage(usage, reserved)
+        elif content:
+            self._record_usage(self._count_prompt_tokens(instructions, user_prompt),
+                               get_token_counter().count(content, self.model), reserved=reserved)
+        else:
+            get_cost_ledger().release(reserved)
+
+    def _flight_key(self, payload: dict) -> str:
+        """Fingerprint of everything that determines a completion, whether streamed or not"""
+        request = {name: value for name, value in payload.items() if name not in ('stream', 'stream_options')}
+        material = json.dumps([CostLedger.key_fingerprint(self.api_key), request],
+                              ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _token_reservation(self, instructions: str, user_prompt: str, payload: dict) -> int:
+        """TPM reservation for a request: pre-flight prompt estimate plus its completion budget"""
+        return self._count_prompt_tokens(instructions, user_prompt) + payload['max_tokens']
+
+    @staticmethod
+    def _tokens_used(usage: dict, reservation: int) -> int:
+        """Tokens the provider counted against TPM; the full reservation when unknown"""
+        if not usage:
+            return reservation
+        return usage.get('total_tokens') or usage['prompt_tokens'] + usage['completion_tokens']
+
+    @staticmethod
+    @contextmanager
+    def _admitted(reservation: int, priority: int, trace: dict = None, deadline: float = None):
+        """Wait for a rate-limit slot; a request that fails or is cancelled before its response is refunded"""
+        scheduler = get_request_scheduler()
+        max_wait = None if deadline is None else deadline - time.monotonic()
+        waited = scheduler.acquire(reservation, priority, max_wait)
+        if trace is not None:
+            record_stage(trace, 'queue', waited)
+        try:
+            yield
+        except BaseException:
+            scheduler.settle(reservation, 0)
+            raise
+
+    @staticmethod
+    @asynccontextmanager
+    async def _aadmitted(reservation: int, priority: int, trace: dict = None, deadline: float = None):
+        """Async ``_admitted``; queued calls wait on the loop itself, holding no executor thread"""
+        scheduler = get_request_scheduler()
+        max_wait = None if deadline is None else deadline - time.monotonic()
+        waited = await scheduler.aacquire(reservation, priority, max_wait)
+        if trace is not None:
+            record_stage(trace, 'queue', waited)
+        try:
+            yield
+        except BaseException:
+            scheduler.settle(reservation, 0)
+            raise
+
+    @staticmethod
+    def _format_api_error(error: Exception) -> OfflineAnswer:
+        """Turn a transport or API failure into the user-facing fallback notice"""
+        return OfflineAnswer(WeWineStrategicAICEO._describe_api_error(error))
+
+    @staticmethod
+    def _describe_api_error(error: Exception) -> str:
+        if isinstance(error, PromptBudgetError):
+            return f"📏 **Request not sent:** {error}\n\nUsing offline strategic framework..."
+        if isinstance(error, RateLimitWaitError):
+            return f"🚦 **AI service busy:** {error}. Please try again in a moment.\n\nUsing offline strategic framework..."
+        if isinstance(error, CircuitOpenError):
+            return f"⚡ **AI service paused:** {error}; retrying shortly.\n\nUsing offline strategic framework..."
+        if isinstance(error, httpx.HTTPStatusError):
+            try:
+                error_details = error.response.json().get('error', {}).get('message', 'No details provided.')
+            except ValueError:
+                error_details = 'No details provided.'
+            return f"❌ **API Error:** {error}\n\n*Details:* {error_details}\n\nFalling back to offline analysis..."
+        if isinstance(error, httpx.TimeoutException):
+            return f"⏱️ **Timeout:** The AI service did not respond in time ({error.__class__.__name__}).\n\nUsing offline strategic framework..."
+        return f"❌ **Connection Error:** {str(error)}\n\nUsing offline strategic framework..."
+
+    @instrumented
+    def _call_openai_api(self, user_prompt: str, system_override: str = None, stream: bool = False,
+                         use_cache: bool = False, force_refresh: bool = False, semantic_mode: str = None,
+                         priority: int = PRIORITY_BULK):
+        """Enhanced API call with cost tracking and error handling.
+
+        Returns the full response text, or - when ``stream`` is set and the request
+        goes upstream - an iterator of text chunks as they arrive. Error notices and
+        offline answers come back as OfflineAnswer. With ``use_cache``
+        successful responses are stored in the shared response cache and served from
+        it on later identical requests unless ``force_refresh`` is set. With
+        ``semantic_mode`` (e.g. "single_agent") paraphrases of an earlier free-form
+        query for the same model and mode are answered from the semantic cache.
+        ``priority`` orders the request in the shared rate-limit queue.
+        """
+        instructions = system_override
+        answer, remember = self._prepare_call(user_prompt, instructions, use_cache, force_refresh, semantic_mode)
+        if answer is not None:
+            return answer
+
+        if stream:
+            return self._stream_openai_api(instructions, user_prompt, remember, priority)
+
+        try:
+            content, _ = self._complete(get_http_client(), instructions, user_prompt, priority=priority)
+            remember(content)
+            return content
+            
+        except CircuitOpenError:
+            return self._generate_fallback_response(user_prompt)
+        except Exception as e:
+            return self._format_api_error(e)
+
+    def cache_key(self, instructions: str, user_prompt: str) -> str:
+        """Response-cache address of a call to this engine's model"""
+        return response_cache_key(self.model, self.prompt_prefix, instructions or "",
+                                  user_prompt, self._temperature(), self._knowledge(instructions, user_prompt))
+
+    def _prepare_call(self, user_prompt: str, instructions: str, use_cache: bool,
+                      force_refresh: bool, semantic_mode: str):
+        """Answer a call locally when possible.
+
+        Returns (answer, remember): ``answer`` is the cached, offline or budget text
+        when no upstream request is needed, otherwise None; ``remember`` stores a
+        fresh completion in the caches the call is eligible for. The caches are
+        consulted first, so warmed answers are still served without an API key,
+        once the daily budget is spent or while the circuit is open.
+        """
+        cache_key = None
+        if use_cache:
+            cache_key = self.cache_key(instructions, user_prompt)
+            if not force_refresh:
+                cached = get_response_cache().get(cache_key)
+                if cached is not None:
+                    return cached, None
+
+        if semantic_mode and not force_refresh:
+            match = get_semantic_cache().lookup(self.model, semantic_mode, user_prompt)
+            if match is not None:
+                return match[0], None
+
+        if not self.api_available:
+            return self._generate_fallback_response(user_prompt), None
+        
+        if not check_cost_limit():
+            return OfflineAnswer(f"💰 **Daily cost limit reached (${get_cost_ledger().budget_for():.2f}).** Using offline insights. Upgrade or wait for daily reset."), None
+
+        if get_circuit_breaker().is_open():
+            return self._generate_fallback_response(user_prompt), None
+
+        def remember(content: str):
+            if cache_key:
+                get_response_cache().put(cache_key, content)
+            if semantic_mode:
+                get_semantic_cache().add(self.model, semantic_mode, user_prompt, content)
+
+        return None, remember
+
+    def _complete(self, client: 'httpx.Client', instructions: str, user_prompt: str,
+                  max_tokens: int = None, timeout: float = None, priority: int = PRIORITY_BULK):
+        """Blocking completion returning (content, usage); raises on failure.
+
+        Touches no session state, so it is safe to run on worker threads. Transient
+        failures are retried under the shared retry budget and circuit breaker.
+        ``timeout`` is a deadline for the whole call - queueing, retries and every
+        HTTP attempt - not a per-read socket timeout.
+        Identical concurrent requests share one upstream call; the leader charges it
+        to the ledger (settling its reservation) and only the leader gets a usage
+        object back, so the cost is charged once. A caller joining another's call
+        waits for it only until its own deadline.
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        payload = self._build_payload(instructions, user_prompt, max_tokens=max_tokens)
+        result, leader = get_single_flight().do(
+            self._flight_key(payload),
+            lambda: self._send_completion(client, instructions, user_prompt, payload, deadline, priority),
+            deadline
+        )
+        return result if leader else (result[0], None)
+
+    def _send_completion(self, client: 'httpx.Client', instructions: str, user_prompt: str,
+                         payload: dict, deadline: float, priority: int):
+        reservation = self._token_reservation(instructions, user_prompt, payload)
+        reserved = self._reserve_spend(instructions, user_prompt, payload)
+        trace = new_call_trace(self.model, stream=False)
+
+        def send():
+            with self._admitted(reservation, priority, trace, deadline):
+                response = client.post(
+                    OPENAI_CHAT_URL,
+                    headers=self._request_headers(),
+                    json=payload,
+                    timeout=time_left(deadline),
+                    extensions={"trace": http_trace(trace)}
+                )
+                response.raise_for_status()
+            return response
+
+        try:
+            response = call_with_resilience(send, deadline)
+            with stage_span(trace, 'parse'):
+                result = response.json()
+        except Exception as e:
+            get_cost_ledger().release(reserved)
+            finish_call_trace(trace, error=e)
+            raise
+        finish_call_trace(trace, result.get('usage'))
+        get_request_scheduler().settle(reservation, self._tokens_used(result.get('usage'), reservation))
+        content = result["choices"][0]["message"]["content"]
+        self._settle_spend(instructions, user_prompt, reserved, result.get('usage'), content)
+        return content, result.get('usage')
+
+    def _stream_openai_api(self, instructions: str, user_prompt: str, on_complete=None,
+                           priority: int = PRIORITY_BULK):
+        """Yield completion text from the server-sent event stream.
+
+        Cost is finalized from the stream's usage chunk, or from a local token
+        estimate when the server does not send one (or the stream is cut short).
+        ``on_complete`` receives the full text only once the server has sent
+        ``data: [DONE]``; a stream that ends before it is reported as failed, and its
+        partial text is charged but neither shared with followers nor cached.
+        Opening the stream is retried like a blocking call; once the first byte has
+        arrived a failure is reported inline rather than replayed. A caller that
+        joins an identical in-flight request receives its full text in one chunk
+        and is not charged.
+        """
+        parts = []
+        usage = None
+        reservation = 0
+        reserved = 0.0
+        flights = get_single_flight()
+        flight = None
+        trace = None
+        failure = None
+        try:
+            client = get_http_client()
+            payload = self._build_payload(instructions, user_prompt, stream=True)
+            flight_key = self._flight_key(payload)
+            while True:
+                shared, leader = flights.begin(flight_key)
+                if leader:
+                    flight = shared
+                    break
+                try:
+                    content, _ = flights.follow(shared)
+                except FlightAbandoned:
+                    continue
+                yield content
+                return
+
+            trace = new_call_trace(self.model, stream=True)
+            request = client.build_request("POST", OPENAI_CHAT_URL, headers=self._request_headers(), json=payload,
+                                           extensions={"trace": http_trace(trace)})
+            reservation = self._token_reservation(instructions, user_prompt, payload)
+            reserved = self._reserve_spend(instructions, user_prompt, payload)
+
+            def open_stream():
+                with self._admitted(reservation, priority, trace):
+                    response = client.send(request, stream=True)
+                    if response.is_error:
+                        response.read()
+                        response.close()
+                    response.raise_for_status()
+                return response
+
+            response = call_with_resilience(open_stream)
+            first_token = None
+            done = False
+            try:
+                for line in response.iter_lines():
+                    finished, chunk_usage, text = self._sse_event(line)
+                    if finished:
+                        done = True
+                        break
+                    if chunk_usage:
+                        usage = chunk_usage
+                    if text:
+                        if first_token is None:
+                            first_token = time.perf_counter()
+                            record_stage(trace, 'first_token', first_token - trace['started'])
+                        parts.append(text)
+                        yield text
+            finally:
+                response.close()
+                if first_token is not None:
+                    record_stage(trace, 'generation', time.perf_counter() - first_token)
+            if not done:
+                raise httpx.RemoteProtocolError("the answer stream ended before it was complete")
+
+            if parts:
+                flights.land(flight_key, flight, ("".join(parts), usage))
+                if on_complete:
+                    on_complete("".join(parts))
+
+        except CircuitOpenError as e:
+            failure = e
+            yield self._generate_fallback_response(user_prompt)
+        except Exception as e:
+            failure = e
+            yield self._format_api_error(e)
+        finally:
+            if flight is not None:
+                flights.land(flight_key, flight, error=FlightAbandoned())
+            if trace is not None:
+                finish_call_trace(trace, usage, failure)
+            self._finish_stream(instructions, user_prompt, reservation, reserved, usage, parts)
+
+    @staticmethod
+    def _sse_event(line: str):
+        """Decode one server-sent event line into (finished, usage, text)"""
+        if not line.startswith("data:"):
+            return False, None, ""
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return True, None, ""
+
+        chunk = json.loads(data)
+        text = "".join((choice.get("delta") or {}).get("content") or ""
+                       for choice in chunk.get("choices") or [])
+        return False, chunk.get("usage"), text
+
+    def _finish_stream(self, instructions: str, user_prompt: str, reservation: int, reserved: float,
+                       usage: dict, parts: list):
+        """Settle the rate-limit and spend reservations and charge whatever a stream consumed"""
+        if reservation:
+            get_request_scheduler().settle(reservation, self._tokens_used(usage, reservation))
+        self._settle_spend(instructions, user_prompt, reserved, usage, "".join(parts))
+
+    # --- CONVERSATION MEMORY ---
+    def conversation_prompt(self, conversation_id: str, question: str) -> str:
+        """``question`` framed with its conversation so far, within this model's context budget"""
+        if not self.api_available or not conversation_id:
+            return question
+        store = get_conversation_store()
+        window = conversation_window(store, conversation_id, conversation_budget(self.model))
+        if window['overflow']:
+            window = self._fold_conversation(store, conversation_id, window)
+        return contextualize(question, window)
+
+    def record_turn(self, conversation_id: str, question: str, answer: str, ref: str = None):
+        """Append an answered question and fold whatever no longer fits the window into the summary.
+
+        Only the model's own answers belong here - callers check the ``answered``
+        flag from render_ai_response (or the job's) so error notices and offline
+        frameworks never become conversation context. Folding here, after the
+        answer is on screen, keeps the summarization call off the next question's
+        critical path.
+        """
+        if not self.api_available or not conversation_id or not answer:
+            return
+        store = get_conversation_store()
+        tokens = get_token_counter().count(turn_text(question, answer), self.model)
+        if not store.append(conversation_id, question, answer, tokens, ref):
+            return
+        window = conversation_window(store, conversation_id, conversation_budget(self.model))
+        if window['overflow']:
+            self._fold_conversation(store, conversation_id, window)
+
+    def _fold_conversation(self, store: ConversationStore, conversation_id: str, window: dict) -> dict:
+        """Summarize only the overflowing turns into the existing summary and return the new window"""
+        summary = self._summarize_turns(window['summary'], window['overflow'])
+        store.save_summary(conversation_id, summary, get_token_counter().count(summary, self.model),
+                           window['overflow'][-1]['seq'])
+        return conversation_window(store, conversation_id, conversation_budget(self.model))
+
+    @instrumented
+    def _summarize_turns(self, summary: str, turns: list) -> str:
+        """One small completion merging ``turns`` into ``summary``; extractive when the API is unavailable"""
+        if check_cost_limit() and not get_circuit_breaker().is_open():
+            prompt = "\n\n".join([f"EXISTING SUMMARY:\n{summary or '(none yet)'}", "NEW EXCHANGES:"]
+                                  + [turn_text(turn['question'], turn['answer']) for turn in turns])
+            try:
+                content, _ = self._complete(get_http_client(), CONVERSATION_SUMMARY_INSTRUCTIONS, prompt,
+                                            max_tokens=CONVERSATION_SUMMARY_TOKENS)
+                if content.strip():
+                    return content.strip()
+            except Exception:
+                pass
+        return extractive_summary(summary, turns, CONVERSATION_SUMMARY_TOKENS, self.model)
+
+    def _generate_fallback_response(self, user_prompt: str) -> OfflineAnswer:
+        """Generate intelligent offline responses using business frameworks"""
+        intents = get_fallback_router().route(user_prompt)
+        get_metrics().inc('wewine_fallback_answers_total', frameworks="+".join(intents))
+        sections = [getattr(self, self.FALLBACK_FRAMEWORKS[intent])().strip() for intent in intents]
+        return OfflineAnswer("\n\n---\n\n".join(sections))
+
+    def _market_analysis_framework(self) -> str:
+        return """
+## 🎯 **Strategic Market Analysis**
+
+### **Executive Summary**
+WeWine operates in a $350B+ global wine market with growing digital disruption. Key opportunity: 
+Millennials represent 42% of wine consumption but are underserved by existing platforms.
+
+### **Competitive Landscape Analysis**
+
+**🏆 Market Leaders:**
+- **Vivino**: 70M users, $224M funding - *Database approach, overwhelming for beginners*
+- **Delectable**: 2M users, sommelier-focused - *Expert credibility but intimidating*
+- **Firstleaf**: AI-driven, subscription model - *Limited flexibility, US-only*
+
+**💡 WeWine's Strategic Positioning:**
+*"The Anti-Vivino: Curated Discovery Over Information Overload"*
+
+### **Key Strategic Moves**
+
+1. **Blue Ocean Strategy**: Target the "Anxious Explorer" segment
+   - Focus on confidence-building vs. expertise display
+   - Simplicity over comprehensiveness
+
+2. **Community-First Differentiation**:
+   - Build trust through peer recommendations
+   - Create "Wine Discovery Circles"
+
+3. **Experience Integration**:
+   - Online-to-offline event programming
+   - Local wine bar partnerships
+
+### **Success Metrics**
+- User confidence score (NPS for wine anxiety reduction)
+- Community engagement rate (>40% monthly active discussion)
+- Experience participation rate (>15% attend events)
+
+**Next Steps:** Focus Q1 on community features, Q2 on local partnerships.
+        """
+
+    def _growth_strategy_framework(self) -> str:
+        return """
+## 📈 **Growth Strategy Framework**
+
+### **Executive Summary**
+WeWine's path to 100K users requires a three-phase approach: Community-Led Growth → 
+Viral Loops → Scaled Acquisition. Current metrics show strong product-market fit signals.
+
+### **Phase 1: Community-Led Growth (0-25K users)**
+
+**🎯 Core Strategy**: Turn early users into brand evangelists
+
+**Key Initiatives:**
+1. **Wine Discovery Challenges**
+   - Monthly themed challenges (e.g., "Italian Adventure")
+   - User-generated content with rewards
+   - Community voting and curation
+
+2. **Local Wine Ambassadors Program**
+   - 10 power users per city become ambassadors
+   - Exclusive events and early access
+   - Referral rewards and recognition
+
+3. **Strategic Partnerships**
+   - Boutique wine shops for exclusive offerings
+   - Local restaurants for pairing events
+   - Wine education platforms for content
+
+### **Phase 2: Viral Mechanics (25K-75K users)**
+
+**🚀 Viral Loops:**
+- **Social Sharing**: Beautiful wine journey visualizations
+- **Gift Recommendations**: "Send a bottle" feature
+- **Group Discoveries**: Friends can explore together
+
+### **Phase 3: Scaled Acquisition (75K-100K users)**
+
+**📊 Paid Channels:**
+- Instagram/TikTok targeted at "wine curious" demographics
+- Google Ads for high-intent searches
+- Influencer partnerships with lifestyle creators
+
+### **Success Metrics & Timeline**
+- **Month 1-3**: 15K → 25K users (67% growth)
+- **Month 4-6**: 25K → 50K users (viral coefficient 1.2)
+- **Month 7-12**: 50K → 100K users (100% growth)
+
+**Investment Required**: $150K for 12-month execution
+        """
+
+    def _product_strategy_framework(self) -> str:
+        return """
+## 🛠️ **Product Strategy Framework**
+
+### **Executive Summary**
+WeWine's product roadmap should focus on three pillars: AI Personalization Engine, 
+Community Features, and Experience Integration. RICE framework guides prioritization.
+
+### **Q1 2024: Foundation & Community (Theme: "Building Trust")**
+
+| Feature | Description | Reach | Impact | Confidence | Effort | RICE Score |
+|---------|-------------|-------|--------|------------|--------|------------|
+| **Taste Journey AI** | Advanced preference learning | 9 | 9 | 85% | 2.0 | 34.5 |
+| **Wine Discovery Feed** | Community-driven recommendations | 8 | 8 | 90% | 1.5 | 38.4 |
+| **Local Availability** | Real-time inventory integration | 7 | 9 | 70% | 3.0 | 14.7 |
+| **Social Sharing** | Beautiful wine story cards | 6 | 7 | 95% | 1.0 | 39.9 |
+
+### **Q2 2024: Engagement & Retention (Theme: "Magical Moments")**
+
+**Priority Features:**
+1. **Wine Discovery Challenges** - Gamified learning experiences
+2. **AR Label Scanner** - Instant wine information and reviews
+3. **Personalized Events** - AI-recommended local tastings
+4. **Gift Recommendations** - Occasion-based suggestions
+
+### **Q3-Q4 2024: Scale & Monetization (Theme: "Sustainable Growth")**
+
+**Advanced Features:**
+- **Cellar Management** - Track personal wine collection
+- **Advanced Analytics** - Taste evolution insights
+- **Premium Subscriptions** - Expert access and exclusive content
+- **Marketplace Integration** - Seamless purchasing experience
+
+### **Success Metrics**
+- **User Engagement**: 40% weekly active users
+- **Feature Adoption**: >60% for core features within 30 days
+- **Retention**: 35% monthly cohort retention by month 6
+- **Revenue**: $2 ARPU monthly by Q4
+
+**Technical Requirements**: React Native app, Node.js backend, ML pipeline for recommendations
+        """
+
+    def _gtm_framework(self) -> str:
+        return """
+## 🚀 **Go-To-Market Strategy Framework**
+
+### **Executive Summary**
+WeWine's GTM strategy leverages Lisbon as a beachhead market, then expands to select European 
+cities using a community-first, experience-driven approach.
+
+### **Phase 1: Lisbon Domination (Months 1-6)**
+
+**🎯 Objective**: Become the #1 wine discovery app in Lisbon with 5,000 active users
+
+**Core Tactics:**
+1. **Hyper-Local Wine Tours**
+   - Partner with 10 premium wine bars in Príncipe Real/Chiado
+   - Weekly "WeWine Wednesday" events
+   - Exclusive tastings for app users
+
+2. **Sommelier Partnership Program**
+   - Recruit 15 local wine experts as content creators
+   - Monthly "Expert Picks" features
+   - Live Q&A sessions in-app
+
+3. **Tourist Integration**
+   - Partner with premium hotels (Tivoli, Memmo Alfama)
+   - "Lisbon Wine Guide" feature for visitors
+   - Airport/tourism board partnerships
+
+### **Phase 2: European Expansion (Months 7-18)**
+
+**🌍 Target Cities**: Barcelona, Milan, Copenhagen, Amsterdam
+
+**Expansion Playbook:**
+- Hire local "Wine Community Managers"
+- Replicate Lisbon partnership model
+- Cross-market user acquisition campaigns
+
+### **Phase 3: Global Platform (Months 19-36)**
+
+**🚀 Scale Strategy:**
+- API partnerships with wine retailers
+- White-label solutions for wine regions
+- Enterprise partnerships with hospitality
+
+### **Success Metrics & Investment**
+
+**Key KPIs:**
+- **Market Penetration**: 2% of target demographic per city
+- **Event Attendance**: 500+ monthly event participants
+- **Partnership Revenue**: 30% of total revenue by month 18
+
+**Investment Required:**
+- **Phase 1**: €75K (events, partnerships, local team)
+- **Phase 2**: €300K (expansion, marketing, tech)
+- **Phase 3**: €1M+ (scaling, enterprise partnerships)
+
+### **Risk Mitigation**
+- Local competitor response → Strong community moats
+- Economic downturn → Focus on free community features
+- Partnership dependency → Diversified revenue streams
+        """
+
+    def _general_strategic_framework(self) -> str:
+        return """
+## 🎯 **Strategic Business Framework**
+
+### **Executive Summary**
+WeWine.app sits at the intersection of three growing trends: AI personalization, community commerce, 
+and experience economy. Our strategic advantage lies in combining all three effectively.
+
+### **Strategic Pillars**
+
+#### **1. AI-Powered Personalization**
+- Move beyond basic taste profiles to contextual recommendations
+- Understand user's wine journey and goals
+- Predict preferences based on mood, occasion, season
+
+#### **2. Community-Driven Discovery**
+- Trust-based recommendations over algorithmic ones
+- Social proof and peer validation
+- User-generated content and stories
+
+#### **3. Experience Integration**
+- Bridge online discovery with offline experiences
+- Create memorable moments that build brand loyalty
+- Generate multiple revenue streams
+
+### **Business Model Innovation**
+
+**Current**: Marketplace + commission model
+**Evolution**: Platform + subscription + experiences + data
+
+**Revenue Streams:**
+1. **Transaction fees** (current): 10-15% commission
+2. **Premium subscriptions**: $9.99/month for advanced features
+3. **Experience bookings**: 20% commission on events
+4. **Data insights**: B2B analytics for wineries
+
+### **Competitive Moats**
+
+1. **Data Network Effects**: More users = better recommendations
+2. **Community Lock-in**: Social connections create switching costs
+3. **Experience Infrastructure**: Physical partnerships hard to replicate
+4. **Brand Trust**: Authentic, approachable wine discovery
+
+### **Strategic Priorities**
+
+**Near-term (0-6 months):**
+- Strengthen core AI recommendation engine
+- Build vibrant community features
+- Establish local partnership network
+
+**Medium-term (6-18 months):**
+- Scale to 3-5 key markets
+- Launch premium subscription tiers
+- Develop experience marketplace
+
+**Long-term (18+ months):**
+- International expansion
+- Enterprise partnerships
+- Adjacent market opportunities
+
+### **Success Framework**
+- **Product-Market Fit**: NPS >50, retention >30%
+- **Business Model**: Unit economics positive by month 18
+- **Market Position**: Top 3 in each target market
+        """
+
+    # Enhanced Analysis Methods
+    @instrumented
+    def generate_competitive_analysis(self, competitor: str = None, stream: bool = False,
+                                      force_refresh: bool = False):
+        return self._call_openai_api(self._competitive_analysis_prompt(competitor), stream=stream,
+                                     use_cache=True, force_refresh=force_refresh)
+
+    @instrumented
+    def generate_growth_strategy(self, focus_area: str = "user_acquisition", stream: bool = False,
+                                 force_refresh: bool = False):
+        return self._call_openai_api(self._growth_strategy_prompt(focus_area), stream=stream,
+                                     use_cache=True, force_refresh=force_refresh)
+
+    @instrumented
+    def generate_product_roadmap(self, timeframe: str = "90_days", stream: bool = False,
+                                 force_refresh: bool = False):
+        return self._call_openai_api(self._product_roadmap_prompt(timeframe), stream=stream,
+                                     use_cache=True, force_refresh=force_refresh)
+
+    @instrumented
+    def multi_agent_analysis(self, query: str, stream: bool = False, force_refresh: bool = False,
+                             parallel: bool = None):
+        if self._fan_out(parallel):
+            return self._parallel_multi_agent_analysis(query, stream, force_refresh)
+
+        system_role, prompt = self._multi_agent_request(query)
+        return self._call_openai_api(prompt, system_role, stream=stream, force_refresh=force_refresh,
+                                     semantic_mode="multi_agent", priority=PRIORITY_INTERACTIVE)
+
+    def canned_requests(self) -> list:
+        """Every cacheable canned-button request as (label, instructions, user_prompt)"""
+        catalog = [("competitive: landscape", None, self._competitive_analysis_prompt())]
+        catalog += [(f"competitive: {name}", None, self._competitive_analysis_prompt(name)) for name in COMPETITORS]
+        catalog += [(f"growth: {focus}", None, self._growth_strategy_prompt(focus)) for focus in GROWTH_FOCUSES]
+        catalog += [(f"roadmap: {period}", None, self._product_roadmap_prompt(period)) for period in ROADMAP_PERIODS]
+        catalog += [(f"positioning: {question}", None, question) for question in POSITIONING_QUESTIONS]
+        catalog += [(f"example: {question}", None, question) for question in QUERY_EXAMPLES]
+        return catalog
+
+    @staticmethod
+    def _competitive_analysis_prompt(competitor: str = None) -> str:
+        if competitor:
+            prompt = f"""
+            Conduct a comprehensive "David vs. Goliath" competitive analysis of WeWine.app against {competitor}.
+            
+            Focus on:
+            1. Strategic positioning opportunities where we can win
+            2. Specific product features that exploit their weaknesses
+            3. Marketing strategies that turn their size into a disadvantage
+            4. Partnership opportunities they're likely missing
+            5. Actionable competitive moves for the next 90 days
+            
+            Provide concrete examples and specific tactics we can implement immediately.
+            """
+        else:
+            prompt = """
+            Analyze the entire competitive landscape for WeWine.app. Identify:
+            1. Market gaps and white space opportunities
+            2. Competitive threats and how to counter them
+            3. Strategic partnerships we should pursue
+            4. Positioning strategy that differentiates us
+            5. Specific competitive advantages we can build
+            
+            Focus on actionable insights that drive growth and defend market position.
+            """
+        return prompt
+
+    @staticmethod
+    def _growth_strategy_prompt(focus_area: str) -> str:
+        return f"""
+        Develop a comprehensive growth strategy for WeWine.app focused on: {focus_area}
+        
+        Provide a detailed strategy including:
+        1. Specific growth tactics and experiments to run
+        2. 30-60-90 day milestone roadmap with measurable goals
+        3. Resource requirements and budget allocation
+        4. Success metrics and KPIs to track
+        5. Risk assessment and contingency plans
+        6. Competitive positioning during growth phase
+        7. Implementation priorities and quick wins
+        
+        Make recommendations specific, measurable, and implementable with current resources.
+        """
+
+    @staticmethod
+    def _product_roadmap_prompt(timeframe: str) -> str:
+        return f"""
+        Create a prioritized {timeframe} product roadmap for WeWine.app using the RICE scoring framework.
+        
+        Requirements:
+        1. Theme for the period with clear strategic focus
+        2. 5-7 prioritized features with RICE scores (Reach, Impact, Confidence, Effort)
+        3. Detailed feature descriptions with user value propositions
+        4. Technical requirements and dependencies
+        5. Success metrics for each feature
+        6. Resource allocation and team assignments
+        7. Risk mitigation for high-impact features
+        
+        Focus on features that maximize user engagement, retention, and business growth.
+        """
+
+    def _fan_out(self, parallel: bool = None) -> bool:
+        """Whether a multi-agent query should run as concurrent specialist calls"""
+        if parallel is None:
+            parallel = MULTI_AGENT_MODE == 'parallel'
+        return parallel and self.api_available and check_cost_limit() and not get_circuit_breaker().is_open()
+
+    @staticmethod
+    def _multi_agent_request(query: str):
+        """(system_role, prompt) for the single-call multi-agent analysis"""
+        system_role = """
+        You are a team of specialized AI business experts for WeWine.app. Respond as multiple agents collaborating:
+        
+        🎯 **CEO Agent**: Strategic oversight, synthesis, final recommendations
+        📊 **Market Research Agent**: Competitive analysis, market sizing, trends
+        📈 **Growth Agent**: User acquisition, retention, viral strategies  
+        🛠️ **Product Agent**: Feature prioritization, UX/UI, technical roadmap
+        💰 **CFO Agent**: Financial modeling, unit economics, fundraising
+        🎨 **Brand Agent**: Positioning, messaging, community building
+        
+        Each agent provides their specialized perspective, then CEO synthesizes into actionable strategy.
+        """
+        
+        prompt = f"""
+        Multi-agent strategic analysis for WeWine.app: {query}
+        
+        Each agent should provide their expertise perspective on this question, followed by a CEO synthesis 
+        with specific action items, success metrics, and implementation timeline.
+        """
+        return system_role, prompt
+
+    @staticmethod
+    def _agent_request(name: str, focus: str, query: str):
+        """(system, prompt) for one specialist agent's call"""
+        agent_system = f"""
+        You are currently acting as the {name} of the WeWine.app advisory team.
+        Your remit: {focus}. Answer only from that perspective.
+        """
+        agent_prompt = f"""
+        Strategic question for the team: {query}
+        
+        Give your specialist perspective with concrete recommendations, the metrics you would track,
+        and the main risk you see. Be concise - the CEO Agent will synthesize all perspectives.
+        """
+        return agent_system, agent_prompt
+
+    def _brief_team(self, query: str, outcomes: list):
+        """Lay out the specialists' outcomes for the CEO synthesis.
+
+        ``outcomes`` pairs each agent name with its (content, usage) result or the
+        exception it failed with. Returns (header, ceo_system, synthesis_prompt,
+        remember), or None when no agent produced anything.
+        """
+        sections = []
+        contributions = []
+        for name, outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                timed_out = isinstance(outcome, (TimeoutError, asyncio.TimeoutError, httpx.TimeoutException))
+                reason = "timed out" if timed_out else f"failed: {outcome}"
+                sections.append(f"### {name}\n\n*⚠️ Agent unavailable ({reason}); the synthesis proceeds without it.*")
+                continue
+            content, _ = outcome
+            sections.append(f"### {name}\n\n{content}")
+            contributions.append((name, content))
+
+        if not contributions:
+            return None
+
+        briefing = "\n\n".join(f"{name}:\n{content}" for name, content in contributions)
+        ceo_system = """
+        You are currently acting as the 🎯 CEO Agent: strategic oversight, synthesis, final recommendations.
+        """
+        synthesis_prompt = f"""
+        Strategic question: {query}
+        
+        Your specialist agents reported:
+        
+        {briefing}
+        
+        Synthesize these perspectives into one actionable strategy. Resolve any conflicts between agents,
+        then give specific action items, success metrics, and an implementation timeline.
+        """
+        header = "\n\n".join(sections) + "\n\n## 🎯 CEO Synthesis\n\n"
+
+        def remember(synthesis: str):
+            if len(contributions) == len(outcomes):
+                get_semantic_cache().add(self.model, "multi_agent", query, header + synthesis)
+
+        return header, ceo_system, synthesis_prompt, remember
+
+    def _parallel_multi_agent_analysis(self, query: str, stream: bool, force_refresh: bool):
+        """Run the specialist agents concurrently, then a CEO synthesis over their outputs.
+
+        Each specialist gets its own max_tokens budget and an AGENT_TIMEOUT deadline
+        that bounds its queueing, retries and HTTP attempts, so a straggler stops on
+        its own shortly after the wait below gives up on it, and its spend is settled
+        in the ledger either way. Agents that fail or time out are reported inline
+        and the synthesis proceeds without them.
+        """
+        if not force_refresh:
+            match = get_semantic_cache().lookup(self.model, "multi_agent", query)
+            if match is not None:
+                return match[0]
+
+        client = get_http_client()
+        futures = {}
+        for name, focus in self.SPECIALIST_AGENTS:
+            agent_system, agent_prompt = self._agent_request(name, focus, query)
+            future = get_agent_executor().submit(
+                contextvars.copy_context().run,
+                self._complete, client, agent_system, agent_prompt, AGENT_MAX_TOKENS, AGENT_TIMEOUT,
+                PRIORITY_INTERACTIVE
+            )
+            futures[future] = name
+
+        done, pending = wait(futures, timeout=AGENT_TIMEOUT)
+        for future in pending:
+            future.cancel()  # only stops agents still waiting for a worker; running ones hit their deadline
+
+        outcomes = [
+            (name, TimeoutError() if future in pending else future.exception() or future.result())
+            for future, name in futures.items()
+        ]
+        team = self._brief_team(query, outcomes)
+        if team is None:
+            return self.multi_agent_analysis(query, stream=stream, force_refresh=force_refresh, parallel=False)
+        header, ceo_system, synthesis_prompt, remember = team
+
+        if stream:
+            def team_stream():
+                yield header
+                yield from self._stream_openai_api(ceo_system, synthesis_prompt, remember, PRIORITY_INTERACTIVE)
+            return team_stream()
+
+        try:
+            synthesis, _ = self._complete(client, ceo_system, synthesis_prompt, priority=PRIORITY_INTERACTIVE)
+        except Exception as e:
+            return OfflineAnswer(header + self._format_api_error(e))
+        remember(synthesis)
+        return header + synthesis
+
+class AsyncWeWineStrategicAICEO(WeWineStrategicAICEO):
+    """WeWineStrategicAICEO whose upstream I/O runs as coroutines on the shared engine loop.
+
+    The ``a``-prefixed coroutines must run on ``get_engine_loop()`` (``submit`` to
+    schedule without waiting). The inherited synchronous methods keep their
+    signatures and block on that loop, so the tabs work with either engine.
+    Blocking local work - SQLite cache and ledger access, token counting and
+    query embeddings - goes through ``asyncio.to_thread``, which also carries
+    the session's context, so no call stalls the others sharing the loop.
+    """
+
+    # Synchronous wrappers
+
+    @instrumented
+    def _call_openai_api(self, *args, **kwargs):
+        return get_engine_loop().resolve(self._acall_openai_api(*args, **kwargs))
+
+    def _complete(self, client, instructions: str, user_prompt: str,
+                  max_tokens: int = None, timeout: float = None, priority: int = PRIORITY_BULK):
+        return get_engine_loop().run(self._acomplete(instructions, user_prompt, max_tokens, timeout, priority))
+
+    def _parallel_multi_agent_analysis(self, query: str, stream: bool, force_refresh: bool):
+        return get_engine_loop().resolve(self._aparallel_multi_agent_analysis(query, stream, force_refresh))
+
+    # Coroutine API
+
+    async def agenerate_competitive_analysis(self, competitor: str = None, stream: bool = False,
+                                             force_refresh: bool = False):
+        return await self._acall_openai_api(self._competitive_analysis_prompt(competitor), stream=stream,
+                                            use_cache=True, force_refresh=force_refresh)
+
+    async def agenerate_growth_strategy(self, focus_area: str = "user_acquisition", stream: bool = False,
+                                        force_refresh: bool = False):
+        return await self._acall_openai_api(self._growth_strategy_prompt(focus_area), stream=stream,
+                                            use_cache=True, force_refresh=force_refresh)
+
+    async def agenerate_product_roadmap(self, timeframe: str = "90_days", stream: bool = False,
+                                        force_refresh: bool = False):
+        return await self._acall_openai_api(self._product_roadmap_prompt(timeframe), stream=stream,
+                                            use_cache=True, force_refresh=force_refresh)
+
+    async def amulti_agent_analysis(self, query: str, stream: bool = False, force_refresh: bool = False,
+                                    parallel: bool = None):
+        if self._fan_out(parallel):
+            return await self._aparallel_multi_agent_analysis(query, stream, force_refresh)
+
+        system_role, prompt = self._multi_agent_request(query)
+        return await self._acall_openai_api(prompt, system_role, stream=stream, force_refresh=force_refresh,
+                                            semantic_mode="multi_agent", priority=PRIORITY_INTERACTIVE)
+
+    async def _acall_openai_api(self, user_prompt: str, system_override: str = None, stream: bool = False,
+                                use_cache: bool = False, force_refresh: bool = False, semantic_mode: str = None,
+                                priority: int = PRIORITY_BULK):
+        """Coroutine form of ``_call_openai_api``; streams come back as async iterators"""
+        instructions = system_override
+        answer, remember = await asyncio.to_thread(self._prepare_call, user_prompt, instructions, use_cache,
+                                                   force_refresh, semantic_mode)
+        if answer is not None:
+            return answer
+
+        if stream:
+            return self._astream_openai_api(instructions, user_prompt, remember, priority)
+
+        try:
+            content, _ = await self._acomplete(instructions, user_prompt, priority=priority)
+        except CircuitOpenError:
+            return self._generate_fallback_response(user_prompt)
+        except Exception as e:
+            return self._format_api_error(e)
+        await asyncio.to_thread(remember, content)
+        return content
+
+    async def _acomplete(self, instructions: str, user_prompt: str, max_tokens: int = None,
+                         timeout: float = None, priority: int = PRIORITY_BULK):
+        deadline = time.monotonic() + timeout if timeout else None
+        payload = await asyncio.to_thread(self._build_payload, instructions, user_prompt, max_tokens=max_tokens)
+        result, leader = await get_single_flight().ado(
+            self._flight_key(payload),
+            lambda: self._asend_completion(instructions, user_prompt, payload, deadline, priority),
+            deadline
+        )
+        return result if leader else (result[0], None)
+
+    async def _asend_completion(self, instructions: str, user_prompt: str, payload: dict,
+                                deadline: float, priority: int):
+        client = get_async_http_client()
+        reservation = await asyncio.to_thread(self._token_reservation, instructions, user_prompt, payload)
+        reserved = await asyncio.to_thread(self._reserve_spend, instructions, user_prompt, payload)
+        trace = new_call_trace(self.model, stream=False)
+
+        async def send():
+            async with self._aadmitted(reservation, priority, trace, deadline):
+                response = await client.post(
+                    OPENAI_CHAT_URL,
+                    headers=self._request_headers(),
+                    json=payload,
+                    timeout=time_left(deadline),
+                    extensions={"trace": http_trace(trace, asynchronous=True)}
+                )
+                response.raise_for_status()
+            return response
+
+        try:
+            response = await acall_with_resilience(send, deadline)
+            with stage_span(trace, 'parse'):
+                result = response.json()
+        except BaseException as e:
+            get_cost_ledger().release(reserved)
+            finish_call_trace(trace, error=e)
+            raise
+        finish_call_trace(trace, result.get('usage'))
+        get_request_scheduler().settle(reservation, self._tokens_used(result.get('usage'), reservation))
+        content = result["choices"][0]["message"]["content"]
+        await asyncio.to_thread(self._settle_spend, instructions, user_prompt, reserved, result.get('usage'), content)
+        return content, result.get('usage')
+
+    async def _astream_openai_api(self, instructions: str, user_prompt: str, on_complete=None,
+                                  priority: int = PRIORITY_BULK):
+        """Async generator twin of ``_stream_openai_api`` with the same cost and coalescing rules"""
+        parts = []
+        usage = None
+        reservation = 0
+        reserved = 0.0
+        flights = get_single_flight()
+        flight = None
+        trace = None
+        failure = None
+        try:
+            client = get_async_http_client()
+            payload = await asyncio.to_thread(self._build_payload, instructions, user_prompt, stream=True)
+            flight_key = self._flight_key(payload)
+            while True:
+                shared, leader = flights.begin(flight_key)
+                if leader:
+                    flight = shared
+                    break
+                try:
+                    content, _ = await flights.afollow(shared)
+                except FlightAbandoned:
+                    continue
+                yield content
+                return
+
+            trace = new_call_trace(self.model, stream=True)
+            request = client.build_request("POST", OPENAI_CHAT_URL, headers=self._request_headers(), json=payload,
+                                           extensions={"trace": http_trace(trace, asynchronous=True)})
+            reservation = await asyncio.to_thread(self._token_reservation, instructions, user_prompt, payload)
+            reserved = await asyncio.to_thread(self._reserve_spend, instructions, user_prompt, payload)
+
+            async def open_stream():
+                async with self._aadmitted(reservation, priority, trace):
+                    response = await client.send(request, stream=True)
+                    if response.is_error:
+                        await response.aread()
+                        await response.aclose()
+                    response.raise_for_status()
+                return response
+
+            response = await acall_with_resilience(open_stream)
+            first_token = None
+            done = False
+            try:
+                async for line in response.aiter_lines():
+                    finished, chunk_usage, text = self._sse_event(line)
+                    if finished:
+                        done = True
+                        break
+                    if chunk_usage:
+                        usage = chunk_usage
+                    if text:
+                        if first_token is None:
+                            first_token = time.perf_counter()
+                            record_stage(trace, 'first_token', first_token - trace['started'])
+                        parts.append(text)
+                        yield text
+            finally:
+                await response.aclose()
+                if first_token is not None:
+                    record_stage(trace, 'generation', time.perf_counter() - first_token)
+            if not done:
+                raise httpx.RemoteProtocolError("the answer stream ended before it was complete")
+
+            if parts:
+                flights.land(flight_key, flight, ("".join(parts), usage))
+                if on_complete:
+                    await asyncio.to_thread(on_complete, "".join(parts))
+
+        except CircuitOpenError as e:
+            failure = e
+            yield self._generate_fallback_response(user_prompt)
+        except Exception as e:
+            failure = e
+            yield self._format_api_error(e)
+        finally:
+            if flight is not None:
+                flights.land(flight_key, flight, error=FlightAbandoned())
+            if trace is not None:
+                finish_call_trace(trace, usage, failure)
+            # the worker thread settles even if this await is itself cancelled
+            await asyncio.to_thread(self._finish_stream, instructions, user_prompt, reservation, reserved, usage,
+                                    parts)
+
+    async def _aparallel_multi_agent_analysis(self, query: str, stream: bool, force_refresh: bool):
+        """Specialist fan-out as concurrent coroutines instead of pool threads"""
+        if not force_refresh:
+            match = await asyncio.to_thread(get_semantic_cache().lookup, self.model, "multi_agent", query)
+            if match is not None:
+                return match[0]
+
+        async def consult(name: str, focus: str):
+            agent_system, agent_prompt = self._agent_request(name, focus, query)
+            return await asyncio.wait_for(
+                self._acomplete(agent_system, agent_prompt, AGENT_MAX_TOKENS, AGENT_TIMEOUT, PRIORITY_INTERACTIVE),
+                AGENT_TIMEOUT
+            )
+
+        results = await asyncio.gather(*(consult(name, focus) for name, focus in self.SPECIALIST_AGENTS),
+                                       return_exceptions=True)
+        team = self._brief_team(query, [(name, result) for (name, _), result in zip(self.SPECIALIST_AGENTS, results)])
+        if team is None:
+            return await self.amulti_agent_analysis(query, stream=stream, force_refresh=force_refresh, parallel=False)
+        header, ceo_system, synthesis_prompt, remember = team
+
+        if stream:
+            async def team_stream():
+                yield header
+                async for text in self._astream_openai_api(ceo_system, synthesis_prompt, remember,
+                                                           PRIORITY_INTERACTIVE):
+                    yield text
+            return team_stream()
+
+        try:
+            synthesis, _ = await self._acomplete(ceo_system, synthesis_prompt, priority=PRIORITY_INTERACTIVE)
+        except Exception as e:
+            return OfflineAnswer(header + self._format_api_error(e))
+        await asyncio.to_thread(remember, synthesis)
+        return header + synthesis
+
+def create_engine(api_key: str = None, model: str = "gpt-4") -> WeWineStrategicAICEO:
+    """Engine for the configured WEWINE_ENGINE mode"""
+    engine = AsyncWeWineStrategicAICEO if ENGINE_MODE == 'async' else WeWineStrategicAICEO
+    return engine(api_key=api_key, model=model)
+
+ENGINE_CACHE_ENTRIES = int(os.getenv('WEWINE_ENGINE_CACHE_ENTRIES', '32'))
+ENGINE_CACHE_TTL = float(os.getenv('WEWINE_ENGINE_CACHE_TTL', '3600'))
+
+def get_ai_ceo(api_key: str, model: str) -> WeWineStrategicAICEO:
+    """Engine shared by every session with this key and model (engines hold no per-session state)"""
+    key_digest = hashlib.sha256(api_key.encode('utf-8')).hexdigest() if api_key else None
+    return shared_engine(key_digest, model, api_key)
+
+@st.cache_resource(show_spinner=False, max_entries=ENGINE_CACHE_ENTRIES, ttl=ENGINE_CACHE_TTL)
+def shared_engine(key_digest: str, model: str, _api_key: str) -> WeWineStrategicAICEO:
+    """Cached per digest of the key: the underscore keeps the raw key out of the cache key, and
+    the entry cap and TTL stop keys pasted into the sidebar from piling up for the process's life"""
+    return create_engine(_api_key, model)
@@ -0,0 +1,203 @@
+"""Background jobs: long analyses that run outside the script run and survive reconnects"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from .ledger import DATA_DIR, current_user
+from .engine import create_engine, is_model_answer
+
+# --- BACKGROUND JOBS ---
+JOB_DB = os.getenv('WEWINE_JOB_DB', os.path.join(DATA_DIR, 'jobs.sqlite3'))
+JOB_WORKERS = int(os.getenv('WEWINE_JOB_WORKERS', '4'))
+JOB_RETENTION_DAYS = float(os.getenv('WEWINE_JOB_RETENTION_DAYS', '7'))
+JOB_POLL_INTERVAL = float(os.getenv('WEWINE_JOB_POLL_INTERVAL', '1.5'))
+JOB_METHODS = {  # job kind -> engine method; results must be plain text, so never streamed
+    'competitive_analysis': 'generate_competitive_analysis',
+    'growth_strategy': 'generate_growth_strategy',
+    'product_roadmap': 'generate_product_roadmap',
+    'multi_agent': 'multi_agent_analysis',
+}
+JOB_PENDING = ('queued', 'running')
+
+class JobStore:
+    """Durable record of background analyses, shared by every session and process (SQLite WAL).
+
+    API keys are never written here, only where the job's key came from: the
+    server's own ('server') or one a user entered in their session ('user').
+    A job otherwise carries the parameters it needs to re-run, the worker
+    holding it, and its result once finished.
+    """
+
+    def __init__(self, db_path: str = JOB_DB):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=10)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                model TEXT NOT NULL,
+                key_source TEXT NOT NULL,
+                params TEXT NOT NULL,
+                status TEXT NOT NULL,
+                worker TEXT,
+                result TEXT,
+                answered INTEGER,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+        self._db.commit()
+
+    def _write(self, sql: str, args: tuple):
+        with self._lock:
+            self._db.execute(sql, args)
+            self._db.commit()
+
+    def create(self, kind: str, model: str, params: dict, user_id: str, worker: str,
+               key_source: str = 'server') -> str:
+        job_id = uuid.uuid4().hex
+        self._write("INSERT INTO jobs (id, user_id, kind, model, key_source, params, status, worker, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, 'queued', ?, ?)",
+                    (job_id, user_id, kind, model, key_source, json.dumps(params), worker, time.time()))
+        return job_id
+
+    def claim(self, job_id: str, owner: str, worker: str) -> bool:
+        """Atomically take a pending job still held by ``owner``; False if someone else got it"""
+        with self._lock:
+            claimed = self._db.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, started_at = ? "
+                "WHERE id = ? AND status IN (?, ?) AND worker = ?",
+                (worker, time.time(), job_id, *JOB_PENDING, owner)
+            ).rowcount
+            self._db.commit()
+        return claimed == 1
+
+    def finish(self, job_id: str, result: str):
+        """Store a result; ``answered`` records whether the model wrote it or it is an offline stand-in"""
+        self._write("UPDATE jobs SET status = 'done', result = ?, answered = ?, finished_at = ? WHERE id = ?",
+                    (result, int(is_model_answer(result)), time.time(), job_id))
+
+    def fail(self, job_id: str, error: str):
+        self._write("UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                    (error, time.time(), job_id))
+
+    def expire(self, job_id: str, owner: str, reason: str) -> bool:
+        """Retire a pending job still held by ``owner`` that can no longer run; False if someone else took it"""
+        with self._lock:
+            expired = self._db.execute(
+                "UPDATE jobs SET status = 'expired', error = ?, finished_at = ? "
+                "WHERE id = ? AND status IN (?, ?) AND worker = ?",
+                (reason, time.time(), job_id, *JOB_PENDING, owner)
+            ).rowcount
+            self._db.commit()
+        return expired == 1
+
+    def get(self, job_id: str) -> dict:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        return job
+
+    def pending(self) -> list:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, worker, key_source FROM jobs WHERE status IN (?, ?) ORDER BY created_at", JOB_PENDING
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def purge(self, max_age_days: float = JOB_RETENTION_DAYS) -> int:
+        """Drop finished jobs older than the retention window"""
+        cutoff = time.time() - max_age_days * 86400
+        with self._lock:
+            deleted = self._db.execute(
+                "DELETE FROM jobs WHERE status NOT IN (?, ?) AND finished_at < ?", (*JOB_PENDING, cutoff)
+            ).rowcount
+            self._db.commit()
+        return deleted
+
+class JobRunner:
+    """Worker pool that executes stored jobs independently of any script run.
+
+    A Streamlit rerun, tab switch or page reload only drops the UI's view of a
+    job - the completion keeps running here and its result lands in the store.
+    Jobs orphaned by a dead process on this host are resumed on startup when
+    they ran on the server's own API key. Session keys are never persisted, and
+    a user's job must not be billed to the server's key, so those expire instead.
+    """
+
+    def __init__(self, store: JobStore, workers: int = JOB_WORKERS):
+        self.store = store
+        self.host = socket.gethostname()
+        self.worker_id = f"{self.host}:{os.getpid()}"
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wewine-job")
+        self.store.purge()
+        for job in self.store.pending():
+            if self._owner_alive(job['worker']):
+                continue
+            if job['key_source'] == 'server':
+                self._executor.submit(self._run, job['id'], None, job['worker'])
+            else:
+                self.store.expire(job['id'], job['worker'],
+                                  "the server restarted before it finished, and the API key entered for it "
+                                  "is not kept - please run it again")
+
+    def _owner_alive(self, worker: str) -> bool:
+        """Whether the process that holds a pending job may still be working on it"""
+        host, _, pid = (worker or '').rpartition(':')
+        if worker == self.worker_id:
+            return False  # a previous process that had our pid
+        if host != self.host or os.name == 'nt':
+            return True  # not ours to judge
+        try:
+            os.kill(int(pid), 0)
+        except (ProcessLookupError, ValueError):
+            return False
+        except PermissionError:
+            pass  # alive, owned by another user
+        return True
+
+    def submit(self, kind: str, params: dict, api_key: str, model: str) -> str:
+        if kind not in JOB_METHODS:
+            raise ValueError(f"unknown job kind: {kind}")
+        key_source = 'user' if api_key and api_key != os.getenv('OPENAI_API_KEY') else 'server'
+        job_id = self.store.create(kind, model, params, current_user.get(), self.worker_id, key_source)
+        self._executor.submit(self._run, job_id, api_key, self.worker_id)
+        return job_id
+
+    def _run(self, job_id: str, api_key: str, owner: str):
+        if not self.store.claim(job_id, owner, self.worker_id):
+            return
+        job = self.store.get(job_id)
+        current_user.set(job['user_id'])
+        try:
+            engine = create_engine(api_key, job['model'])
+            result = getattr(engine, JOB_METHODS[job['kind']])(**job['params'], stream=False)
+        except Exception as e:
+            self.store.fail(job_id, f"{e.__class__.__name__}: {e}")
+        else:
+            self.store.finish(job_id, result)
+
+@st.cache_resource(show_spinner=False)
+def get_job_runner() -> JobRunner:
+    return JobRunner(JobStore())
@@ -0,0 +1,239 @@
+"""The company knowledge base and the BM25 retrieval that picks sections for a prompt"""
+
+import functools
+import math
+import os
+import re
+import textwrap
+from collections import Counter
+
+import streamlit as st
+
+from .tokens import get_token_counter
+from .catalog import COMPETITORS
+
+# --- KNOWLEDGE BASE ---
+# Company, market and framework facts. The identity sections of the profile ride
+# in every prompt prefix; everything else is chunked into an in-process BM25
+# index and each request gets only the chunks relevant to it, under a token
+# budget, as a system message after the cacheable prefix and instructions.
+KNOWLEDGE_TOKENS = int(os.getenv('WEWINE_KNOWLEDGE_TOKENS', '600'))  # 0 sends the whole profile in every prefix instead
+KNOWLEDGE_TOP_K = int(os.getenv('WEWINE_KNOWLEDGE_TOP_K', '4'))
+KNOWLEDGE_MIN_SCORE = 0.25  # share of the best chunk's score a chunk needs to be included
+KNOWLEDGE_PINNED = ('COMPANY PROFILE', 'MISSION', 'CORE VALUE PROPOSITION')  # profile sections kept in the prefix
+
+COMPANY_PROFILE = """
+COMPANY PROFILE: WeWine.app
+
+MISSION: To become the essential companion for the modern wine journey, blending AI technology, 
+community, and authentic experiences. We are not just an app; we are a cultural movement that 
+democratizes wine knowledge and creates joyful discovery experiences.
+
+CORE VALUE PROPOSITION: WeWine replaces wine anxiety with confident exploration. We empower users 
+to discover wines they love through AI-powered personalization, connect with a vibrant community, 
+and access unique wine experiences both online and offline.
+
+TARGET AUDIENCE:
+- Primary: "Curious Enthusiasts" (25-45) - Digitally native, value authenticity, eager to learn 
+  but intimidated by traditional wine snobbery. They want guidance without judgment.
+- Secondary: Boutique Wineries & Local Wine Merchants - Need direct channels to reach engaged 
+  consumers and tell their authentic stories.
+
+DIFFERENTIATORS (OUR MOAT):
+1. **Hyper-Personalized Journey AI:** Goes beyond taste profiles to understand context, mood, 
+   occasions, and learning goals. Evolves with user's palate development.
+2. **Community-Powered Discovery:** Stories and experiences drive recommendations. Friend and 
+   community trust beats algorithms alone.
+3. **Experience-First Model:** Seamless online-to-offline integration with tastings, vineyard 
+   tours, educational sessions, and local events.
+4. **Lisbon-Born, Global-Minded:** Authentic European wine culture foundation with global scalability.
+
+CURRENT METRICS:
+- Monthly Users: 15,000 (growing 12% monthly)
+- Conversion Rate: 3.2% (target: 5%)
+- Customer LTV: $180
+- Customer CAC: $25.30
+- Monthly Revenue: $42,500
+- App Rating: 4.4/5
+- Markets: 5 countries
+"""
+
+MARKET_LANDSCAPE = [
+    ("Total Competitors", "20+"),
+    ("Market Leaders", "5"),
+    ("Total Funding", "$350M+"),
+    ("Combined Users", "85M+")
+]
+
+BUSINESS_KPIS = [
+    ("Monthly Users", "15,000", "+12%"),
+    ("Monthly Revenue", "$42,500", "+8%"),
+    ("Conversion Rate", "3.2%", "+0.3%"),
+    ("LTV:CAC", "7.1:1", "+0.5")
+]
+
+GROWTH_TREND = {
+    'months': ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun'],
+    'revenue': [35000, 37000, 39000, 41000, 38000, 42500],
+    'users': [8000, 9200, 10500, 11800, 13200, 15000]
+}
+
+BUSINESS_STRENGTHS = [
+    "Strong user growth (+12% monthly)",
+    "Healthy LTV:CAC ratio (7.1:1)",
+    "Good app rating (4.4/5)",
+    "Growing revenue (+8% monthly)"
+]
+
+BUSINESS_IMPROVEMENTS = [
+    "Conversion rate below target (3.2% vs 5%)",
+    "Need to reduce customer acquisition cost",
+    "Increase average order value",
+    "Improve retention rates"
+]
+
+STRATEGY_FRAMEWORKS = {
+    "RICE scoring": "Prioritize features by Reach (users affected per period) x Impact (0.25-3) x "
+                    "Confidence (%) / Effort (person-months); rank the backlog by the score.",
+    "AARRR funnel": "Acquisition, Activation, Retention, Referral, Revenue - find the stage with the "
+                    "worst conversion and focus growth experiments there.",
+    "OKRs": "One qualitative Objective per quarter with 2-4 measurable Key Results; "
+            "70% attainment counts as success for stretch goals.",
+    "Jobs-to-be-Done": "Frame features around the job a user hires the product for (e.g. 'pick a wine "
+                       "for tonight's dinner without feeling ignorant'), not around demographics.",
+    "Go-to-market": "Beachhead market first, then adjacent segments: define ICP, channel, pricing, "
+                    "launch sequence and the leading metrics that prove traction."
+}
+
+KNOWLEDGE_TERM = re.compile(r"[a-z0-9]+(?:[.:][0-9]+)*")
+KNOWLEDGE_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how in into is it its me my of on or our "
+    "should so that the their them then there these they this to us vs we what when where which who "
+    "why will with you your wewine app".split()  # every chunk is about WeWine.app
+)
+
+def fold_plural(term: str) -> str:
+    if len(term) <= 3 or term.endswith(('ss', 'us', 'is')):
+        return term
+    if term.endswith('ies'):
+        return term[:-3] + 'y'
+    if term.endswith(('sses', 'xes', 'ches', 'shes')):
+        return term[:-2]
+    return term[:-1] if term.endswith('s') else term
+
+def knowledge_terms(text: str) -> list:
+    """Lower-cased index terms: stopwords, single letters and bare numbers dropped, plurals folded"""
+    return [fold_plural(term) for term in KNOWLEDGE_TERM.findall(text.lower())
+            if len(term) > 1 and not term.isdigit() and term not in KNOWLEDGE_STOPWORDS]
+
+def profile_sections(profile: str) -> list:
+    """(heading, text) per top-level "HEADING: ..." section of the company profile"""
+    sections = []
+    for line in textwrap.dedent(profile).strip().splitlines():
+        match = re.match(r'([A-Z][A-Z ()]+):', line)
+        if match:
+            sections.append([match.group(1), line])
+        elif sections:
+            sections[-1][1] += "\n" + line
+    return [(heading, text.strip()) for heading, text in sections]
+
+def company_identity() -> str:
+    """Profile sections that every prompt carries, whatever the topic"""
+    return "\n\n".join(text for heading, text in profile_sections(COMPANY_PROFILE) if heading in KNOWLEDGE_PINNED)
+
+def knowledge_corpus() -> list:
+    """Every retrievable chunk as (source, title, text)"""
+    chunks = []
+    for heading, text in profile_sections(COMPANY_PROFILE):
+        if heading in KNOWLEDGE_PINNED:
+            continue
+        items = re.split(r'\n(?=- |\d+\. )', text.split(":", 1)[1].strip())
+        if len(items) > 1 and heading != 'CURRENT METRICS':
+            chunks += [("profile", heading.title(), f"{heading}: {' '.join(item.split())}") for item in items if item.strip()]
+        else:
+            chunks.append(("profile", heading.title(), " ".join(text.split())))
+
+    landscape = ", ".join(f"{label}: {value}" for label, value in MARKET_LANDSCAPE)
+    chunks.append(("market", "Market landscape", f"Wine app market landscape - {landscape}. "
+                                                 f"Tracked competitors: {', '.join(COMPETITORS)}."))
+    for name, data in COMPETITORS.items():
+        chunks.append(("competitor", name, f"Competitor {name}: {data['users']} users, {data['funding']} funding. "
+                                           f"Strength: {data['strength']}. Weakness: {data['weakness']}."))
+
+    kpis = "; ".join(f"{label} {value} ({delta} month over month)" for label, value, delta in BUSINESS_KPIS)
+    chunks.append(("metrics", "Key metrics", f"WeWine business KPIs: {kpis}."))
+    trend = ", ".join(f"{month}: ${revenue:,} revenue / {users:,} users" for month, revenue, users
+                      in zip(GROWTH_TREND['months'], GROWTH_TREND['revenue'], GROWTH_TREND['users']))
+    chunks.append(("metrics", "Growth trend", f"Monthly revenue and user growth trend: {trend}."))
+    chunks.append(("metrics", "Business health", "Business strengths: " + "; ".join(BUSINESS_STRENGTHS)
+                   + ". Areas for improvement: " + "; ".join(BUSINESS_IMPROVEMENTS) + "."))
+
+    chunks += [("framework", name, f"Framework - {name}: {text}") for name, text in STRATEGY_FRAMEWORKS.items()]
+    return chunks
+
+class KnowledgeStore:
+    """BM25 index over the knowledge chunks, built once per process.
+
+    ``context`` picks the best-scoring chunks for a request under a token
+    budget; results are memoised, since the same prompt is sized, sent and
+    cache-keyed from one set of chunks.
+    """
+
+    def __init__(self, chunks: list, k1: float = 1.5, b: float = 0.75):
+        self.chunks = [{'source': source, 'title': title, 'text': text} for source, title, text in chunks]
+        self._terms = [Counter(knowledge_terms(f"{chunk['title']} {chunk['text']}")) for chunk in self.chunks]
+        self._lengths = [sum(terms.values()) for terms in self._terms]
+        self._average = sum(self._lengths) / len(self._lengths) if self._lengths else 1.0
+        frequency = Counter(term for terms in self._terms for term in terms)
+        self._idf = {term: math.log(1 + (len(self.chunks) - df + 0.5) / (df + 0.5)) for term, df in frequency.items()}
+        self.k1, self.b = k1, b
+        self._context = functools.lru_cache(maxsize=512)(self._select)
+
+    def search(self, query: str, k: int = None) -> list:
+        """(score, chunk) pairs that share a term with ``query``, best first"""
+        query_terms = sorted(set(knowledge_terms(query)) & self._idf.keys())  # one summation order in every process
+        scored = []
+        for chunk, terms, length in zip(self.chunks, self._terms, self._lengths):
+            score = 0.0
+            for term in query_terms:
+                tf = terms.get(term)
+                if tf:
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / self._average)
+                    score += self._idf[term] * tf * (self.k1 + 1) / norm
+            if score > 0:
+                scored.append((score, chunk))
+        scored.sort(key=lambda pair: -pair[0])
+        return scored[:k] if k else scored
+
+    def _select(self, query: str, model: str, budget: int, top_k: int) -> str:
+        counter = get_token_counter()
+        ranked = self.search(query)
+        if not ranked:
+            return ""
+        floor = ranked[0][0] * KNOWLEDGE_MIN_SCORE
+        picked, spent = [], 0
+        for score, chunk in ranked:
+            if len(picked) >= top_k or score < floor:
+                break
+            text = f"[{chunk['title']}] {chunk['text']}"
+            tokens = counter.count(text, model, static=True)
+            if spent + tokens > budget:
+                continue
+            picked.append(text)
+            spent += tokens
+        if not picked:
+            return ""
+        return "RELEVANT COMPANY KNOWLEDGE (retrieved for this request):\n" + "\n".join(picked)
+
+    def context(self, query: str, model: str, budget: int = None, top_k: int = None) -> str:
+        """Knowledge block for a request, or "" when nothing relevant fits"""
+        budget = KNOWLEDGE_TOKENS if budget is None else budget
+        top_k = KNOWLEDGE_TOP_K if top_k is None else top_k
+        if budget <= 0 or top_k <= 0:
+            return ""
+        return self._context(query, model, budget, top_k)
+
+@st.cache_resource(show_spinner=False)
+def get_knowledge_store() -> KnowledgeStore:
+    """Knowledge index shared by every session in this process"""
+    return KnowledgeStore(knowledge_corpus())
@@ -0,0 +1,34 @@
+"""Deferred imports of the heavy optional modules (numpy, httpx, plotly)"""
+
+import contextvars
+import importlib
+import sys
+import time
+
+# Called with (span name, seconds) for each deferred import; app.py points it at its run profiler
+import_observer = contextvars.ContextVar('import_observer', default=None)
+
+class LazyModule:
+    """Module stand-in that performs the real import on first attribute access.
+
+    Keeps heavy optional modules (plotly, numpy, httpx) off the cold-start path
+    until the code that needs them actually runs; the import cost is reported
+    to the current import_observer when it happens.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            already_loaded = self._name in sys.modules
+            started = time.perf_counter()
+            self._module = importlib.import_module(self._name)
+            observe = import_observer.get()
+            if not already_loaded and observe is not None:
+                observe(f"import {self._name}", time.perf_counter() - started)
+        return getattr(self._module, attr)
+
+httpx = LazyModule('httpx')
+np = LazyModule('numpy')
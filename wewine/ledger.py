@@ -0,0 +1,288 @@
+"""The shared cost ledger, per-user identity of a call and cost estimation"""
+
+import atexit
+import contextvars
+import hashlib
+import os
+import sqlite3
+import threading
+from datetime import date
+
+import streamlit as st
+
+# --- COST LEDGER ---
+DAILY_BUDGET = float(os.getenv('WEWINE_DAILY_BUDGET', '1.0'))  # interactive sessions
+WARMUP_BUDGET = float(os.getenv('WEWINE_WARMUP_BUDGET', '0.5'))  # the off-peak warm-up job, on top
+WARMUP_USER = 'warmup'  # ledger user the warm-up job charges as
+DATA_DIR = os.getenv('WEWINE_DATA_DIR', '.wewine')
+COST_LEDGER_DB = os.getenv('WEWINE_LEDGER_DB', os.path.join(DATA_DIR, 'ledger.sqlite3'))
+LEDGER_FLUSH_INTERVAL = float(os.getenv('WEWINE_LEDGER_FLUSH_INTERVAL', '2'))
+
+# Identity of the browser session a call is charged to; app.py binds it on every script run
+current_user = contextvars.ContextVar('current_user', default='anonymous')
+
+def budget_scope(user_id: str = None) -> str:
+    """Budget a user's spend counts against: 'warmup' for the warm-up job, 'interactive' otherwise"""
+    return 'warmup' if (user_id or current_user.get()) == WARMUP_USER else 'interactive'
+
+class CostLedger:
+    """API spend shared by every session and worker process, persisted in SQLite (WAL).
+
+    record() only touches memory: calls are aggregated into a pending batch that a
+    background thread UPSERTs into per-(day, api key, user, model) rollup rows. Each
+    flush also re-reads the day's global total so spend from other processes counts
+    against the budget, which keeps within_budget() an O(1) in-memory comparison.
+
+    The budget is enforced by reservation: a call holds its worst-case cost via
+    reserve() before it is sent, and record(..., reserved=) swaps the hold for the
+    actual cost under the same lock. Concurrent callers therefore cannot all pass
+    the check and then overspend together. Holds are per process; other processes
+    count once their spend is flushed.
+
+    Spend is budgeted per scope (see budget_scope): the warm-up job draws on its
+    own warmup_budget, so a nightly run can never use up the interactive budget.
+    """
+
+    def __init__(self, db_path: str = COST_LEDGER_DB, budget: float = DAILY_BUDGET,
+                 flush_interval: float = LEDGER_FLUSH_INTERVAL, warmup_budget: float = WARMUP_BUDGET):
+        self.budget = budget
+        self.warmup_budget = warmup_budget
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._day = date.today().isoformat()
+        self._pending = {}  # (day, api_key, user_id, model) -> [calls, prompt, completion, cached, cost]
+        self._pending_cost = {}  # scope -> cost not yet flushed
+        self._pending_calls = 0
+        self._synced_cost = {}  # scope -> today's flushed cost, every process
+        self._synced_calls = 0
+        self._reserved = {}  # scope -> worst-case cost of admitted calls not yet charged
+        self._user_totals = {}  # user_id -> [cost, calls] for today, this process
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS usage_rollup (
+                day TEXT NOT NULL,
+                api_key TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                model TEXT NOT NULL,
+                calls INTEGER NOT NULL,
+                prompt_tokens INTEGER NOT NULL,
+                completion_tokens INTEGER NOT NULL,
+                cached_tokens INTEGER NOT NULL,
+                cost REAL NOT NULL,
+                PRIMARY KEY (day, api_key, user_id, model)
+            )
+        """)
+        self._db.commit()
+        self._sync()
+
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, args=(flush_interval,),
+                                         name="wewine-ledger", daemon=True)
+        self._flusher.start()
+        atexit.register(self.flush)
+
+    @staticmethod
+    def key_fingerprint(api_key: str) -> str:
+        """Stable, non-reversible label for an API key"""
+        if not api_key:
+            return 'none'
+        return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:12]
+
+    def _roll_day(self):
+        today = date.today().isoformat()
+        if today != self._day:
+            self._day = today
+            self._synced_cost, self._synced_calls = {}, 0
+            self._user_totals = {}
+
+    def record(self, cost: float, prompt_tokens: int, completion_tokens: int, model: str,
+               api_key: str = None, user_id: str = None, cached_tokens: int = 0, reserved: float = 0.0):
+        """Charge a finished call, releasing the ``reserved`` hold it was admitted with"""
+        user_id = user_id or current_user.get()
+        scope = budget_scope(user_id)
+        with self._lock:
+            self._roll_day()
+            self._reserved[scope] = max(0.0, self._reserved.get(scope, 0.0) - reserved)
+            key = (self._day, self.key_fingerprint(api_key), user_id, model)
+            row = self._pending.setdefault(key, [0, 0, 0, 0, 0.0])
+            row[0] += 1
+            row[1] += prompt_tokens
+            row[2] += completion_tokens
+            row[3] += cached_tokens
+            row[4] += cost
+            self._pending_cost[scope] = self._pending_cost.get(scope, 0.0) + cost
+            self._pending_calls += 1
+            totals = self._user_totals.setdefault(user_id, [0.0, 0])
+            totals[0] += cost
+            totals[1] += 1
+
+    def _spent(self, scope: str) -> float:
+        return self._synced_cost.get(scope, 0.0) + self._pending_cost.get(scope, 0.0)
+
+    def spent_today(self, scope: str = None) -> float:
+        """Today's spend in one budget scope, or in all of them"""
+        with self._lock:
+            self._roll_day()
+            if scope:
+                return self._spent(scope)
+            return sum(self._spent(name) for name in set(self._synced_cost) | set(self._pending_cost))
+
+    def calls_today(self) -> int:
+        with self._lock:
+            self._roll_day()
+            return int(self._synced_calls + self._pending_calls)
+
+    def user_usage(self, user_id: str = None):
+        """(cost, calls) charged today to one session in this process"""
+        with self._lock:
+            self._roll_day()
+            cost, calls = self._user_totals.get(user_id or current_user.get(), (0.0, 0))
+            return cost, calls
+
+    def budget_for(self, scope: str = None) -> float:
+        return self.warmup_budget if (scope or budget_scope()) == 'warmup' else self.budget
+
+    def remaining(self, scope: str = None) -> float:
+        """Budget left today in the caller's scope after charged spend and outstanding reservations"""
+        scope = scope or budget_scope()
+        with self._lock:
+            self._roll_day()
+            return self.budget_for(scope) - self._spent(scope) - self._reserved.get(scope, 0.0)
+
+    def reserve(self, cost: float, scope: str = None) -> bool:
+        """Hold ``cost`` against today's budget; False (and nothing held) when it does not fit"""
+        scope = scope or budget_scope()
+        with self._lock:
+            self._roll_day()
+            held = self._reserved.get(scope, 0.0)
+            if self._spent(scope) + held + cost > self.budget_for(scope):
+                return False
+            self._reserved[scope] = held + cost
+            return True
+
+    def release(self, cost: float, scope: str = None):
+        """Drop a hold whose call was never charged (it failed before any usage)"""
+        scope = scope or budget_scope()
+        with self._lock:
+            self._reserved[scope] = max(0.0, self._reserved.get(scope, 0.0) - cost)
+
+    def within_budget(self, scope: str = None) -> bool:
+        return self.remaining(scope) > 0
+
+    def flush(self):
+        """Write the pending batch and refresh the global day total"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            flushed_cost, self._pending_cost = self._pending_cost, {}
+            flushed_calls, self._pending_calls = self._pending_calls, 0
+        try:
+            if batch:
+                with self._db_lock:
+                    self._db.executemany("""
+                        INSERT INTO usage_rollup (day, api_key, user_id, model, calls, prompt_tokens,
+                                                  completion_tokens, cached_tokens, cost)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (day, api_key, user_id, model) DO UPDATE SET
+                            calls = calls + excluded.calls,
+                            prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                            completion_tokens = completion_tokens + excluded.completion_tokens,
+                            cached_tokens = cached_tokens + excluded.cached_tokens,
+                            cost = cost + excluded.cost
+                    """, [key + tuple(values) for key, values in batch.items()])
+                    self._db.commit()
+        except sqlite3.Error:
+            # Keep the spend in memory and retry on the next flush
+            with self._lock:
+                for key, values in batch.items():
+                    row = self._pending.setdefault(key, [0, 0, 0, 0, 0.0])
+                    for i, value in enumerate(values):
+                        row[i] += value
+                for scope, cost in flushed_cost.items():
+                    self._pending_cost[scope] = self._pending_cost.get(scope, 0.0) + cost
+                self._pending_calls += flushed_calls
+            return
+        self._sync()
+
+    def _sync(self):
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT user_id = ?, SUM(cost), SUM(calls) FROM usage_rollup WHERE day = ? GROUP BY user_id = ?",
+                (WARMUP_USER, date.today().isoformat(), WARMUP_USER)
+            ).fetchall()
+        with self._lock:
+            self._roll_day()
+            self._synced_cost = {('warmup' if warm else 'interactive'): cost for warm, cost, _ in rows}
+            self._synced_calls = sum(calls for _, _, calls in rows)
+
+    def _flush_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+            except sqlite3.Error:
+                pass
+
+    def rollup(self, group_by: str = 'user_id', day: str = None) -> list:
+        """Flushed totals for one day grouped by 'user_id', 'api_key' or 'model'"""
+        if group_by not in ('user_id', 'api_key', 'model'):
+            raise ValueError(f"Unsupported rollup dimension: {group_by}")
+        with self._db_lock:
+            return self._db.execute(f"""
+                SELECT {group_by}, SUM(calls), SUM(prompt_tokens), SUM(completion_tokens),
+                       SUM(cached_tokens), SUM(cost)
+                FROM usage_rollup WHERE day = ? GROUP BY {group_by} ORDER BY SUM(cost) DESC
+            """, (day or date.today().isoformat(),)).fetchall()
+
+    def daily_totals(self, days: int = 7) -> list:
+        """(day, calls, cost) for the most recent days"""
+        with self._db_lock:
+            return self._db.execute("""
+                SELECT day, SUM(calls), SUM(cost) FROM usage_rollup
+                GROUP BY day ORDER BY day DESC LIMIT ?
+            """, (days,)).fetchall()
+
+@st.cache_resource(show_spinner=False)
+def get_cost_ledger() -> CostLedger:
+    """Cost ledger shared by all sessions in this process"""
+    return CostLedger()
+
+# --- COST TRACKING ---
+MODEL_PRICING = {
+    'gpt-4': {'input': 0.03, 'output': 0.06},
+    'gpt-4-turbo': {'input': 0.01, 'output': 0.03},
+    'gpt-3.5-turbo': {'input': 0.0015, 'output': 0.002},
+    'o1-preview': {'input': 0.015, 'output': 0.06},
+    'o1-mini': {'input': 0.003, 'output': 0.012}
+}
+
+CACHED_PROMPT_PRICE_RATIO = 0.5  # providers bill cached prompt-prefix tokens at half price
+BATCH_PRICE_RATIO = 0.5  # asynchronous batch requests bill at half the interactive price
+
+def model_family(model: str) -> str:
+    """Longest known model name that prefixes ``model`` (gpt-4-turbo-preview -> gpt-4-turbo)"""
+    matches = [family for family in MODEL_PRICING if model.startswith(family)]
+    return max(matches, key=len) if matches else 'gpt-4'  # default
+
+def estimate_cost(prompt_tokens, completion_tokens, model, cached_tokens=0, batch=False):
+    """Estimate API cost based on token usage; cached prefix tokens and batch calls bill at a discount"""
+    pricing = MODEL_PRICING[model_family(model)]
+    
+    uncached_tokens = prompt_tokens - cached_tokens
+    input_cost = ((uncached_tokens + cached_tokens * CACHED_PROMPT_PRICE_RATIO) / 1000) * pricing['input']
+    output_cost = (completion_tokens / 1000) * pricing['output']
+    
+    return (input_cost + output_cost) * (BATCH_PRICE_RATIO if batch else 1.0)
+
+def usage_cost(usage: dict, model: str, batch: bool = False) -> float:
+    """Cost of an API usage object, honouring provider-reported cached prompt tokens"""
+    cached_tokens = (usage.get('prompt_tokens_details') or {}).get('cached_tokens') or 0
+    return estimate_cost(usage['prompt_tokens'], usage['completion_tokens'], model, cached_tokens, batch)
+
+def check_cost_limit():
+    """Check the shared daily budget across all sessions and workers"""
+    return get_cost_ledger().within_budget()
@@ -0,0 +1,237 @@
+"""Streaming Markdown-to-HTML rendering of model responses, sanitized for st.markdown"""
+
+import copy
+import html
+import re
+
+# --- MARKDOWN RENDERING ---
+# Responses are converted to sanitized HTML here rather than by st.markdown:
+# Markdown inside an HTML <div> is only parsed up to the first blank line, and
+# model output must never inject markup of its own. The emitted HTML contains
+# no newlines, so Streamlit passes it through as one raw HTML block.
+MD_FENCE = re.compile(r'^\s*(`{3,}|~{3,})\s*([\w+-]*)')
+MD_HEADING = re.compile(r'^\s{0,3}(#{1,6})\s+(.*?)\s*#*\s*$')
+MD_RULE = re.compile(r'^\s{0,3}([-*_])(\s*\1){2,}\s*$')
+MD_LIST_ITEM = re.compile(r'^(\s*)([-*+]|(\d{1,9})[.)])\s+(.*)$')
+MD_TABLE_RULE = re.compile(r'^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$')
+MD_CODE_SPAN = re.compile(r'(`+)(.+?)\1')
+# link targets may hold balanced parentheses, e.g. wiki URLs or "javascript:alert(1)", so a
+# rejected link is consumed whole rather than leaving its closing ")" in the text
+MD_LINK = re.compile(r'\[([^\]]+)\]\(((?:[^()\s]|\((?:[^()\s]|\([^()\s]*\))*\))+)\)')
+MD_LINK_SLOT = re.compile(r'\x00(\d+)\x00')
+MD_INLINE = [
+    (re.compile(r'\*\*(?=\S)(.+?)(?<=\S)\*\*|__(?=\S)(.+?)(?<=\S)__'), 'strong'),
+    (re.compile(r'(?<![\w*])\*(?=[^\s*])(.+?)(?<=[^\s*])\*(?![\w*])|(?<!\w)_(?=\S)(.+?)(?<=\S)_(?!\w)'), 'em'),
+    (re.compile(r'~~(?=\S)(.+?)(?<=\S)~~'), 'del'),
+]
+MD_SAFE_LINK = re.compile(r'^(https?:|mailto:)', re.IGNORECASE)
+
+def markdown_inline(text: str) -> str:
+    """Escape a line of text and apply the inline Markdown subset (code, links, emphasis)"""
+    pieces = []
+    last = 0
+    for match in MD_CODE_SPAN.finditer(text):
+        pieces.append(markdown_emphasis(text[last:match.start()]))
+        pieces.append(f"<code>{html.escape(match.group(2).strip())}</code>")
+        last = match.end()
+    pieces.append(markdown_emphasis(text[last:]))
+    return "".join(pieces)
+
+def markdown_emphasis(text: str) -> str:
+    """Escape text and render its links and emphasis.
+
+    Rendered links sit out the emphasis passes behind placeholders, like code
+    spans, so underscores and asterisks in a URL (or the anchor's own attributes)
+    never turn into tags; their labels are styled on their own.
+    """
+    links = []
+
+    def link(match) -> str:
+        rendered = markdown_link(match)
+        if not rendered.startswith('<a '):  # an unsafe link comes back as its bare, escaped label
+            return rendered
+        links.append(rendered)
+        return f"\x00{len(links) - 1}\x00"
+
+    text = MD_LINK.sub(link, html.escape(text).replace("\x00", ""))
+    return MD_LINK_SLOT.sub(lambda m: links[int(m.group(1))], markdown_styles(text))
+
+def markdown_styles(text: str) -> str:
+    """Strong, emphasis and strikethrough over already escaped text"""
+    for pattern, tag in MD_INLINE:
+        text = pattern.sub(lambda m, tag=tag: f"<{tag}>{m.group(1) or m.group(2)}</{tag}>", text)
+    return text
+
+def markdown_link(match) -> str:
+    label, url = match.groups()
+    if not MD_SAFE_LINK.match(html.unescape(url)):
+        return label
+    return f'<a href="{url}" target="_blank" rel="noopener noreferrer">{markdown_styles(label)}</a>'
+
+class StreamingMarkdown:
+    """Incremental Markdown-to-HTML converter for streamed responses.
+
+    ``feed`` consumes chunks as they arrive and returns the HTML of every block
+    the chunk completed; each line is parsed exactly once, so total work stays
+    linear in the response length. ``preview`` renders the still-open block -
+    a half-finished table, list or code fence - with its constructs closed,
+    for display until more text arrives. ``close`` flushes the final block.
+    """
+
+    def __init__(self):
+        self._partial = ""
+        self._kind = None    # paragraph, list, table, code, quote
+        self._parts = []     # rendered pieces of the open block
+        self._fence = None
+        self._lang = ""
+        self._gap = False    # blank line seen inside an open list
+
+    def feed(self, chunk: str) -> list:
+        done = []
+        *lines, self._partial = (self._partial + chunk).split("\n")
+        for line in lines:
+            done += self._line(line.rstrip("\r"))
+        return done
+
+    def close(self) -> list:
+        done = self._line(self._partial) if self._partial else []
+        self._partial = ""
+        return done + self._finish()
+
+    def preview(self) -> str:
+        """HTML of the open block (and the unfinished line), constructs closed"""
+        if not self._partial:
+            return self._render()
+        draft = copy.deepcopy(self)
+        return "".join(draft.close())
+
+    def _line(self, line: str) -> list:
+        if self._kind == 'code':
+            if line.strip().startswith(self._fence) and not line.strip().strip(self._fence[0]):
+                return self._finish()
+            self._parts.append(html.escape(line))
+            return []
+
+        if not line.strip():
+            if self._kind == 'list':
+                self._gap = True
+                return []
+            return self._finish()
+
+        item = MD_LIST_ITEM.match(line)
+        fence = MD_FENCE.match(line)
+        heading = MD_HEADING.match(line)
+        starts_block = fence or heading or MD_RULE.match(line) or line.lstrip()[:1] in ('|', '>')
+        if self._kind == 'list' and not item and not starts_block and (line[:1].isspace() or not self._gap):
+            self._parts[-1][3] += " " + markdown_inline(line.strip())  # continuation of the last item
+            self._gap = False
+            return []
+        self._gap = False
+
+        if fence:
+            done = self._finish()
+            self._kind, self._fence, self._lang = 'code', fence.group(1), fence.group(2)
+            return done
+        if heading:
+            level = len(heading.group(1))
+            return self._finish() + [f"<h{level}>{markdown_inline(heading.group(2))}</h{level}>"]
+        if MD_RULE.match(line):
+            return self._finish() + ["<hr>"]
+        if item:
+            done = self._finish() if self._kind != 'list' else []
+            self._kind = 'list'
+            indent, marker, number, text = item.groups()
+            ordered = number is not None
+            self._parts.append([len(indent.expandtabs(4)), ordered, int(number) if ordered else 1,
+                                markdown_inline(text)])
+            return done
+        if line.lstrip().startswith('|'):
+            done = self._finish() if self._kind != 'table' else []
+            self._kind = 'table'
+            if len(self._parts) == 1 and MD_TABLE_RULE.match(line):
+                self._parts.append(self._alignments(line))
+            else:
+                self._parts.append([markdown_inline(cell) for cell in self._cells(line)])
+            return done
+        if line.lstrip().startswith('>'):
+            done = self._finish() if self._kind != 'quote' else []
+            self._kind = 'quote'
+            self._parts.append(markdown_inline(line.lstrip()[1:].strip()))
+            return done
+
+        done = self._finish() if self._kind != 'paragraph' else []
+        self._kind = 'paragraph'
+        self._parts.append(markdown_inline(line.strip()) + ("<br>" if line.endswith("  ") else ""))
+        return done
+
+    def _finish(self) -> list:
+        rendered = self._render()
+        self._kind, self._parts, self._fence, self._lang, self._gap = None, [], None, "", False
+        return [rendered] if rendered else []
+
+    def _render(self) -> str:
+        if self._kind == 'paragraph':
+            return f"<p>{' '.join(self._parts)}</p>"
+        if self._kind == 'quote':
+            return f"<blockquote><p>{' '.join(self._parts)}</p></blockquote>"
+        if self._kind == 'code':
+            lang = f' class="language-{html.escape(self._lang)}"' if self._lang else ""
+            return f"<pre><code{lang}>{'&#10;'.join(self._parts)}</code></pre>"
+        if self._kind == 'list':
+            return self._render_list()
+        if self._kind == 'table':
+            return self._render_table()
+        return ""
+
+    def _render_list(self) -> str:
+        out, stack = [], []  # stack of (indent, tag)
+        for indent, ordered, start, text in self._parts:
+            tag = 'ol' if ordered else 'ul'
+            while stack and indent < stack[-1][0]:
+                out.append(f"</li></{stack.pop()[1]}>")
+            if stack and indent == stack[-1][0] and tag != stack[-1][1]:
+                out.append(f"</li></{stack.pop()[1]}>")
+            if not stack or indent > stack[-1][0]:
+                out.append(f'<{tag} start="{start}">' if ordered and start != 1 else f"<{tag}>")
+                stack.append((indent, tag))
+            else:
+                out.append("</li>")
+            out.append(f"<li>{text}")
+        out += [f"</li></{tag}>" for _, tag in reversed(stack)]
+        return "".join(out)
+
+    def _render_table(self) -> str:
+        header, *rows = self._parts
+        aligns = rows.pop(0) if rows and isinstance(rows[0], tuple) else ()
+
+        def row(cells, tag):
+            styled = []
+            for i, cell in enumerate(cells):
+                align = aligns[i] if i < len(aligns) else None
+                styled.append(f'<{tag} style="text-align:{align}">{cell}</{tag}>' if align else f"<{tag}>{cell}</{tag}>")
+            return f"<tr>{''.join(styled)}</tr>"
+
+        body = "".join(row(cells, 'td') for cells in rows)
+        return f"<table><thead>{row(header, 'th')}</thead><tbody>{body}</tbody></table>"
+
+    @staticmethod
+    def _cells(line: str) -> list:
+        line = line.strip()
+        if line.startswith('|'):
+            line = line[1:]
+        if line.endswith('|') and not line.endswith('\\|'):
+            line = line[:-1]
+        return [cell.strip().replace('\\|', '|') for cell in re.split(r'(?<!\\)\|', line)]
+
+    @classmethod
+    def _alignments(cls, line: str) -> tuple:
+        aligns = []
+        for cell in cls._cells(line):
+            left, right = cell.startswith(':'), cell.endswith(':')
+            aligns.append('center' if left and right else 'right' if right else 'left' if left else None)
+        return tuple(aligns)
+
+def markdown_to_html(text: str) -> str:
+    """Render a complete Markdown response to sanitized, single-line HTML"""
+    renderer = StreamingMarkdown()
+    return "".join(renderer.feed(text) + renderer.close())
@@ -0,0 +1,168 @@
+"""Per-session conversation memory: persisted turns, windowing and rolling summaries"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import streamlit as st
+
+from .ledger import DATA_DIR, model_family
+from .tokens import MODEL_CONTEXT_WINDOWS, get_token_counter
+
+# --- CONVERSATION MEMORY ---
+CONVERSATION_DB = os.getenv('WEWINE_CONVERSATION_DB', os.path.join(DATA_DIR, 'conversations.sqlite3'))
+CONVERSATION_CONTEXT_TOKENS = int(os.getenv('WEWINE_CONVERSATION_CONTEXT_TOKENS', '3000'))
+CONVERSATION_SUMMARY_TOKENS = int(os.getenv('WEWINE_CONVERSATION_SUMMARY_TOKENS', '400'))
+CONVERSATION_RETENTION_DAYS = float(os.getenv('WEWINE_CONVERSATION_RETENTION_DAYS', '30'))
+CONVERSATION_SUMMARY_INSTRUCTIONS = f"""
+You keep the running memory of a strategy consultation with WeWine's founder.
+Merge the new exchanges into the existing summary. Keep decisions, numbers,
+constraints, open questions and the founder's stated preferences; drop
+pleasantries and anything repeated. Reply with the updated summary only, as
+terse bullet points, in under {int(CONVERSATION_SUMMARY_TOKENS * 0.6)} words.
+"""
+
+def conversation_budget(model: str) -> int:
+    """Prompt tokens a conversation's context may use on ``model``: at most a quarter of its window"""
+    window = MODEL_CONTEXT_WINDOWS.get(model_family(model), MODEL_CONTEXT_WINDOWS['gpt-4'])
+    return min(CONVERSATION_CONTEXT_TOKENS, window // 4)
+
+def turn_text(question: str, answer: str) -> str:
+    return f"Founder: {question.strip()}\nAura: {answer.strip()}"
+
+class ConversationStore:
+    """Turns and rolling summaries of Strategic Consultation threads (SQLite WAL).
+
+    Every turn is stored with its token count and the summary records the last
+    turn folded into it, so assembling a context window never re-tokenizes or
+    re-summarizes earlier history.
+    """
+
+    def __init__(self, db_path: str = CONVERSATION_DB):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=10)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS turns (
+                conversation_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                question TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                tokens INTEGER NOT NULL,
+                ref TEXT,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (conversation_id, seq)
+            )
+        """)
+        self._db.execute("CREATE UNIQUE INDEX IF NOT EXISTS turns_ref ON turns (conversation_id, ref)")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS summaries (
+                conversation_id TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                tokens INTEGER NOT NULL,
+                through INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._db.commit()
+
+    def append(self, conversation_id: str, question: str, answer: str, tokens: int, ref: str = None) -> bool:
+        """Add a turn; a turn whose ``ref`` (e.g. a job id) is already recorded is ignored"""
+        with self._lock:
+            added = self._db.execute(
+                "INSERT OR IGNORE INTO turns (conversation_id, seq, question, answer, tokens, ref, created_at) "
+                "SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ?, ?, ?, ? FROM turns WHERE conversation_id = ?",
+                (conversation_id, question, answer, tokens, ref, time.time(), conversation_id)
+            ).rowcount
+            self._db.commit()
+        return added == 1
+
+    def turns(self, conversation_id: str, after: int = 0) -> list:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT seq, question, answer, tokens FROM turns WHERE conversation_id = ? AND seq > ? ORDER BY seq",
+                (conversation_id, after)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def summary(self, conversation_id: str) -> dict:
+        with self._lock:
+            row = self._db.execute("SELECT summary, tokens, through FROM summaries WHERE conversation_id = ?",
+                                   (conversation_id,)).fetchone()
+        return dict(row) if row else {'summary': '', 'tokens': 0, 'through': 0}
+
+    def save_summary(self, conversation_id: str, summary: str, tokens: int, through: int):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO summaries (conversation_id, summary, tokens, through, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (conversation_id) DO UPDATE SET summary = excluded.summary, tokens = excluded.tokens, "
+                "through = excluded.through, updated_at = excluded.updated_at WHERE excluded.through > through",
+                (conversation_id, summary, tokens, through, time.time())
+            )
+            self._db.commit()
+
+    def purge(self, max_age_days: float = CONVERSATION_RETENTION_DAYS) -> int:
+        """Drop conversations idle for longer than the retention window"""
+        cutoff = time.time() - max_age_days * 86400
+        with self._lock:
+            stale = [row[0] for row in self._db.execute(
+                "SELECT conversation_id FROM turns GROUP BY conversation_id HAVING MAX(created_at) < ?", (cutoff,)
+            ).fetchall()]
+            for conversation_id in stale:
+                self._db.execute("DELETE FROM turns WHERE conversation_id = ?", (conversation_id,))
+                self._db.execute("DELETE FROM summaries WHERE conversation_id = ?", (conversation_id,))
+            self._db.commit()
+        return len(stale)
+
+@st.cache_resource(show_spinner=False)
+def get_conversation_store() -> ConversationStore:
+    store = ConversationStore()
+    store.purge()
+    return store
+
+def conversation_window(store: ConversationStore, conversation_id: str, budget: int) -> dict:
+    """The rolling summary plus the newest turns that fit ``budget`` after it.
+
+    ``overflow`` lists the turns that no longer fit and are not summarized yet;
+    they must be folded into the summary before the window is used.
+    """
+    state = store.summary(conversation_id)
+    turns = store.turns(conversation_id, after=state['through'])
+    room = budget - state['tokens']
+    kept = 0
+    for turn in reversed(turns):
+        if turn['tokens'] > room:
+            break
+        room -= turn['tokens']
+        kept += 1
+    return {'summary': state['summary'], 'turns': turns[len(turns) - kept:],
+            'overflow': turns[:len(turns) - kept], 'through': state['through']}
+
+def contextualize(question: str, window: dict) -> str:
+    """Frame a follow-up question with the conversation window; a first question is sent as is"""
+    if not window['summary'] and not window['turns']:
+        return question
+    parts = ["CONVERSATION SO FAR (context only - build on it rather than repeating earlier answers):"]
+    if window['summary']:
+        parts.append(f"Summary of earlier exchanges:\n{window['summary']}")
+    parts += [turn_text(turn['question'], turn['answer']) for turn in window['turns']]
+    parts.append(f"FOLLOW-UP QUESTION:\n{question.strip()}")
+    return "\n\n".join(parts)
+
+def extractive_summary(summary: str, turns: list, max_tokens: int, model: str) -> str:
+    """Offline fold: one line per turn (question and the answer's opening), oldest lines dropped to fit"""
+    lines = [line for line in summary.splitlines() if line.strip()]
+    for turn in turns:
+        opening = re.split(r'(?<=[.!?])\s', turn['answer'].strip(), maxsplit=1)[0]
+        lines.append(f"- Asked: {turn['question'].strip()} -> {opening[:300]}")
+    counter = get_token_counter()
+    while len(lines) > 1 and counter.count("\n".join(lines), model) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
@@ -0,0 +1,321 @@
+"""Process-wide metrics: latency histograms, call counters, stage traces and the /metrics endpoint"""
+
+import contextvars
+import functools
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import streamlit as st
+
+from .resilience import resilience_metrics
+from .scheduler import get_request_scheduler
+from .ledger import get_cost_ledger
+from .cache import get_response_cache, get_semantic_cache
+from .coalescing import get_single_flight
+
+# --- METRICS ---
+METRICS_HOST = os.getenv('WEWINE_METRICS_HOST', '127.0.0.1')
+METRICS_PORT = os.getenv('WEWINE_METRICS_PORT', '')  # opt-in: e.g. 9464 serves /metrics; unset, nothing listens
+METRICS_WINDOW = int(os.getenv('WEWINE_METRICS_WINDOW', '1024'))  # recent samples per series for percentiles
+METRICS_RECENT_CALLS = int(os.getenv('WEWINE_METRICS_RECENT_CALLS', '200'))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+THROUGHPUT_BUCKETS = (5, 10, 20, 40, 60, 80, 120, 200, 400)
+METRIC_HELP = {
+    'wewine_request_seconds': ('histogram', "End-to-end latency of an engine entry point, cache hits included"),
+    'wewine_llm_call_seconds': ('histogram', "Latency of one upstream completion, retries and queueing included"),
+    'wewine_stage_seconds': ('histogram', "Time spent per pipeline stage of upstream completions"),
+    'wewine_render_seconds': ('histogram', "Time to render a response into the page"),
+    'wewine_completion_tokens_per_second': ('histogram', "Completion tokens per second of upstream calls"),
+    'wewine_llm_calls_total': ('counter', "Upstream completions by outcome"),
+    'wewine_tokens_total': ('counter', "Tokens charged to the ledger by kind"),
+    'wewine_fallback_answers_total': ('counter', "Offline framework answers by the frameworks they drew on"),
+}
+current_entry = contextvars.ContextVar('current_entry', default='direct')
+
+class Histogram:
+    """Cumulative buckets for export plus a window of recent samples for percentiles"""
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=METRICS_WINDOW)
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+    def quantile(self, q: float) -> float:
+        samples = sorted(self.recent)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+class MetricsRegistry:
+    """Process-wide counters and histograms keyed by metric name and label set.
+
+    Gauges are not stored: collectors registered with ``collector`` are polled
+    at export time, so breaker, scheduler and cache state is always current.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+        self.calls = deque(maxlen=METRICS_RECENT_CALLS)
+        self.endpoint = None  # the /metrics server, when WEWINE_METRICS_PORT is set
+
+    @staticmethod
+    def _series(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        series = self._series(name, labels)
+        with self._lock:
+            self._counters[series] = self._counters.get(series, 0) + amount
+
+    def observe(self, name: str, value: float, buckets: tuple = LATENCY_BUCKETS, **labels):
+        series = self._series(name, labels)
+        with self._lock:
+            if series not in self._histograms:
+                self._histograms[series] = Histogram(buckets)
+            self._histograms[series].observe(value)
+
+    def collector(self, collect):
+        """Register ``collect() -> [(name, help, labels, value)]`` for gauges read at export time"""
+        self._collectors.append(collect)
+
+    def record_call(self, trace: dict):
+        with self._lock:
+            self.calls.append(trace)
+
+    def counters(self, name: str) -> list:
+        with self._lock:
+            return [(dict(labels), value) for (metric, labels), value in self._counters.items() if metric == name]
+
+    def percentiles(self, name: str, quantiles=(0.5, 0.95, 0.99)) -> list:
+        """One row per label set: its labels, sample count, mean and the requested percentiles"""
+        rows = []
+        with self._lock:
+            for (metric, labels), histogram in self._histograms.items():
+                if metric != name:
+                    continue
+                row = dict(labels)
+                row.update(count=histogram.count, mean=histogram.sum / histogram.count)
+                row.update({f"p{round(q * 100)}": histogram.quantile(q) for q in quantiles})
+                rows.append(row)
+        return rows
+
+    def gauges(self) -> list:
+        gauges = []
+        for collect in self._collectors:
+            try:
+                gauges += collect()
+            except Exception:
+                continue  # a broken collector must not take the endpoint down
+        return gauges
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        def labelled(name, labels):
+            if not labels:
+                return name
+            escaped = ",".join(
+                f'{key}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+                for key, value in labels
+            )
+            return f"{name}{{{escaped}}}"
+
+        lines = []
+        with self._lock:
+            families = {}
+            for (name, labels), value in self._counters.items():
+                families.setdefault(name, []).append(f"{labelled(name, labels)} {value:g}")
+            for (name, labels), histogram in self._histograms.items():
+                series = families.setdefault(name, [])
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    series.append(f"{labelled(name + '_bucket', labels + (('le', f'{bound:g}'),))} {count}")
+                series.append(f"{labelled(name + '_bucket', labels + (('le', '+Inf'),))} {histogram.count}")
+                series.append(f"{labelled(name + '_sum', labels)} {histogram.sum:.6f}")
+                series.append(f"{labelled(name + '_count', labels)} {histogram.count}")
+        for name in sorted(families):
+            kind, help_text = METRIC_HELP.get(name, ('untyped', name))
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"] + families[name]
+
+        described = set()
+        for name, help_text, labels, value in self.gauges():
+            if name not in described:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+                described.add(name)
+            lines.append(f"{labelled(name, tuple(sorted(labels.items())))} {float(value):g}")
+        return "\n".join(lines) + "\n"
+
+def pipeline_gauges() -> list:
+    """Resilience, scheduler, coalescing, cache and spend state as gauges"""
+    gauges = [(f"wewine_{name}", name.replace('_', ' '), {}, value)
+              for name, value in resilience_metrics().items() if name != 'circuit_state']
+    queue = get_request_scheduler().stats()
+    gauges += [(f"wewine_scheduler_{name}", f"rate-limit scheduler {name.replace('_', ' ')}", {}, value)
+               for name, value in queue.items() if value is not None]
+    flights = get_single_flight().stats()
+    gauges += [(f"wewine_flights_{name}", f"request coalescing {name.replace('_', ' ')}", {}, value)
+               for name, value in flights.items()]
+    for cache_name, stats in (('response', get_response_cache().stats()), ('semantic', get_semantic_cache().stats())):
+        gauges += [(f"wewine_cache_{name}", f"cache {name}", {'cache': cache_name}, value)
+                   for name, value in stats.items()]
+        lookups = stats['hits'] + stats['misses']
+        gauges.append(("wewine_cache_hit_ratio", "cache hits per lookup", {'cache': cache_name},
+                       stats['hits'] / lookups if lookups else 0.0))
+    gauges += [("wewine_spent_today_dollars", "API spend recorded in the ledger today", {'scope': scope},
+                get_cost_ledger().spent_today(scope)) for scope in ('interactive', 'warmup')]
+    return gauges
+
+class MetricsEndpoint(BaseHTTPRequestHandler):
+    """GET /metrics in Prometheus text format"""
+    registry = None
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.registry.render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@st.cache_resource(show_spinner=False)
+def get_metrics() -> MetricsRegistry:
+    """Metrics registry shared process-wide; starts the /metrics endpoint once if WEWINE_METRICS_PORT is set"""
+    registry = MetricsRegistry()
+    registry.collector(pipeline_gauges)
+    if METRICS_PORT:
+        handler = type('Endpoint', (MetricsEndpoint,), {'registry': registry})
+        try:
+            server = ThreadingHTTPServer((METRICS_HOST, int(METRICS_PORT)), handler)
+        except OSError as e:
+            print(f"WeWine metrics endpoint disabled: {e}", file=sys.stderr)
+        else:
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="wewine-metrics", daemon=True).start()
+            registry.endpoint = server
+    return registry
+
+def new_call_trace(model: str, stream: bool) -> dict:
+    """Per-call record of stage timings, filled in as an upstream completion progresses"""
+    return {'entry': current_entry.get(), 'model': model, 'stream': stream, 'at': time.time(),
+            'started': time.perf_counter(), 'stages': {}, 'outcome': 'ok'}
+
+def record_stage(trace: dict, stage: str, seconds: float):
+    trace['stages'][stage] = trace['stages'].get(stage, 0.0) + seconds
+    get_metrics().observe('wewine_stage_seconds', seconds, stage=stage, model=trace['model'])
+
+@contextmanager
+def stage_span(trace: dict, stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(trace, stage, time.perf_counter() - started)
+
+def finish_call_trace(trace: dict, usage: dict = None, error: Exception = None):
+    """Close a call trace: latency, outcome, token throughput and the recent-calls log"""
+    metrics = get_metrics()
+    seconds = time.perf_counter() - trace.pop('started')
+    trace['seconds'] = seconds
+    if error is not None:
+        trace['outcome'] = error.__class__.__name__
+    labels = {'model': trace['model'], 'entry': trace['entry']}
+    metrics.observe('wewine_llm_call_seconds', seconds, stream=str(trace['stream']).lower(), **labels)
+    metrics.inc('wewine_llm_calls_total', outcome='ok' if error is None else 'error', **labels)
+    if usage:
+        trace['completion_tokens'] = usage.get('completion_tokens')
+        generating = seconds - trace['stages'].get('queue', 0.0)
+        if usage.get('completion_tokens') and generating > 0:
+            metrics.observe('wewine_completion_tokens_per_second', usage['completion_tokens'] / generating,
+                            THROUGHPUT_BUCKETS, model=trace['model'])
+    metrics.record_call(trace)
+
+def http_trace(trace: dict, asynchronous: bool = False):
+    """httpx ``trace`` extension hook recording connect (DNS included), TLS, TTFB and body download"""
+    marks = {}
+
+    def on_event(name: str, info: dict):
+        step, _, phase = name.rpartition('.')
+        step = step.rpartition('.')[2]
+        now = time.perf_counter()
+        marks[(step, phase)] = now
+        if phase != 'complete':
+            return
+        if step in ('connect_tcp', 'start_tls'):
+            record_stage(trace, 'connect' if step == 'connect_tcp' else 'tls', now - marks[(step, 'started')])
+        elif step == 'receive_response_headers' and ('send_request_headers', 'started') in marks:
+            record_stage(trace, 'ttfb', now - marks[('send_request_headers', 'started')])
+        elif step == 'receive_response_body' and not trace['stream']:
+            record_stage(trace, 'download', now - marks[('receive_response_body', 'started')])
+
+    if not asynchronous:
+        return on_event
+
+    async def on_event_async(name: str, info: dict):
+        on_event(name, info)
+    return on_event_async
+
+def instrumented(fn):
+    """Time an engine entry point end to end and label the upstream calls it makes with its name.
+
+    Only the outermost instrumented method counts, so nested entry points (a
+    generate_* method calling _call_openai_api) are attributed to the caller.
+    Streamed results are timed until the stream is exhausted.
+    """
+    entry = fn.__name__.lstrip('_')
+
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        if current_entry.get() != 'direct':
+            return fn(self, *args, **kwargs)
+        started = time.perf_counter()
+        token = current_entry.set(entry)
+        try:
+            result = fn(self, *args, **kwargs)
+            context = contextvars.copy_context()
+        finally:
+            current_entry.reset(token)
+
+        def observe():
+            get_metrics().observe('wewine_request_seconds', time.perf_counter() - started,
+                                  entry=entry, model=self.model)
+
+        if isinstance(result, str) or not hasattr(result, '__next__'):
+            observe()
+            return result
+
+        def timed_stream():
+            try:
+                while True:
+                    try:
+                        chunk = context.run(next, result)
+                    except StopIteration:
+                        return
+                    yield chunk
+            finally:
+                if hasattr(result, 'close'):
+                    context.run(result.close)
+                observe()
+        return timed_stream()
+    return wrapper
@@ -0,0 +1,267 @@
+"""Retries with backoff, deadlines and the circuit breaker around upstream calls"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import streamlit as st
+
+from .lazy import httpx
+
+# --- RESILIENCE ---
+RETRY_MAX_ATTEMPTS = int(os.getenv('WEWINE_RETRY_MAX_ATTEMPTS', '3'))
+RETRY_BASE_DELAY = float(os.getenv('WEWINE_RETRY_BASE_DELAY', '0.5'))
+RETRY_MAX_DELAY = float(os.getenv('WEWINE_RETRY_MAX_DELAY', '20'))
+RETRY_BUDGET_RATIO = float(os.getenv('WEWINE_RETRY_BUDGET_RATIO', '0.2'))  # retries earned per request
+RETRY_BUDGET_MIN = float(os.getenv('WEWINE_RETRY_BUDGET_MIN', '10'))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('WEWINE_BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_RESET_TIMEOUT = float(os.getenv('WEWINE_BREAKER_RESET_TIMEOUT', '30'))
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request while the circuit breaker is open"""
+
+def retry_after_seconds(response) -> float:
+    """Parse a Retry-After header (delta-seconds or HTTP date); None when absent or invalid"""
+    value = response.headers.get('retry-after') if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+def classify_failure(error: Exception):
+    """Return (retryable, retry_after) for an upstream failure.
+
+    Transport errors and throttling/5xx statuses are transient; other 4xx
+    statuses and local errors are not worth repeating.
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        if error.response.status_code in RETRYABLE_STATUS_CODES:
+            return True, retry_after_seconds(error.response)
+        return False, None
+    if isinstance(error, httpx.TransportError):
+        return True, None
+    return False, None
+
+def backoff_delay(attempt: int, retry_after: float = None) -> float:
+    """Full-jitter exponential backoff, never sooner than the server's Retry-After.
+
+    Returns None when the server asks for a longer pause than RETRY_MAX_DELAY,
+    in which case retrying inside the user's request is pointless.
+    """
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+    if retry_after is not None:
+        if retry_after > RETRY_MAX_DELAY:
+            return None
+        delay = max(delay, retry_after)
+    return delay
+
+class RetryBudget:
+    """Token bucket that caps retries at a fraction of recent request volume.
+
+    Every request deposits ``ratio`` tokens and every retry spends one, so a
+    sustained outage cannot multiply upstream load by the retry count.
+    """
+
+    def __init__(self, ratio: float = RETRY_BUDGET_RATIO, minimum: float = RETRY_BUDGET_MIN):
+        self.ratio = ratio
+        self.capacity = minimum
+        self.tokens = minimum
+        self.retries = 0
+        self.exhausted = 0
+        self._lock = threading.Lock()
+
+    def on_request(self):
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self.tokens < 1:
+                self.exhausted += 1
+                return False
+            self.tokens -= 1
+            self.retries += 1
+            return True
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {'tokens': round(self.tokens, 2), 'retries': self.retries, 'exhausted': self.exhausted}
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker shared by every session.
+
+    closed -> open after ``failure_threshold`` transient failures in a row;
+    open -> half_open once ``reset_timeout`` has passed, letting a single probe
+    through; the probe's outcome closes the circuit again or re-opens it.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self.rejected = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+
+    def is_open(self) -> bool:
+        """True while requests would be rejected; does not consume the half-open probe"""
+        with self._lock:
+            self._refresh()
+            return self.state == self.OPEN or (self.state == self.HALF_OPEN and self._probe_in_flight)
+
+    def allow(self) -> bool:
+        with self._lock:
+            self._refresh()
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def release(self):
+        """Give back a half-open probe whose request never reached the upstream"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._refresh()
+            retry_in = None
+            if self.state == self.OPEN:
+                retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+            return {'state': self.state, 'consecutive_failures': self.failures, 'trips': self.trips,
+                    'rejected': self.rejected, 'retry_in': retry_in}
+
+@st.cache_resource(show_spinner=False)
+def get_retry_budget() -> RetryBudget:
+    return RetryBudget()
+
+@st.cache_resource(show_spinner=False)
+def get_circuit_breaker() -> CircuitBreaker:
+    return CircuitBreaker()
+
+def call_with_resilience(send, deadline: float = None):
+    """Run ``send()`` behind the shared circuit breaker with budgeted, jittered retries.
+
+    Raises CircuitOpenError without calling ``send`` while the circuit is open;
+    otherwise re-raises the last failure once retries are exhausted. Only
+    transient failures count against the breaker - a 4xx answer still proves
+    the upstream is reachable, and local errors say nothing about it. With a
+    ``deadline`` (``time.monotonic()`` seconds) no retry starts after it.
+    """
+    breaker = get_circuit_breaker()
+    get_retry_budget().on_request()
+    attempt = 0
+    while True:
+        admit_attempt(breaker)
+        try:
+            result = send()
+        except Exception as error:
+            attempt += 1
+            delay = retry_delay(breaker, error, attempt)
+            if delay is None or deadline is not None and time.monotonic() + delay >= deadline:
+                raise
+            time.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
+
+async def acall_with_resilience(send, deadline: float = None):
+    """Coroutine twin of call_with_resilience; ``send`` is an async callable"""
+    breaker = get_circuit_breaker()
+    get_retry_budget().on_request()
+    attempt = 0
+    while True:
+        admit_attempt(breaker)
+        try:
+            result = await send()
+        except Exception as error:
+            attempt += 1
+            delay = retry_delay(breaker, error, attempt)
+            if delay is None or deadline is not None and time.monotonic() + delay >= deadline:
+                raise
+            await asyncio.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
+
+def time_left(deadline: float = None):
+    """httpx timeout for what remains before a monotonic ``deadline``; the client default without one"""
+    if deadline is None:
+        return httpx.USE_CLIENT_DEFAULT
+    return httpx.Timeout(max(0.01, deadline - time.monotonic()))
+
+def admit_attempt(breaker: CircuitBreaker):
+    if not breaker.allow():
+        raise CircuitOpenError("AI service circuit is open after repeated failures")
+
+def retry_delay(breaker: CircuitBreaker, error: Exception, attempt: int) -> float:
+    """Book a failed attempt; returns the pause before the next one, or None to give up"""
+    retryable, retry_after = classify_failure(error)
+    if not retryable:
+        if isinstance(error, httpx.HTTPStatusError):
+            breaker.record_success()
+        else:
+            breaker.release()
+        return None
+    breaker.record_failure()
+    if attempt >= RETRY_MAX_ATTEMPTS or not get_retry_budget().try_spend():
+        return None
+    return backoff_delay(attempt - 1, retry_after)
+
+def resilience_metrics() -> dict:
+    """Breaker and retry-budget state flattened for dashboards and exporters"""
+    breaker = get_circuit_breaker().snapshot()
+    budget = get_retry_budget().snapshot()
+    return {
+        'circuit_state': breaker['state'],
+        'circuit_open': int(breaker['state'] != CircuitBreaker.CLOSED),
+        'circuit_consecutive_failures': breaker['consecutive_failures'],
+        'circuit_trips_total': breaker['trips'],
+        'circuit_rejected_total': breaker['rejected'],
+        'retries_total': budget['retries'],
+        'retry_budget_exhausted_total': budget['exhausted'],
+        'retry_budget_tokens': budget['tokens'],
+    }
@@ -0,0 +1,138 @@
+"""Offline answers: routes a query to the canned frameworks when the model cannot be reached"""
+
+import functools
+import math
+from collections import Counter
+
+import streamlit as st
+
+from .catalog import COMPETITORS
+from .knowledge import KNOWLEDGE_TERM, fold_plural
+
+# --- OFFLINE ROUTER ---
+# Picks the framework answer(s) served when the API is unavailable. Every
+# intent's keywords are compiled into one word-level trie, so a single scan of
+# the prompt scores all frameworks at once, longest phrase first ("market
+# expansion" is not also "market"). Repeats count sublinearly, so a templated
+# prompt mentioning "user" in passing does not outvote its subject.
+FALLBACK_MIN_SCORE = 2.0  # below this the general framework answers
+FALLBACK_COMPOSE_RATIO = 0.75  # a runner-up this close to the best joins the answer
+FALLBACK_MAX_SECTIONS = 2
+FALLBACK_VOCABULARY_MAX = 20000  # words whose first trie step is memoised, least recently used evicted
+
+# "a|b" lists keywords sharing a weight; a trailing * matches any word starting with the stem
+FALLBACK_INTENTS = {
+    'market': {
+        "competit*": 2.5, "market share|market gap|market size|market sizing|market landscape|market leader": 2.5,
+        "market": 1.5, "landscape|white space": 2.0, "differentiat*": 1.5, "threat": 1.0,
+        "swot|rival": 2.5, "versus|vs": 1.0,
+    },
+    'growth': {
+        "growth|grow|growing": 2.0, "scale|scaling": 1.5, "user acquisition|acquisition|acquire": 2.5,
+        "retention|retain|churn": 2.0, "viral*|referral": 2.0, "conversion": 2.0, "cac|ltv": 1.5,
+        "engagement": 1.0, "user": 0.5, "100k": 1.5,
+    },
+    'product': {
+        "product|feature": 2.0, "roadmap|rice|mvp": 2.5, "prioriti*|backlog": 1.5,
+        "ux|ui|onboarding|release": 1.0,
+    },
+    'gtm': {
+        "gtm|beachhead": 3.0, "go to market|market expansion": 4.0, "launch*": 2.5, "expand|expansion": 2.0,
+        "new market|new city|new country": 2.5, "marketing": 2.0, "lisbon|europe*|international*": 1.5,
+        "channel|partnership": 1.0,
+    },
+    'general': {
+        "business model": 3.0, "pricing|price|subscription": 1.5, "revenue stream": 2.0, "monetiz*": 3.5,
+        "moat|fundrais*|invest*|valuation": 1.5, "vision": 1.0,
+    },
+}
+
+class FallbackRouter:
+    """Scores every offline framework against a prompt in one pass over its words.
+
+    The trie is complete once __init__ returns and only read afterwards; the
+    per-word memo is a thread-safe LRU cache, so one router serves every session.
+    """
+
+    def __init__(self, intents: dict, extra: dict = None):
+        self.intents = list(intents)
+        self._rules = []  # (intent, weight) per keyword group
+        self._root = self._node()
+        for table in (intents, extra or {}):
+            for intent, keywords in table.items():
+                for group, weight in keywords.items():
+                    self._rules.append((intent, weight))
+                    for keyword in group.split('|'):
+                        self._add(keyword, len(self._rules) - 1)
+        self._entry = functools.lru_cache(maxsize=FALLBACK_VOCABULARY_MAX)(self._lookup)
+
+    @staticmethod
+    def _node() -> dict:
+        return {'words': {}, 'stems': [], 'rule': None}
+
+    def _add(self, keyword: str, rule: int):
+        node = self._root
+        for word in keyword.lower().split():
+            if word.endswith('*'):
+                stem = word[:-1]
+                child = next((child for known, child in node['stems'] if known == stem), None)
+                if child is None:
+                    child = self._node()
+                    node['stems'].append((stem, child))
+            else:
+                child = node['words'].setdefault(fold_plural(word), self._node())
+            node = child
+        node['rule'] = rule
+
+    @staticmethod
+    def _step(node: dict, word: str):
+        child = node['words'].get(word)
+        if child is None:
+            for stem, candidate in node['stems']:
+                if word.startswith(stem):
+                    return candidate
+        return child
+
+    def _lookup(self, term: str) -> tuple:
+        """(folded word, node after it from the root) for a raw prompt term"""
+        word = fold_plural(term)
+        return word, self._step(self._root, word)
+
+    def scores(self, prompt: str) -> dict:
+        entries = [self._entry(term) for term in KNOWLEDGE_TERM.findall(prompt.lower().replace('_', ' '))]
+        hits = Counter()
+        i = 0
+        while i < len(entries):
+            node, j, match = entries[i][1], i + 1, None
+            while node is not None:
+                if node['rule'] is not None:
+                    match = (node['rule'], j)
+                if j == len(entries):
+                    break
+                node = self._step(node, entries[j][0])
+                j += 1
+            if match:
+                hits[match[0]] += 1
+                i = match[1]
+            else:
+                i += 1
+        scores = dict.fromkeys(self.intents, 0.0)
+        for rule, count in hits.items():
+            intent, weight = self._rules[rule]
+            scores[intent] += weight * (1 + math.log(count))
+        return scores
+
+    def route(self, prompt: str) -> list:
+        """Intents to answer with, best first; ['general'] when nothing stands out"""
+        ranked = sorted(self.scores(prompt).items(), key=lambda pair: -pair[1])  # stable: ties keep table order
+        best = ranked[0][1]
+        if best < FALLBACK_MIN_SCORE:
+            return ['general']
+        return [intent for intent, score in ranked[:FALLBACK_MAX_SECTIONS]
+                if score >= FALLBACK_MIN_SCORE and score >= best * FALLBACK_COMPOSE_RATIO]
+
+@st.cache_resource(show_spinner=False)
+def get_fallback_router() -> FallbackRouter:
+    """Offline router shared by every session; tracked competitors route to market analysis"""
+    competitors = "|".join(" ".join(KNOWLEDGE_TERM.findall(name.lower())) for name in COMPETITORS)
+    return FallbackRouter(FALLBACK_INTENTS, extra={'market': {competitors: 3.0}})
@@ -0,0 +1,193 @@
+"""Client-side rate limiting: token buckets for the provider's RPM and TPM limits with priorities"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+
+import streamlit as st
+
+# --- REQUEST SCHEDULER ---
+RATE_LIMIT_RPM = float(os.getenv('WEWINE_RATE_LIMIT_RPM', '500'))  # 0 disables the limit
+RATE_LIMIT_TPM = float(os.getenv('WEWINE_RATE_LIMIT_TPM', '30000'))
+SCHEDULER_MAX_WAIT = float(os.getenv('WEWINE_SCHEDULER_MAX_WAIT', '30'))
+PRIORITY_INTERACTIVE = 0  # custom queries a user is waiting on
+PRIORITY_BULK = 1  # canned generate_* regenerations
+
+class RateLimitWaitError(Exception):
+    """Raised when a request cannot be admitted within SCHEDULER_MAX_WAIT"""
+
+class TokenBucket:
+    """Continuously refilling bucket sized to one minute of a provider limit"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        if not self.enabled:
+            return 0.0
+        return max(0.0, (min(amount, self.capacity) - self.tokens) / self.rate)
+
+    def take(self, amount: float):
+        if self.enabled:
+            self.tokens -= min(amount, self.capacity)
+
+    def give(self, amount: float):
+        if self.enabled:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+class RequestScheduler:
+    """Process-wide admission control against the provider's RPM and TPM limits.
+
+    Callers queue by (priority, arrival) and only the head of the queue may draw
+    from the buckets, so interactive queries overtake queued bulk work. Each
+    request reserves its pre-flight prompt estimate plus its max_tokens budget;
+    ``settle`` refunds whatever the response did not actually use.
+    """
+
+    def __init__(self, rpm: float = RATE_LIMIT_RPM, tpm: float = RATE_LIMIT_TPM,
+                 max_wait: float = SCHEDULER_MAX_WAIT):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_wait = max_wait
+        self._queue = []
+        self._arrivals = itertools.count()
+        self._cond = threading.Condition()
+        self._async_waiters = set()  # (loop, asyncio.Event) of coroutines in aacquire
+        self.admitted = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_observed_wait = 0.0
+
+    def acquire(self, tokens: int, priority: int = PRIORITY_BULK, max_wait: float = None) -> float:
+        """Block until the request fits both buckets; returns the seconds spent queued.
+
+        ``max_wait`` shortens the scheduler's own limit for a caller with a deadline.
+        """
+        ticket = (priority, next(self._arrivals))
+        started = time.monotonic()
+        limit = self.max_wait if max_wait is None else max(0.0, min(self.max_wait, max_wait))
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            try:
+                while True:
+                    pause = self._try_admit(ticket, tokens)
+                    if pause == 0:
+                        break
+                    left = self._time_left(pause, started + limit, limit)
+                    self._cond.wait(min(pause or self.max_wait, left))
+            finally:
+                self._leave(ticket)
+            return self._record_wait(started)
+
+    async def aacquire(self, tokens: int, priority: int = PRIORITY_BULK, max_wait: float = None) -> float:
+        """``acquire`` for coroutines: waits on the event loop, so a queued call holds no thread.
+
+        Tokens are taken and the ticket leaves the queue without an await in
+        between, so a caller cancelled while queued has taken nothing.
+        """
+        ticket = (priority, next(self._arrivals))
+        started = time.monotonic()
+        limit = self.max_wait if max_wait is None else max(0.0, min(self.max_wait, max_wait))
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            self._async_waiters.add(waiter)
+        try:
+            while True:
+                with self._cond:
+                    pause = self._try_admit(ticket, tokens)
+                    if pause == 0:
+                        break
+                    left = self._time_left(pause, started + limit, limit)
+                    waiter[1].clear()
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), min(pause or self.max_wait, left))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._cond:
+                self._async_waiters.discard(waiter)
+                self._leave(ticket)
+        with self._cond:
+            return self._record_wait(started)
+
+    def _try_admit(self, ticket: tuple, tokens: int) -> float:
+        """Take the request's tokens if it heads the queue and fits: returns 0 once admitted,
+        else the pause until it may fit (None while others are ahead). Call with _cond held."""
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        if self._queue[0] != ticket:
+            return None
+        pause = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+        if pause == 0:
+            self.requests.take(1)
+            self.tokens.take(tokens)
+        return pause
+
+    def _time_left(self, pause: float, deadline: float, limit: float) -> float:
+        """Seconds a waiter may still wait; rejects it once the pause would overrun its deadline"""
+        now = time.monotonic()
+        if now + (pause or 0) > deadline:
+            self.rejected += 1
+            raise RateLimitWaitError(f"request queue is saturated (over {limit:g}s wait)")
+        return deadline - now
+
+    def _leave(self, ticket: tuple):
+        self._queue.remove(ticket)
+        heapq.heapify(self._queue)
+        self._notify()
+
+    def _record_wait(self, started: float) -> float:
+        waited = time.monotonic() - started
+        self.admitted += 1
+        self.total_wait += waited
+        self.max_observed_wait = max(self.max_observed_wait, waited)
+        return waited
+
+    def _notify(self):
+        """Wake every waiter to re-check the queue head and buckets; call with _cond held"""
+        self._cond.notify_all()
+        for loop, event in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:  # its loop has closed; the waiter is gone
+                pass
+
+    def settle(self, reserved: int, used: int):
+        """Return unused reserved tokens to the TPM bucket once actual usage is known"""
+        if reserved > used:
+            with self._cond:
+                self.tokens.give(reserved - used)
+                self._notify()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                'queue_depth': len(self._queue),
+                'interactive_waiting': sum(1 for priority, _ in self._queue if priority == PRIORITY_INTERACTIVE),
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'avg_wait': self.total_wait / self.admitted if self.admitted else 0.0,
+                'max_wait': self.max_observed_wait,
+                'rpm_available': self.requests.tokens if self.requests.enabled else None,
+                'tpm_available': self.tokens.tokens if self.tokens.enabled else None,
+            }
+
+@st.cache_resource(show_spinner=False)
+def get_request_scheduler() -> RequestScheduler:
+    return RequestScheduler()
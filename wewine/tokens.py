@@ -0,0 +1,110 @@
+"""Prompt token counting and completion sizing against context windows and the daily budget"""
+
+import functools
+import os
+import threading
+
+import streamlit as st
+
+from .ledger import MODEL_PRICING, estimate_cost, get_cost_ledger, model_family
+
+# --- TOKEN ACCOUNTING ---
+MODEL_CONTEXT_WINDOWS = {
+    'gpt-4': 8192,
+    'gpt-4-turbo': 128000,
+    'gpt-3.5-turbo': 16385,
+    'o1-preview': 128000,
+    'o1-mini': 128000
+}
+MIN_COMPLETION_TOKENS = int(os.getenv('WEWINE_MIN_COMPLETION_TOKENS', '256'))
+TOKENS_PER_MESSAGE = 3  # chat framing around every message
+TOKENS_PER_REPLY = 3    # priming of the assistant reply
+
+class PromptBudgetError(Exception):
+    """A request rejected before sending because it cannot fit the context window or budget"""
+
+class DailyBudgetError(PromptBudgetError):
+    """A request rejected because its worst case no longer fits what is left of the daily budget"""
+
+class TokenCounter:
+    """Local token counts per model family.
+
+    Uses the model's tiktoken encoding when available and falls back to a
+    characters/4 estimate when tiktoken or its BPE files are missing. Counts for
+    long static texts (company profile, system prompts) are memoised, so only the
+    dynamic user prompt is tokenized per call.
+    """
+
+    def __init__(self):
+        self._encodings = {}
+        self._lock = threading.Lock()
+        self._count_static = functools.lru_cache(maxsize=128)(self._count)
+
+    def encoding(self, model: str):
+        family = model_family(model)
+        with self._lock:
+            if family not in self._encodings:
+                try:
+                    import tiktoken
+                    try:
+                        self._encodings[family] = tiktoken.encoding_for_model(family)
+                    except KeyError:
+                        self._encodings[family] = tiktoken.get_encoding(
+                            'o200k_base' if family.startswith('o1') else 'cl100k_base'
+                        )
+                except Exception:
+                    self._encodings[family] = None
+            return self._encodings[family]
+
+    @property
+    def exact(self) -> bool:
+        return self.encoding('gpt-4') is not None
+
+    def _count(self, text: str, family: str) -> int:
+        encoding = self.encoding(family)
+        if encoding is None:
+            return -(-len(text) // 4)
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def count(self, text: str, model: str, static: bool = False) -> int:
+        family = model_family(model)
+        if static:
+            return self._count_static(text, family)
+        return self._count(text, family)
+
+    def count_chat(self, model: str, static_parts, dynamic_parts=(), messages: int = 2) -> int:
+        """Prompt tokens for a chat request assembled from memoised static and per-call texts"""
+        total = TOKENS_PER_REPLY + TOKENS_PER_MESSAGE * messages
+        total += sum(self.count(text, model, static=True) for text in static_parts)
+        total += sum(self.count(text, model) for text in dynamic_parts)
+        return total
+
+@st.cache_resource(show_spinner=False)
+def get_token_counter() -> TokenCounter:
+    """Token counter (and its memoised static counts) shared process-wide"""
+    return TokenCounter()
+
+def size_completion(model: str, prompt_tokens: int, requested_max_tokens: int) -> int:
+    """Right-size max_tokens for the context window and what is left of the caller's daily budget.
+
+    Raises PromptBudgetError when not even MIN_COMPLETION_TOKENS would fit.
+    """
+    family = model_family(model)
+    context_room = MODEL_CONTEXT_WINDOWS.get(family, MODEL_CONTEXT_WINDOWS['gpt-4']) - prompt_tokens
+    if context_room < MIN_COMPLETION_TOKENS:
+        raise PromptBudgetError(
+            f"Prompt is {prompt_tokens:,} tokens, too long for {model}'s "
+            f"{MODEL_CONTEXT_WINDOWS.get(family, 8192):,}-token context window."
+        )
+
+    remaining_budget = get_cost_ledger().remaining()
+    prompt_cost = estimate_cost(prompt_tokens, 0, model)
+    output_price = MODEL_PRICING[family]['output'] / 1000
+    affordable = int((remaining_budget - prompt_cost) / output_price) if output_price else requested_max_tokens
+    if affordable < MIN_COMPLETION_TOKENS:
+        raise DailyBudgetError(
+            f"Request would cost more than the ${max(remaining_budget, 0):.3f} left in today's budget "
+            f"({prompt_tokens:,} prompt tokens on {model})."
+        )
+
+    return min(requested_max_tokens, context_room, affordable)